@@ -4,6 +4,7 @@ Application principale Streamlit pour le système Q&A basé sur RAG.
 import os
 import time
 import json
+import threading
 import streamlit as st
 import pandas as pd
 from dotenv import load_dotenv
@@ -11,128 +12,262 @@ from dotenv import load_dotenv
 # Charger les variables d'environnement
 load_dotenv()
 
-# Importer les modules d'utilitaires
-from utils import (
-    DocumentProcessor,
-    EmbeddingManager,
-    VectorStore,
-    LLMHandler,
-    VoiceHandler
-)
+# Importer les modules d'utilitaires (chargés à la demande par le package)
+import utils
+from utils import BackgroundLoader, DEFAULT_COLLECTION
+from utils.telemetry import telemetry
 
 # Constantes
 DATA_DIR = "data"
-VECTOR_STORE_NAME = "vector_store"
+N_SHARDS = 4
+# Métrique des index : "l2" par défaut ; METRIC=cosine (embeddings normalisés) reconstruit les
+# collections existantes au premier chargement et permet d'écarter les documents sans rapport
+METRIC = os.environ.get("METRIC", "l2")
+MIN_SCORE = float(os.environ.get("MIN_SCORE", "0.3")) if METRIC != "l2" else None
+EMBEDDING_CACHE_PATH = os.path.join(DATA_DIR, "embeddings_cache.sqlite")
+# Moteur d'inférence des embeddings ("sentence-transformers" ou "onnx", éventuellement quantifié en int8)
+EMBEDDING_BACKEND = os.environ.get("EMBEDDING_BACKEND", "sentence-transformers")
+EMBEDDING_QUANTIZED = os.environ.get("EMBEDDING_QUANTIZED", "0") == "1"
+# Réordonnancement des candidats par un cross-encoder local (désactivé par défaut)
+RERANK = os.environ.get("RERANK", "0") == "1"
+RERANK_CANDIDATES = 20
+RERANK_BUDGET_MS = float(os.environ.get("RERANK_BUDGET_MS", "500"))
 
 # Initialiser les variables de session
-if 'initialized' not in st.session_state:
-    st.session_state.initialized = False
-    st.session_state.vector_store = None
-    st.session_state.document_processor = None
-    st.session_state.embedding_manager = None
-    st.session_state.llm_handler = None
-    st.session_state.voice_handler = None
-    st.session_state.documents = []
+if 'collection' not in st.session_state:
+    st.session_state.collection = DEFAULT_COLLECTION
     st.session_state.processing = False
     st.session_state.last_query = ""
     st.session_state.last_response = ""
+    st.session_state.last_trace = None
 
-def initialize_components():
-    """Initialise tous les composants nécessaires."""
-    if not st.session_state.initialized:
-        try:
-            # Créer le répertoire de données s'il n'existe pas
-            os.makedirs(DATA_DIR, exist_ok=True)
-            
-            # Initialiser les composants
-            st.session_state.document_processor = DocumentProcessor()
-            st.session_state.embedding_manager = EmbeddingManager()
-            st.session_state.vector_store = VectorStore()
-            
-            # Tenter de charger un vector store existant
-            if st.session_state.vector_store.load(DATA_DIR, VECTOR_STORE_NAME):
-                st.info("Base de connaissances précédente chargée avec succès.")
-            
-            # Initialiser le gestionnaire LLM si la clé API est disponible
-            api_key = os.environ.get("GROQ_API_KEY")
-            if api_key:
-                st.session_state.llm_handler = LLMHandler(api_key=api_key)
-            
-            # Initialiser le gestionnaire vocal
-            st.session_state.voice_handler = VoiceHandler()
-            
-            st.session_state.initialized = True
-            return True
-        except Exception as e:
-            st.error(f"Erreur lors de l'initialisation: {str(e)}")
-            return False
-    return True
+# Composants partagés par toutes les sessions du processus (construits une seule fois)
+@st.cache_resource
+def get_collections():
+    """Retourne le gestionnaire de collections du processus."""
+    os.makedirs(DATA_DIR, exist_ok=True)
+    return utils.CollectionManager(DATA_DIR, n_shards=N_SHARDS, metric=METRIC)
+
+@st.cache_resource
+def get_warmup():
+    """Lance en arrière-plan le chargement du modèle d'embeddings et de la collection par défaut."""
+    collections = get_collections()
+    return {
+        "embeddings": BackgroundLoader(
+            "Modèle d'embeddings",
+            lambda: utils.EmbeddingManager(
+                cache=utils.EmbeddingCache(EMBEDDING_CACHE_PATH),
+                backend=EMBEDDING_BACKEND,
+                quantized=EMBEDDING_QUANTIZED
+            )
+        ),
+        "index": BackgroundLoader("Index", lambda: collections.get(DEFAULT_COLLECTION))
+    }
+
+@st.cache_resource
+def get_store_lock():
+    """Retourne le verrou qui sérialise les modifications des collections entre sessions (les recherches s'en passent)."""
+    return threading.RLock()
+
+@st.cache_resource
+def get_response_cache(collection):
+    """Retourne le cache de réponses d'une collection (les identifiants de chunks lui sont propres)."""
+    return utils.SemanticResponseCache()
+
+@st.cache_resource
+def get_llm_handler(api_key, collection):
+    """Retourne le gestionnaire LLM d'une clé API et d'une collection."""
+    return utils.LLMHandler(api_key=api_key, response_cache=get_response_cache(collection))
+
+@st.cache_resource
+def get_cross_encoder():
+    """Retourne le cross-encoder partagé par les réordonnanceurs des collections."""
+    from utils.reranker import load_cross_encoder
+    return load_cross_encoder()
+
+@st.cache_resource
+def get_reranker(collection):
+    """Retourne le réordonnanceur d'une collection (son cache de scores est vidé avec elle)."""
+    return utils.CrossEncoderReranker(model=get_cross_encoder(), latency_budget_ms=RERANK_BUDGET_MS)
+
+@st.cache_resource
+def get_document_processor():
+    """Retourne le processeur de documents."""
+    return utils.DocumentProcessor()
+
+@st.cache_resource
+def get_voice_handler():
+    """Retourne le gestionnaire vocal (chargé au premier usage de la voix)."""
+    return utils.VoiceHandler()
+
+def wait_for(name, message):
+    """Retourne un composant préchargé, en affichant un indicateur tant qu'il n'est pas prêt."""
+    loader = get_warmup()[name]
+    if not loader.ready:
+        with st.spinner(message):
+            return loader.get()
+    return loader.get()
+
+def get_embedding_manager():
+    """Retourne le gestionnaire d'embeddings, une fois le modèle chargé."""
+    return wait_for("embeddings", "Chargement du modèle d'embeddings...")
+
+def get_vector_store():
+    """Retourne la collection courante, chargée depuis le disque au premier accès."""
+    if st.session_state.collection == DEFAULT_COLLECTION:
+        wait_for("index", "Chargement de la base de connaissances...")
+    return get_collections().get(st.session_state.collection)
+
+def get_llm():
+    """Retourne le gestionnaire LLM de la collection courante, ou None sans clé API."""
+    api_key = os.environ.get("GROQ_API_KEY")
+    if not api_key:
+        return None
+    return get_llm_handler(api_key, st.session_state.collection)
+
+def show_warmup_status():
+    """Affiche l'état du préchargement et arrête la page si un composant n'a pas pu être chargé."""
+    loaders = get_warmup()
+    for loader in loaders.values():
+        if loader.ready and loader.error is not None:
+            st.error(f"Erreur lors de l'initialisation ({loader.name}): {str(loader.error)}")
+            # Retenter le chargement à la prochaine exécution
+            get_warmup.clear()
+            st.stop()
+    
+    pending = [loader.status() for loader in loaders.values() if not loader.ready]
+    if pending:
+        st.caption("⏳ Chargement en arrière-plan : " + ", ".join(
+            f"{status['name']} ({status['seconds']:.0f} s)" for status in pending
+        ))
+
+def select_collection(name):
+    """Fait d'une collection la base de connaissances courante."""
+    st.session_state.collection = name
+    st.session_state.last_query = ""
+    st.session_state.last_response = ""
+    st.session_state.last_trace = None
 
 def process_documents(files, urls):
     """Traite les documents et les URLs."""
     st.session_state.processing = True
-    processed_docs = []
+    store_lock = get_store_lock()
+    pipeline = utils.IngestionPipeline(
+        get_document_processor(),
+        get_embedding_manager(),
+        get_vector_store(),
+        store_lock=store_lock
+    )
+    added = removed = unchanged = 0
+    changed_sources = []
     
-    with st.spinner("Traitement des documents..."):
-        # Traiter les fichiers
-        for file in files:
-            try:
-                chunks = st.session_state.document_processor.process_file(file, file.name)
-                processed_docs.extend(chunks)
-                st.info(f"✅ {file.name} traité avec succès ({len(chunks)} chunks)")
-            except Exception as e:
-                st.error(f"❌ Erreur lors du traitement de {file.name}: {str(e)}")
-        
-        # Traiter les URLs
-        for url in urls:
-            try:
-                chunks = st.session_state.document_processor.process_url(url)
-                processed_docs.extend(chunks)
-                st.info(f"✅ {url} traité avec succès ({len(chunks)} chunks)")
-            except Exception as e:
-                st.error(f"❌ Erreur lors du traitement de {url}: {str(e)}")
+    # Analyse, embeddings et indexation se recouvrent ; chaque source est indexée dès qu'elle est prête
+    progress_bar = st.progress(0.0, text="Traitement des documents...")
+    for event in pipeline.run(files, urls):
+        if event["type"] == "error":
+            st.error(f"❌ Erreur lors du traitement de {event['source']}: {event['error']}")
+        else:
+            added += event["added"]
+            removed += event["removed"]
+            unchanged += event["unchanged"]
+            if event["added"] or event["removed"]:
+                changed_sources.append(event["source"])
+            st.info(f"✅ {event['source']} traité avec succès ({event['chunks']} chunks)")
+        progress_bar.progress(
+            event["done"] / event["total"],
+            text=f"Traitement des documents... ({event['done']}/{event['total']})"
+        )
+    progress_bar.empty()
     
-    # Calculer les embeddings et ajouter au vector store
-    if processed_docs:
-        with st.spinner("Calcul des embeddings et mise à jour de la base de connaissances..."):
-            texts = [doc["text"] for doc in processed_docs]
-            embeddings = st.session_state.embedding_manager.get_embeddings(texts)
-            st.session_state.vector_store.add_documents(processed_docs, embeddings)
-            
-            # Sauvegarder le vector store
-            st.session_state.vector_store.save(DATA_DIR, VECTOR_STORE_NAME)
-            
-            # Mettre à jour la session
-            st.session_state.documents.extend(processed_docs)
-            st.success(f"✅ {len(processed_docs)} chunks ajoutés à la base de connaissances.")
+    # Les réponses construites sur des sources modifiées ne sont plus valides
+    get_response_cache(st.session_state.collection).invalidate_sources(changed_sources)
+    
+    if added or removed or unchanged:
+        # Sauvegarder la collection (seuls les shards modifiés sont réécrits)
+        with store_lock:
+            get_collections().save(st.session_state.collection)
+        
+        st.success(
+            f"✅ Base de connaissances mise à jour : {added} chunks ajoutés, "
+            f"{removed} supprimés, {unchanged} inchangés."
+        )
     
     st.session_state.processing = False
 
-def generate_response(query):
-    """Génère une réponse à la requête."""
+def generate_response(query, sources=None):
+    """Génère une réponse à la requête, fragment par fragment, en se limitant éventuellement à certaines sources."""
     if not query:
-        return "Veuillez entrer une question."
+        yield "Veuillez entrer une question."
+        return
     
-    if not st.session_state.vector_store or not st.session_state.llm_handler:
-        return "Le système n'est pas complètement initialisé. Veuillez vérifier vos clés API et réessayer."
+    llm_handler = get_llm()
+    if llm_handler is None:
+        yield "Le système n'est pas complètement initialisé. Veuillez vérifier vos clés API et réessayer."
+        return
     
     # Obtenir l'embedding de la requête
-    query_embedding = st.session_state.embedding_manager.get_query_embedding(query)
+    query_embeddings = get_embedding_manager().get_query_embeddings_array([query])
+    query_embedding = query_embeddings[0]
     
-    # Rechercher les documents pertinents
-    relevant_docs = st.session_state.vector_store.similarity_search(query_embedding, k=4)
+    # Rechercher les documents pertinents (fusion dense + BM25 pour les termes exacts),
+    # sans attendre une ingestion lancée depuis une autre session ; une question hors
+    # sujet (aucun document assez similaire) ne retourne rien et n'appelle pas le LLM
+    hits = get_vector_store().search_batch(
+        query_embeddings,
+        k=RERANK_CANDIDATES if RERANK else 4,
+        query_texts=[query],
+        mode="hybrid",
+        filters={"source": sources} if sources else None,
+        min_score=MIN_SCORE
+    )[0]
+    if RERANK:
+        # Seuls les 4 meilleurs candidats selon le cross-encoder sont transmis au LLM
+        with st.spinner("Réordonnancement des documents..."):
+            hits = get_reranker(st.session_state.collection).rerank(query, hits, k=4)
+    relevant_docs = [doc for doc, _ in hits]
     
     if not relevant_docs:
-        return "Je n'ai pas trouvé d'informations pertinentes dans les documents fournis. Veuillez essayer une autre question ou ajouter plus de documents."
+        yield "Je n'ai pas trouvé d'informations pertinentes dans les documents fournis. Veuillez essayer une autre question ou ajouter plus de documents."
+        return
     
-    # Générer la réponse avec le LLM
-    response = st.session_state.llm_handler.get_response(query, relevant_docs)
+    # Générer la réponse avec le LLM, en transmettant les tokens dès leur arrivée
+    parts = []
+    for token in llm_handler.stream_response(
+        query,
+        relevant_docs,
+        query_embedding=query_embedding
+    ):
+        parts.append(token)
+        yield token
     
     # Mettre à jour la session
     st.session_state.last_query = query
-    st.session_state.last_response = response
-    
-    return response
+    st.session_state.last_response = "".join(parts)
+
+def generate_traced_response(query, sources=None):
+    """Comme `generate_response`, en enregistrant la durée de chaque étape dans la session."""
+    with telemetry.trace("query") as trace:
+        yield from generate_response(query, sources)
+    st.session_state.last_trace = trace.to_dict()
+
+def show_timings(trace):
+    """Affiche la durée de chaque étape d'une requête tracée et ses compteurs."""
+    with st.expander(f"⏱️ Temps par étape ({trace['duration_ms']:.0f} ms)"):
+        st.dataframe(
+            pd.DataFrame([
+                {
+                    "Étape": "\u00a0\u00a0" * span["depth"] + span["name"],
+                    "Début (ms)": span["start_ms"],
+                    "Durée (ms)": span["duration_ms"],
+                    "Détails": ", ".join(f"{key}={value}" for key, value in span["attributes"].items())
+                }
+                for span in trace["spans"]
+            ]),
+            hide_index=True,
+            use_container_width=True
+        )
+        if trace["counters"]:
+            st.caption(" · ".join(f"{name} : {value}" for name, value in sorted(trace["counters"].items())))
 
 def main():
     """Fonction principale de l'application."""
@@ -155,13 +290,35 @@ def main():
         if api_key:
             os.environ["GROQ_API_KEY"] = api_key
             st.success("Clé API Groq enregistrée avec succès.")
-            if not st.session_state.llm_handler and st.session_state.initialized:
-                st.session_state.llm_handler = LLMHandler(api_key=api_key)
-            st.experimental_rerun()
+            st.rerun()
     
-    # Initialiser les composants
-    if not initialize_components():
-        st.stop()
+    # Le modèle et l'index se chargent en arrière-plan pendant l'affichage de la page
+    show_warmup_status()
+    
+    # Choix de la collection (une base de connaissances par client ou par thème)
+    collection_col1, collection_col2 = st.columns([2, 1])
+    with collection_col1:
+        collections = get_collections().list_collections()
+        if st.session_state.collection not in collections:
+            collections.append(st.session_state.collection)
+        selected = st.selectbox(
+            "Collection",
+            collections,
+            index=collections.index(st.session_state.collection)
+        )
+        if selected != st.session_state.collection:
+            select_collection(selected)
+            st.rerun()
+    with collection_col2:
+        new_collection = st.text_input("Nouvelle collection")
+        if st.button("Créer la collection", disabled=not new_collection):
+            try:
+                get_collections().directory(new_collection)
+            except ValueError as e:
+                st.error(str(e))
+            else:
+                select_collection(new_collection)
+                st.rerun()
     
     # Interface à onglets
     tab1, tab2, tab3 = st.tabs(["📚 Documents", "❓ Questions & Réponses", "ℹ️ À propos"])
@@ -191,52 +348,61 @@ def main():
                 process_documents(uploaded_files, urls)
         
         # Afficher les statistiques
-        if st.session_state.documents:
+        vector_store = get_vector_store()
+        sources = vector_store.list_sources()
+        if sources:
             st.subheader("Statistiques de la base de connaissances")
             
             # Nombre total de documents et de chunks
-            sources = set()
-            for doc in st.session_state.documents:
-                sources.add(doc["metadata"]["source"])
-            
             st.metric("Documents sources", len(sources))
-            st.metric("Chunks de texte", len(st.session_state.documents))
+            st.metric("Chunks de texte", len(vector_store))
             
-            # Liste des sources
+            # Liste des sources, avec suppression individuelle
             st.subheader("Sources de données")
-            source_list = list(sources)
-            for source in source_list:
-                st.write(f"- {source}")
+            for i, (source, chunk_count) in enumerate(sources.items()):
+                source_col1, source_col2 = st.columns([5, 1])
+                with source_col1:
+                    st.write(f"- {source} ({chunk_count} chunks)")
+                with source_col2:
+                    if st.button("Supprimer", key=f"delete_source_{i}"):
+                        with get_store_lock():
+                            vector_store.delete_source(source)
+                            get_collections().save(st.session_state.collection)
+                        get_response_cache(st.session_state.collection).invalidate_sources([source])
+                        st.success(f"Source supprimée : {source}")
+                        st.rerun()
         
         # Bouton pour réinitialiser la base de connaissances
-        if st.session_state.documents and st.button("Réinitialiser la base de connaissances"):
-            st.session_state.vector_store = VectorStore()
-            st.session_state.documents = []
-            
-            # Supprimer les fichiers du vector store
-            index_path = os.path.join(DATA_DIR, f"{VECTOR_STORE_NAME}.index")
-            docs_path = os.path.join(DATA_DIR, f"{VECTOR_STORE_NAME}.pkl")
-            
-            if os.path.exists(index_path):
-                os.remove(index_path)
-            if os.path.exists(docs_path):
-                os.remove(docs_path)
+        if sources and st.button("Réinitialiser la base de connaissances"):
+            # Supprimer la collection et ses fichiers, puis la rouvrir vide
+            with get_store_lock():
+                get_collections().drop(st.session_state.collection)
+            get_response_cache(st.session_state.collection).clear()
+            if RERANK:
+                get_reranker(st.session_state.collection).clear()
+            select_collection(st.session_state.collection)
             
             st.success("Base de connaissances réinitialisée avec succès.")
-            st.experimental_rerun()
+            st.rerun()
     
     # Onglet Questions & Réponses
     with tab2:
         st.header("❓ Questions & Réponses")
         
         # Vérifier si des documents sont chargés
-        if not st.session_state.documents:
+        if len(vector_store) == 0:
             st.warning("Veuillez d'abord ajouter des documents dans l'onglet 'Documents'.")
             st.stop()
         
         # Interface de question
         st.subheader("Posez votre question")
         
+        # Restreindre la recherche à certaines sources (par exemple les documents d'un client)
+        scope = st.multiselect(
+            "Limiter la recherche aux sources (toutes si vide)",
+            list(vector_store.list_sources())
+        )
+        
         # Option vocale
         voice_col1, voice_col2 = st.columns([3, 1])
         with voice_col1:
@@ -244,29 +410,40 @@ def main():
         with voice_col2:
             if st.button("🎤 Parler", key="voice_button"):
                 with st.spinner("Écoute en cours..."):
-                    voice_input = st.session_state.voice_handler.recognize_speech()
+                    voice_input = get_voice_handler().recognize_speech()
                     if not voice_input.startswith("Erreur") and not voice_input.startswith("Aucune") and not voice_input.startswith("Désolé"):
                         st.session_state.query_input = voice_input
                         query = voice_input
-                        st.experimental_rerun()
+                        st.rerun()
                     else:
                         st.error(voice_input)
         
-        # Bouton de soumission
+        # Détail des temps : embedding, recherche FAISS, construction du prompt, appel au LLM
+        timings = st.checkbox("Afficher le temps passé par étape")
+        
+        # Bouton de soumission : la réponse s'affiche au fur et à mesure de sa génération
         if st.button("Obtenir une réponse", disabled=not query):
-            with st.spinner("Génération de la réponse en cours..."):
-                response = generate_response(query)
-                st.session_state.last_response = response
+            st.subheader("Réponse")
+            st.info(f"Question: {query}")
+            if timings:
+                st.write_stream(generate_traced_response(query, scope))
+                show_timings(st.session_state.last_trace)
+            else:
+                st.session_state.last_trace = None
+                st.write_stream(generate_response(query, scope))
         
-        # Afficher la réponse
-        if st.session_state.last_query and st.session_state.last_response:
+        # Afficher la dernière réponse
+        elif st.session_state.last_query and st.session_state.last_response:
             st.subheader("Réponse")
             st.info(f"Question: {st.session_state.last_query}")
             st.write(st.session_state.last_response)
-            
-            # Option pour lire la réponse à haute voix
+            if timings and st.session_state.last_trace:
+                show_timings(st.session_state.last_trace)
+        
+        # Option pour lire la réponse à haute voix
+        if st.session_state.last_query and st.session_state.last_response:
             if st.button("🔊 Lire la réponse"):
-                st.session_state.voice_handler.text_to_speech(st.session_state.last_response)
+                get_voice_handler().text_to_speech(st.session_state.last_response)
     
     # Onglet À propos
     with tab3:
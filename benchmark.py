@@ -0,0 +1,655 @@
+"""
+Banc d'essai des performances du système Q&A basé sur RAG.
+
+Sur des corpus synthétiques de plusieurs tailles, mesure le débit du
+découpage et des embeddings, la construction de l'index, la latence et le
+débit de recherche, l'empreinte mémoire, la sauvegarde et le chargement du
+vector store, et la latence de bout en bout avec un LLM factice. Tout
+fonctionne hors ligne avec l'encodeur par hachage (par défaut).
+
+En mode évaluation (`--evaluate`), compare le rappel, le MRR et la latence
+de configurations d'index approximatives à une recherche exacte, et
+recommande la moins coûteuse atteignant un rappel cible.
+
+Usage:
+    python benchmark.py --sizes 100,1000 --output benchmark.json
+    python benchmark.py --sizes 100,1000 --embedder onnx --baseline benchmark.json
+    python benchmark.py --evaluate --sizes 5000 --target-recall 0.95
+"""
+import os
+import sys
+import json
+import time
+import zlib
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+from typing import List, Dict, Any, Optional, Tuple
+import numpy as np
+import faiss
+
+from utils.document_processor import DocumentProcessor
+from utils.embeddings import EmbeddingManager
+from utils.embedding_backends import EMBEDDING_BACKENDS
+from utils.lexical_index import tokenize
+from utils.vector_store import VectorStore, INDEX_TYPES, ENCODINGS, SEARCH_MODES
+from utils.context_builder import ContextAssembler
+from utils.rag_service import RAGService
+from utils.evaluation import OBJECTIVES, evaluate_configurations, cheapest_configuration
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Syllabes servant à fabriquer le vocabulaire synthétique
+_SYLLABLES = ["ba", "ce", "di", "fo", "gu", "la", "me", "ni", "po", "ru", "sa", "te", "vi", "zo", "an", "or", "ex", "in"]
+
+class HashingEncoder:
+    """Encodeur factice par hachage des termes, pour mesurer le pipeline sans modèle ni réseau."""
+    
+    def __init__(self, dimension: int = 384):
+        """
+        Args:
+            dimension: Dimension des vecteurs produits
+        """
+        self.dimension = dimension
+    
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """
+        Encode des textes en sacs de termes hachés, normalisés.
+        
+        Args:
+            texts: Textes à encoder
+        
+        Returns:
+            Matrice float32 (nombre de textes, dimension)
+        """
+        result = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for term in tokenize(text):
+                code = zlib.crc32(term.encode("utf-8"))
+                result[row, code % self.dimension] += 1.0 if code & 0x80000000 else -1.0
+        result /= np.maximum(np.linalg.norm(result, axis=1, keepdims=True), 1e-12)
+        return result
+
+class StubLLM:
+    """LLM factice : assemble le contexte comme LLMHandler, attend un délai fixe et répond sans réseau."""
+    
+    def __init__(self, latency_ms: float = 0.0):
+        """
+        Args:
+            latency_ms: Durée simulée de la génération
+        """
+        self.latency = latency_ms / 1000.0
+        self.context_assembler = ContextAssembler()
+    
+    def get_response(self, query: str, context_docs: List[Dict[str, Any]], query_embedding=None) -> str:
+        """Retourne une réponse factice après assemblage du contexte."""
+        passages = self.context_assembler.assemble(context_docs)
+        if self.latency:
+            time.sleep(self.latency)
+        return f"Réponse factice à « {query} » fondée sur {len(passages)} passages."
+
+def synthetic_corpus(
+    n_documents: int,
+    words_per_document: int = 600,
+    n_topics: int = 20,
+    n_queries: int = 200,
+    seed: int = 0
+) -> Tuple[List[Tuple[str, str]], List[Dict[str, str]]]:
+    """
+    Génère un corpus synthétique reproductible et des requêtes associées.
+    
+    Chaque document traite d'un thème (vocabulaire propre tiré selon une loi
+    de Zipf, mêlé à un vocabulaire commun) et contient quelques références
+    ("REF-1234"), pour que les recherches dense et lexicale aient du sens.
+    Chaque requête reprend un extrait d'un document, qui est sa source attendue.
+    
+    Args:
+        n_documents: Nombre de documents
+        words_per_document: Nombre moyen de mots par document
+        n_topics: Nombre de thèmes
+        n_queries: Nombre de requêtes
+        seed: Graine du générateur aléatoire
+    
+    Returns:
+        Tuple (liste de (source, texte), liste de requêtes {"query", "source"})
+    """
+    rng = np.random.default_rng(seed)
+    vocabulary = sorted({
+        "".join(rng.choice(_SYLLABLES, size=rng.integers(2, 5)))
+        for _ in range(6000)
+    })
+    common = vocabulary[:500]
+    topic_words = np.array_split(np.array(vocabulary[500:]), n_topics)
+    zipf = 1.0 / np.arange(1, len(topic_words[0]) + 1)
+    
+    documents = []
+    for doc_index in range(n_documents):
+        words = topic_words[doc_index % n_topics]
+        weights = zipf[:len(words)] / zipf[:len(words)].sum()
+        length = max(50, int(rng.normal(words_per_document, words_per_document / 4)))
+        from_topic = rng.random(length) < 0.7
+        sampled = np.where(
+            from_topic,
+            rng.choice(words, size=length, p=weights),
+            rng.choice(common, size=length)
+        ).tolist()
+        
+        # Phrases de 8 à 20 mots, avec de temps en temps une référence exacte
+        sentences = []
+        position = 0
+        while position < length:
+            size = int(rng.integers(8, 21))
+            sentence = sampled[position:position + size]
+            if rng.random() < 0.1:
+                sentence.append(f"REF-{int(rng.integers(1000, 10000))}")
+            sentences.append(" ".join(sentence).capitalize() + ".")
+            position += size
+        documents.append((f"doc_{doc_index:06d}.txt", " ".join(sentences)))
+    
+    queries = []
+    for _ in range(n_queries):
+        source, text = documents[int(rng.integers(len(documents)))]
+        words = text.split()
+        start = int(rng.integers(max(1, len(words) - 10)))
+        queries.append({"query": " ".join(words[start:start + int(rng.integers(6, 11))]), "source": source})
+    return documents, queries
+
+def latency_stats(latencies: List[float]) -> Dict[str, float]:
+    """
+    Résume une série de latences.
+    
+    Args:
+        latencies: Latences en secondes
+    
+    Returns:
+        Dictionnaire avec les percentiles 50 et 99 et la moyenne, en millisecondes
+    """
+    values = np.array(latencies) * 1000.0
+    return {
+        "p50_ms": round(float(np.percentile(values, 50)), 3),
+        "p99_ms": round(float(np.percentile(values, 99)), 3),
+        "mean_ms": round(float(values.mean()), 3)
+    }
+
+def peak_rss_mb() -> Optional[float]:
+    """Retourne la mémoire résidente maximale du processus en Mo (None si non disponible)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilo-octets sous Linux, octets sous macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def directory_size(directory: str) -> int:
+    """Retourne la taille totale des fichiers d'un répertoire, en octets."""
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, names in os.walk(directory)
+        for name in names
+    )
+
+def bench_chunking(processor: DocumentProcessor, documents: List[Tuple[str, str]]) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Mesure le découpage des documents en chunks.
+    
+    Args:
+        processor: Processeur de documents (taille et chevauchement des chunks)
+        documents: Liste de (source, texte)
+    
+    Returns:
+        Tuple (chunks, métriques)
+    """
+    start = time.perf_counter()
+    chunks = []
+    for source, text in documents:
+        for chunk_id, chunk in enumerate(processor.text_splitter.split_text(text)):
+            chunks.append({"text": chunk, "metadata": {"source": source, "chunk_id": chunk_id}})
+    elapsed = time.perf_counter() - start
+    
+    chars = sum(len(text) for _, text in documents)
+    return chunks, {
+        "seconds": round(elapsed, 4),
+        "chunks": len(chunks),
+        "chars_per_sec": round(chars / elapsed, 1),
+        "chunks_per_sec": round(len(chunks) / elapsed, 1)
+    }
+
+def bench_embeddings(manager: EmbeddingManager, chunks: List[Dict[str, Any]], batch_size: int) -> Tuple[np.ndarray, Dict[str, Any]]:
+    """
+    Mesure le calcul des embeddings des chunks, par lots comme le pipeline d'ingestion.
+    
+    Args:
+        manager: Gestionnaire d'embeddings
+        chunks: Chunks à encoder
+        batch_size: Nombre de chunks par lot
+    
+    Returns:
+        Tuple (matrice des embeddings, métriques)
+    """
+    embeddings = np.empty((len(chunks), manager.dimension), dtype=np.float32)
+    start = time.perf_counter()
+    for position in range(0, len(chunks), batch_size):
+        batch = chunks[position:position + batch_size]
+        embeddings[position:position + len(batch)] = manager.get_embeddings_array([doc["text"] for doc in batch])
+    elapsed = time.perf_counter() - start
+    return embeddings, {
+        "seconds": round(elapsed, 4),
+        "docs_per_sec": round(len(chunks) / elapsed, 1)
+    }
+
+def bench_index(store: VectorStore, chunks: List[Dict[str, Any]], embeddings: np.ndarray) -> Dict[str, Any]:
+    """
+    Mesure la construction de l'index, source par source comme le pipeline d'ingestion.
+    
+    Args:
+        store: Vector store vide
+        chunks: Chunks à indexer
+        embeddings: Embeddings correspondants
+    
+    Returns:
+        Métriques de construction et d'empreinte mémoire de l'index
+    """
+    groups = {}
+    for position, chunk in enumerate(chunks):
+        groups.setdefault(chunk["metadata"]["source"], []).append(position)
+    
+    start = time.perf_counter()
+    with store.batch():
+        for source, positions in groups.items():
+            store.upsert_source(source, [chunks[position] for position in positions], embeddings[positions])
+    elapsed = time.perf_counter() - start
+    return {
+        "seconds": round(elapsed, 4),
+        "vectors_per_sec": round(len(chunks) / elapsed, 1),
+        "approximate": store.is_approximate,
+        **store.memory_usage()
+    }
+
+def bench_search(
+    store: VectorStore,
+    manager: EmbeddingManager,
+    queries: List[Dict[str, str]],
+    k: int,
+    mode: str,
+    batch_size: int
+) -> Dict[str, Any]:
+    """
+    Mesure la latence requête par requête et le débit par lots de la recherche.
+    
+    Args:
+        store: Vector store indexé
+        manager: Gestionnaire d'embeddings
+        queries: Requêtes synthétiques
+        k: Nombre de résultats par requête
+        mode: Mode de recherche ("vector", "lexical" ou "hybrid")
+        batch_size: Nombre de requêtes par lot pour la mesure du débit
+    
+    Returns:
+        Métriques de latence (par requête) et de débit (par lots)
+    """
+    texts = [query["query"] for query in queries]
+    start = time.perf_counter()
+    query_embeddings = manager.get_query_embeddings_array(texts)
+    embedding_seconds = time.perf_counter() - start
+    
+    latencies = []
+    hits = 0
+    for position, query in enumerate(queries):
+        start = time.perf_counter()
+        results = store.search_batch(query_embeddings[position:position + 1], k, query_texts=[query["query"]], mode=mode)
+        latencies.append(time.perf_counter() - start)
+        hits += any(doc["metadata"]["source"] == query["source"] for doc, _ in results[0])
+    
+    start = time.perf_counter()
+    for position in range(0, len(queries), batch_size):
+        store.search_batch(
+            query_embeddings[position:position + batch_size],
+            k,
+            query_texts=texts[position:position + batch_size],
+            mode=mode
+        )
+    batch_seconds = time.perf_counter() - start
+    
+    return {
+        **latency_stats(latencies),
+        "qps": round(len(queries) / sum(latencies), 1),
+        "batched_qps": round(len(queries) / batch_seconds, 1),
+        "query_embedding_ms": round(embedding_seconds * 1000.0 / len(queries), 3),
+        # Part des requêtes dont le document d'origine figure dans les k résultats
+        "source_hit_rate": round(hits / len(queries), 4)
+    }
+
+def bench_persistence(
+    store: VectorStore,
+    store_kwargs: Dict[str, Any],
+    directory: str,
+    chunks: List[Dict[str, Any]],
+    embeddings: np.ndarray,
+    delta_size: int = 50
+) -> Dict[str, Any]:
+    """
+    Mesure la sauvegarde complète, la sauvegarde incrémentale et le rechargement du vector store.
+    
+    Args:
+        store: Vector store indexé
+        store_kwargs: Paramètres du vector store (pour le recharger à l'identique)
+        directory: Répertoire de sauvegarde
+        chunks: Chunks indexés (les premiers sont ajoutés à nouveau, sous une autre source)
+        embeddings: Embeddings des chunks
+        delta_size: Nombre de chunks ajoutés avant la sauvegarde incrémentale
+    
+    Returns:
+        Métriques de durée et de taille sur disque
+    """
+    start = time.perf_counter()
+    store.save(directory)
+    save_seconds = time.perf_counter() - start
+    
+    # Une petite ingestion ne doit ajouter qu'un delta au journal, sans réécrire l'index
+    delta = [{**chunk, "metadata": {**chunk["metadata"], "source": "delta"}} for chunk in chunks[:delta_size]]
+    size_before = directory_size(directory)
+    store.add_documents(delta, embeddings[:len(delta)])
+    start = time.perf_counter()
+    store.save(directory)
+    delta_save_seconds = time.perf_counter() - start
+    delta_save_bytes = directory_size(directory) - size_before
+    
+    loaded = VectorStore(**store_kwargs)
+    start = time.perf_counter()
+    if not loaded.load(directory) or len(loaded) != len(store):
+        raise RuntimeError("Le vector store rechargé ne correspond pas au vector store sauvegardé")
+    load_seconds = time.perf_counter() - start
+    loaded.close()
+    
+    return {
+        "save_seconds": round(save_seconds, 4),
+        "delta_save_seconds": round(delta_save_seconds, 4),
+        "delta_save_bytes": delta_save_bytes,
+        "load_seconds": round(load_seconds, 4),
+        "disk_bytes": directory_size(directory)
+    }
+
+def bench_end_to_end(service: RAGService, queries: List[Dict[str, str]], k: int) -> Dict[str, Any]:
+    """
+    Mesure la latence de bout en bout (encodage, recherche, contexte et LLM factice).
+    
+    Args:
+        service: Service RAG configuré avec un LLM factice
+        queries: Requêtes synthétiques
+        k: Nombre de documents de contexte
+    
+    Returns:
+        Métriques de latence
+    """
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        [(query_embedding, hits)] = service.retrieve_batch([query["query"]], k)
+        service.answer(query["query"], [doc for doc, _ in hits], query_embedding)
+        latencies.append(time.perf_counter() - start)
+    return latency_stats(latencies)
+
+def create_embedding_manager(args: argparse.Namespace) -> EmbeddingManager:
+    """Crée le gestionnaire d'embeddings demandé (sans cache, pour mesurer le modèle)."""
+    if args.embedder == "hashing":
+        return EmbeddingManager(model_name="hashing", encoder=HashingEncoder(args.dimension))
+    return EmbeddingManager(
+        backend=args.embedder,
+        batch_size=args.batch_size,
+        num_threads=args.threads,
+        quantized=args.quantized
+    )
+
+def run_size(args: argparse.Namespace, manager: EmbeddingManager, n_documents: int, workdir: str) -> Dict[str, Any]:
+    """
+    Exécute toutes les mesures sur un corpus d'une taille donnée.
+    
+    Args:
+        args: Arguments de la ligne de commande
+        manager: Gestionnaire d'embeddings
+        n_documents: Nombre de documents du corpus
+        workdir: Répertoire de travail temporaire
+    
+    Returns:
+        Métriques de chaque étape
+    """
+    documents, queries = synthetic_corpus(
+        n_documents,
+        words_per_document=args.doc_words,
+        n_queries=args.queries,
+        seed=args.seed
+    )
+    processor = DocumentProcessor(chunk_size=args.chunk_size, chunk_overlap=args.chunk_overlap)
+    store_kwargs = {
+        "dimension": manager.dimension,
+        "index_type": args.index_type,
+        "encoding": args.encoding,
+        "nlist": args.nlist,
+        "promotion_threshold": args.promotion_threshold,
+        "rerank": args.rerank
+    }
+    
+    result = {"documents": n_documents}
+    chunks, result["chunking"] = bench_chunking(processor, documents)
+    embeddings, result["embedding"] = bench_embeddings(manager, chunks, args.batch_size)
+    
+    store = VectorStore(**store_kwargs)
+    result["index"] = bench_index(store, chunks, embeddings)
+    result["search"] = bench_search(store, manager, queries, args.k, args.search_mode, args.search_batch_size)
+    result["persistence"] = bench_persistence(
+        store,
+        store_kwargs,
+        os.path.join(workdir, f"store_{n_documents}"),
+        chunks,
+        embeddings
+    )
+    
+    service = RAGService(
+        data_dir=os.path.join(workdir, f"service_{n_documents}"),
+        embedding_manager=manager,
+        vector_store=store,
+        llm_handler=StubLLM(args.llm_latency_ms),
+        search_mode=args.search_mode
+    )
+    result["end_to_end"] = bench_end_to_end(service, queries[:args.e2e_queries], args.k)
+    result["peak_rss_mb"] = peak_rss_mb()
+    store.close()
+    return result
+
+def evaluate_size(args: argparse.Namespace, manager: EmbeddingManager, n_documents: int) -> Dict[str, Any]:
+    """
+    Évalue le rappel des configurations d'index sur un corpus d'une taille donnée.
+    
+    Args:
+        args: Arguments de la ligne de commande
+        manager: Gestionnaire d'embeddings
+        n_documents: Nombre de documents du corpus
+    
+    Returns:
+        Résultats par configuration et configuration recommandée
+    """
+    documents, queries = synthetic_corpus(
+        n_documents,
+        words_per_document=args.doc_words,
+        n_queries=args.queries,
+        seed=args.seed
+    )
+    processor = DocumentProcessor(chunk_size=args.chunk_size, chunk_overlap=args.chunk_overlap)
+    chunks, _ = bench_chunking(processor, documents)
+    embeddings, _ = bench_embeddings(manager, chunks, args.batch_size)
+    query_embeddings = manager.get_query_embeddings_array([query["query"] for query in queries])
+    
+    configurations = evaluate_configurations(chunks, embeddings, query_embeddings, k=args.k)
+    recommended = cheapest_configuration(configurations, args.target_recall, args.objective)
+    return {
+        "documents": n_documents,
+        "chunks": len(chunks),
+        "k": args.k,
+        "target_recall": args.target_recall,
+        "objective": args.objective,
+        "configurations": configurations,
+        "recommended": recommended
+    }
+
+def print_evaluation(run: Dict[str, Any]):
+    """Affiche le tableau des configurations évaluées et la recommandation."""
+    print(f"  {'configuration':<36} {'recall@' + str(run['k']):>9} {'MRR':>7} {'p50 ms':>8} {'p99 ms':>8} {'octets/vec':>10}")
+    for result in run["configurations"]:
+        print(
+            f"  {result['name']:<36} {result['recall_at_k']:>9.3f} {result['mrr']:>7.3f} "
+            f"{result['p50_ms']:>8.3f} {result['p99_ms']:>8.3f} {result['bytes_per_vector']:>10.1f}"
+        )
+    if run["recommended"] is None:
+        print(f"  Aucune configuration n'atteint un recall@{run['k']} de {run['target_recall']}.")
+    else:
+        print(f"  Recommandée ({run['objective']}, recall@{run['k']} >= {run['target_recall']}) : {run['recommended']['name']}")
+
+def environment() -> Dict[str, Any]:
+    """Décrit l'environnement de mesure (pour comparer des résultats comparables)."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "faiss": faiss.__version__,
+        "numpy": np.__version__
+    }
+
+# Métriques comparées à la référence, et sens de l'amélioration (True : plus grand = meilleur)
+_COMPARED_METRICS = {
+    ("chunking", "chunks_per_sec"): True,
+    ("embedding", "docs_per_sec"): True,
+    ("index", "seconds"): False,
+    ("index", "index_bytes"): False,
+    ("search", "p50_ms"): False,
+    ("search", "p99_ms"): False,
+    ("search", "batched_qps"): True,
+    ("search", "source_hit_rate"): True,
+    ("persistence", "delta_save_seconds"): False,
+    ("persistence", "load_seconds"): False,
+    ("end_to_end", "p50_ms"): False,
+    ("end_to_end", "p99_ms"): False
+}
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """
+    Compare des résultats à une référence et signale les régressions.
+    
+    Args:
+        results: Résultats de l'exécution courante
+        baseline: Résultats de référence (même format)
+        tolerance: Dégradation relative tolérée (0.1 pour 10 %)
+    
+    Returns:
+        Lignes de comparaison, préfixées par "REGRESSION" au-delà de la tolérance
+    """
+    lines = []
+    reference = {run["documents"]: run for run in baseline.get("runs", [])}
+    for run in results["runs"]:
+        previous = reference.get(run["documents"])
+        if previous is None:
+            continue
+        for (section, metric), higher_is_better in _COMPARED_METRICS.items():
+            current = run.get(section, {}).get(metric)
+            before = previous.get(section, {}).get(metric)
+            if not current or not before:
+                continue
+            change = (current - before) / before
+            degraded = -change if higher_is_better else change
+            prefix = "REGRESSION" if degraded > tolerance else "ok"
+            lines.append(f"{prefix:<10} {run['documents']:>7} docs  {section}.{metric}: {before} -> {current} ({change:+.1%})")
+    return lines
+
+def main():
+    """Point d'entrée du banc d'essai."""
+    parser = argparse.ArgumentParser(description="Banc d'essai des performances du système Q&A RAG")
+    parser.add_argument("--sizes", default="100,1000", help="Tailles des corpus, en nombre de documents (séparées par des virgules)")
+    parser.add_argument("--doc-words", type=int, default=600, help="Nombre moyen de mots par document")
+    parser.add_argument("--queries", type=int, default=200, help="Nombre de requêtes de recherche")
+    parser.add_argument("--e2e-queries", type=int, default=50, help="Nombre de requêtes de bout en bout")
+    parser.add_argument("--seed", type=int, default=0, help="Graine du générateur de corpus")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="Taille des chunks de texte")
+    parser.add_argument("--chunk-overlap", type=int, default=200, help="Chevauchement entre les chunks")
+    parser.add_argument(
+        "--embedder",
+        default="hashing",
+        choices=("hashing",) + EMBEDDING_BACKENDS,
+        help="Encodeur : hachage des termes (hors ligne) ou moteur du modèle d'embeddings"
+    )
+    parser.add_argument("--quantized", action="store_true", help="Modèle d'embeddings quantifié en int8 (moteur onnx)")
+    parser.add_argument("--threads", type=int, default=None, help="Nombre de threads de calcul des embeddings")
+    parser.add_argument("--dimension", type=int, default=384, help="Dimension des vecteurs de l'encodeur par hachage")
+    parser.add_argument("--batch-size", type=int, default=32, help="Nombre de chunks par lot d'embeddings")
+    parser.add_argument("--index-type", default="flat", choices=INDEX_TYPES, help="Type d'index FAISS")
+    parser.add_argument("--encoding", default="float32", choices=ENCODINGS, help="Encodage des vecteurs dans l'index")
+    parser.add_argument("--rerank", action="store_true", help="Reclasser les candidats en pleine précision")
+    parser.add_argument("--nlist", type=int, default=256, help="Nombre de listes inversées des index IVF")
+    parser.add_argument("--promotion-threshold", type=int, default=1000, help="Taille à partir de laquelle l'index est promu")
+    parser.add_argument("--search-mode", default="hybrid", choices=SEARCH_MODES, help="Mode de recherche")
+    parser.add_argument("--k", type=int, default=4, help="Nombre de résultats par requête")
+    parser.add_argument("--search-batch-size", type=int, default=32, help="Nombre de requêtes par lot pour le débit")
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0, help="Latence simulée du LLM factice")
+    parser.add_argument("--evaluate", action="store_true", help="Évaluer le rappel des configurations d'index au lieu des performances")
+    parser.add_argument("--target-recall", type=float, default=0.95, help="Recall@k minimal de la configuration recommandée")
+    parser.add_argument("--objective", default="latency", choices=OBJECTIVES, help="Coût minimisé par la recommandation")
+    parser.add_argument("--output", default="benchmark_results.json", help="Fichier JSON des résultats")
+    parser.add_argument("--baseline", default=None, help="Résultats de référence à comparer")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Dégradation relative tolérée avant de signaler une régression")
+    args = parser.parse_args()
+    
+    sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+    manager = create_embedding_manager(args)
+    results = {
+        "environment": environment(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "baseline")},
+        "runs": []
+    }
+    
+    workdir = tempfile.mkdtemp(prefix="qna_benchmark_")
+    try:
+        for n_documents in sizes:
+            print(f"Corpus de {n_documents} documents...", flush=True)
+            if args.evaluate:
+                run = evaluate_size(args, manager, n_documents)
+                results["runs"].append(run)
+                print_evaluation(run)
+                continue
+            run = run_size(args, manager, n_documents, workdir)
+            results["runs"].append(run)
+            print(
+                f"  {run['chunking']['chunks']} chunks | embeddings {run['embedding']['docs_per_sec']} docs/s | "
+                f"index {run['index']['seconds']} s | recherche p50 {run['search']['p50_ms']} ms, "
+                f"p99 {run['search']['p99_ms']} ms, {run['search']['batched_qps']} req/s | "
+                f"chargement {run['persistence']['load_seconds']} s | bout en bout p50 {run['end_to_end']['p50_ms']} ms",
+                flush=True
+            )
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print(f"Résultats écrits dans {args.output}")
+    
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            lines = compare(results, json.load(f), args.tolerance)
+        print("\n".join(lines))
+        if any(line.startswith("REGRESSION") for line in lines):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,310 @@
+"""
+Service HTTP headless pour le système Q&A basé sur RAG.
+
+Un seul modèle d'embeddings et un seul index sont partagés par toutes les
+requêtes ; les requêtes concurrentes sont regroupées en micro-lots.
+
+Usage:
+    python server.py --host 0.0.0.0 --port 8000
+"""
+import asyncio
+import argparse
+import contextlib
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from aiohttp import web
+from dotenv import load_dotenv
+
+# Charger les variables d'environnement
+load_dotenv()
+
+from utils.rag_service import RAGService, QueryBatcher
+from utils.vector_store import SEARCH_MODES, METRICS
+from utils.document_store import DocumentStore
+from utils.sharded_store import DEFAULT_COLLECTION
+from utils.embedding_backends import EMBEDDING_BACKENDS
+from utils.reranker import CrossEncoderReranker, DEFAULT_RERANK_MODEL
+from utils.telemetry import telemetry
+
+# Nombre maximal de documents retournés par requête (borne le coût de la recherche et du contexte)
+MAX_K = 100
+
+class UploadedBytes:
+    """Fichier reçu en multipart, exposant la même interface qu'un fichier Streamlit."""
+    
+    def __init__(self, name: str, data: bytes):
+        """
+        Args:
+            name: Nom du fichier
+            data: Contenu binaire du fichier
+        """
+        self.name = name
+        self._data = data
+    
+    def getvalue(self) -> bytes:
+        """Retourne le contenu binaire du fichier."""
+        return self._data
+
+def serialize_hit(doc, score):
+    """Convertit un résultat de recherche en dictionnaire JSON."""
+    return {"id": doc["id"], "text": doc["text"], "metadata": doc["metadata"], "score": score}
+
+async def handle_health(request):
+    """Retourne l'état du service."""
+    service = request.app["service"]
+    return web.json_response(service.health())
+
+async def handle_metrics(request):
+    """Exporte les métriques au format Prometheus, ou en JSON avec `?format=json`."""
+    metrics_format = request.query.get("format", "prometheus")
+    try:
+        body = request.app["service"].metrics(metrics_format)
+    except ValueError as e:
+        raise web.HTTPBadRequest(text=str(e))
+    if metrics_format == "json":
+        return web.Response(text=body, content_type="application/json")
+    return web.Response(text=body, headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+async def handle_query(request):
+    """
+    Recherche les documents pertinents et génère éventuellement une réponse.
+    
+    Corps JSON: {"question": str, "k": int entre 1 et MAX_K (défaut 4), "generate": bool (défaut true),
+    "stream": bool (défaut false), "filters": dict (optionnel)}. Avec "stream", la
+    réponse est envoyée en texte brut au fil de la génération, sans les documents.
+    Les filtres restreignent la recherche, par exemple {"source": "client.pdf",
+    "page": {"min": 2, "max": 5}}.
+    """
+    try:
+        payload = await request.json()
+    except ValueError:
+        raise web.HTTPBadRequest(text="Corps JSON invalide.")
+    if not isinstance(payload, dict):
+        raise web.HTTPBadRequest(text="Le corps JSON doit être un objet.")
+    
+    question = payload.get("question")
+    if not isinstance(question, str) or not question.strip():
+        raise web.HTTPBadRequest(text="Le champ 'question' est requis (texte).")
+    question = question.strip()
+    k = payload.get("k", 4)
+    if not isinstance(k, int) or isinstance(k, bool) or not 1 <= k <= MAX_K:
+        raise web.HTTPBadRequest(text=f"Le champ 'k' doit être un entier entre 1 et {MAX_K}.")
+    filters = payload.get("filters")
+    if filters is not None:
+        # Valider avant le micro-lot : un filtre invalide ne doit pas faire échouer les autres requêtes
+        try:
+            DocumentStore.validate_filters(filters)
+        except ValueError as e:
+            raise web.HTTPBadRequest(text=str(e))
+    for option in ("generate", "stream"):
+        if not isinstance(payload.get(option, False), bool):
+            raise web.HTTPBadRequest(text=f"Le champ '{option}' doit être un booléen.")
+    
+    service = request.app["service"]
+    # Tracer la requête seulement si les traces sont exportées ; la recherche en micro-lot,
+    # partagée, est ajoutée à la trace de chaque requête du lot
+    trace = telemetry.trace("query") if telemetry.jsonl_path else contextlib.nullcontext()
+    with trace:
+        return await answer_query(request, service, payload, question, k, filters)
+
+async def answer_query(request, service, payload, question, k, filters):
+    """Recherche les documents d'une requête validée et construit la réponse (voir `handle_query`)."""
+    query_embedding, hits = await request.app["batcher"].submit(question, k, filters)
+    context_docs = [doc for doc, _ in hits]
+    
+    if payload.get("stream", False):
+        if service.llm_handler is None and context_docs:
+            raise web.HTTPServiceUnavailable(text="Aucun LLM configuré. Définissez GROQ_API_KEY.")
+        stream = web.StreamResponse(headers={"Content-Type": "text/plain; charset=utf-8"})
+        await stream.prepare(request)
+        async for token in service.astream_answer(question, context_docs, query_embedding):
+            await stream.write(token.encode("utf-8"))
+        await stream.write_eof()
+        return stream
+    
+    response = {"question": question, "sources": [serialize_hit(doc, score) for doc, score in hits]}
+    
+    if payload.get("generate", True):
+        try:
+            # Appel asynchrone : les générations concurrentes n'occupent pas de threads
+            response["answer"] = await service.aanswer(question, context_docs, query_embedding)
+        except RuntimeError as e:
+            raise web.HTTPServiceUnavailable(text=str(e))
+    
+    return web.json_response(response)
+
+async def handle_ingest(request):
+    """
+    Ingère des fichiers et des URLs.
+    
+    Accepte un formulaire multipart (champs `files` et `urls`) ou un corps
+    JSON {"urls": [...]} (liste de chaînes).
+    """
+    files = []
+    urls = []
+    if request.content_type.startswith("multipart/"):
+        reader = await request.multipart()
+        async for part in reader:
+            if part.filename:
+                files.append(UploadedBytes(part.filename, await part.read()))
+            elif part.name == "urls":
+                urls.extend(url.strip() for url in (await part.text()).splitlines() if url.strip())
+    else:
+        try:
+            payload = await request.json()
+        except ValueError:
+            raise web.HTTPBadRequest(text="Corps JSON invalide.")
+        if not isinstance(payload, dict):
+            raise web.HTTPBadRequest(text="Le corps JSON doit être un objet.")
+        urls = payload.get("urls", [])
+        if not isinstance(urls, list) or not all(isinstance(url, str) for url in urls):
+            raise web.HTTPBadRequest(text="Le champ 'urls' doit être une liste de chaînes.")
+        urls = [url.strip() for url in urls if url.strip()]
+    
+    if not files and not urls:
+        raise web.HTTPBadRequest(text="Aucun fichier ni URL fourni.")
+    
+    loop = asyncio.get_running_loop()
+    # Le thread d'ingestion reçoit une copie du contexte, pour rattacher ses spans à la trace en cours
+    events = await loop.run_in_executor(
+        request.app["executor"],
+        contextvars.copy_context().run,
+        request.app["service"].ingest,
+        files,
+        urls
+    )
+    return web.json_response({"events": events})
+
+async def close_llm_client(app):
+    """Ferme les connexions du client LLM à l'arrêt du service."""
+    if app["service"].llm_handler is not None:
+        await app["service"].llm_handler.aclose()
+
+def create_app(service: RAGService, max_batch_size: int = 32, max_wait_ms: float = 5.0) -> web.Application:
+    """
+    Crée l'application aiohttp.
+    
+    Args:
+        service: Service RAG partagé
+        max_batch_size: Taille maximale d'un micro-lot de requêtes
+        max_wait_ms: Délai maximal d'attente d'un micro-lot
+    
+    Returns:
+        Application aiohttp prête à être servie
+    """
+    app = web.Application(client_max_size=100 * 1024 * 1024)
+    app["service"] = service
+    app["executor"] = ThreadPoolExecutor(max_workers=8)
+    app["batcher"] = QueryBatcher(service.retrieve_batch, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+    app.on_cleanup.append(close_llm_client)
+    app.add_routes([
+        web.get("/health", handle_health),
+        web.get("/metrics", handle_metrics),
+        web.post("/query", handle_query),
+        web.post("/ingest", handle_ingest)
+    ])
+    return app
+
+def main():
+    """Point d'entrée du service HTTP."""
+    parser = argparse.ArgumentParser(description="Service HTTP du système Q&A RAG")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--collection", default=DEFAULT_COLLECTION, help="Collection servie")
+    parser.add_argument("--shards", type=int, default=4, help="Nombre de shards d'une nouvelle collection")
+    parser.add_argument("--batch-size", type=int, default=32, help="Taille maximale d'un micro-lot de requêtes")
+    parser.add_argument("--batch-wait-ms", type=float, default=5.0, help="Délai maximal d'attente d'un micro-lot")
+    parser.add_argument(
+        "--search-mode",
+        default="hybrid",
+        choices=SEARCH_MODES,
+        help="Mode de recherche : dense, BM25 ou fusion des deux"
+    )
+    parser.add_argument(
+        "--metric",
+        default="l2",
+        choices=METRICS,
+        help="Métrique des index ; une collection sauvegardée avec une autre métrique est reconstruite "
+             "(et réécrite) à son premier chargement"
+    )
+    parser.add_argument(
+        "--min-score",
+        type=float,
+        default=None,
+        help="Similarité minimale d'un document retrouvé ; sans document assez similaire, le LLM n'est pas appelé"
+    )
+    parser.add_argument(
+        "--embedding-backend",
+        default="sentence-transformers",
+        choices=EMBEDDING_BACKENDS,
+        help="Moteur d'inférence des embeddings"
+    )
+    parser.add_argument("--embedding-quantized", action="store_true", help="Modèle d'embeddings quantifié en int8 (moteur onnx)")
+    parser.add_argument("--embedding-batch-size", type=int, default=32, help="Nombre de textes encodés par passe")
+    parser.add_argument("--embedding-threads", type=int, default=None, help="Nombre de threads de calcul des embeddings")
+    parser.add_argument("--llm-concurrency", type=int, default=8, help="Nombre maximal d'appels simultanés au LLM")
+    parser.add_argument("--llm-rate", type=float, default=None, help="Débit maximal d'appels au LLM, par seconde")
+    parser.add_argument("--llm-retries", type=int, default=4, help="Nouvelles tentatives après une erreur transitoire du LLM")
+    parser.add_argument(
+        "--llm-hedge-ms",
+        type=float,
+        default=None,
+        help="Délai après lequel un appel au LLM sans réponse est doublé (désactivé par défaut)"
+    )
+    parser.add_argument("--rerank", action="store_true", help="Réordonner les candidats avec un cross-encoder local")
+    parser.add_argument("--rerank-model", default=DEFAULT_RERANK_MODEL, help="Cross-encoder utilisé par --rerank")
+    parser.add_argument("--rerank-candidates", type=int, default=20, help="Nombre de candidats réordonnés par requête")
+    parser.add_argument(
+        "--rerank-budget-ms",
+        type=float,
+        default=None,
+        help="Durée maximale du réordonnancement d'un micro-lot, au-delà de laquelle l'ordre de la recherche est gardé"
+    )
+    parser.add_argument("--telemetry", action="store_true", help="Mesurer les étapes du pipeline et exposer /metrics")
+    parser.add_argument("--telemetry-jsonl", default=None, help="Fichier où ajouter la trace de chaque requête en JSON")
+    args = parser.parse_args()
+    if args.min_score is not None and args.metric == "l2":
+        parser.error("--min-score requiert la métrique 'cosine' ou 'inner_product'")
+    if args.min_score is not None and args.search_mode == "lexical":
+        parser.error("--min-score ne s'applique pas au mode de recherche 'lexical'")
+    
+    if args.telemetry or args.telemetry_jsonl:
+        telemetry.enabled = True
+        telemetry.jsonl_path = args.telemetry_jsonl or telemetry.jsonl_path
+    
+    reranker = None
+    if args.rerank:
+        reranker = CrossEncoderReranker(
+            args.rerank_model,
+            num_threads=args.embedding_threads,
+            latency_budget_ms=args.rerank_budget_ms
+        )
+    
+    service = RAGService(
+        data_dir=args.data_dir,
+        collection=args.collection,
+        n_shards=args.shards,
+        search_mode=args.search_mode,
+        embedding_options={
+            "backend": args.embedding_backend,
+            "quantized": args.embedding_quantized,
+            "batch_size": args.embedding_batch_size,
+            "num_threads": args.embedding_threads
+        },
+        llm_options={
+            "max_concurrency": args.llm_concurrency,
+            "requests_per_second": args.llm_rate,
+            "max_retries": args.llm_retries,
+            "hedge_after": args.llm_hedge_ms / 1000.0 if args.llm_hedge_ms is not None else None
+        },
+        reranker=reranker,
+        rerank_candidates=args.rerank_candidates,
+        store_options={"metric": args.metric},
+        min_score=args.min_score
+    )
+    app = create_app(service, max_batch_size=args.batch_size, max_wait_ms=args.batch_wait_ms)
+    web.run_app(app, host=args.host, port=args.port)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+"""
+Tests du client LLM asynchrone contre un serveur bouchon local.
+"""
+import time
+import socket
+import threading
+import asyncio
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from utils.llm_client import AsyncLLMClient, TokenBucket
+
+MESSAGES = [{"role": "user", "content": "Bonjour"}]
+
+class StubAPI:
+    """API de chat bouchon : rejoue un script de réponses et mesure les appels reçus."""
+    
+    def __init__(self, script=None, delay: float = 0.0):
+        """
+        Args:
+            script: Réponses des premiers appels, tuples (statut, en-têtes, délai, contenu)
+            delay: Délai des appels au-delà du script (réponse 200)
+        """
+        self.script = list(script or [])
+        self.delay = delay
+        self.arrivals = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+    
+    async def handle(self, request: web.Request) -> web.Response:
+        attempt = len(self.arrivals)
+        self.arrivals.append(time.monotonic())
+        status, headers, delay, content = (
+            self.script[attempt] if attempt < len(self.script) else (200, {}, self.delay, None)
+        )
+        
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(delay)
+        finally:
+            self.in_flight -= 1
+        
+        if status == 200:
+            return web.json_response({"choices": [{"message": {"content": content or f"réponse {attempt}"}}]})
+        return web.Response(status=status, headers=headers, text="erreur du bouchon")
+    
+    def gaps(self):
+        """Délais entre appels successifs, en secondes."""
+        return [after - before for before, after in zip(self.arrivals, self.arrivals[1:])]
+
+async def call(api: StubAPI, requests: int = 1, **options):
+    """Lance le serveur bouchon, envoie des appels concurrents puis ferme client et serveur."""
+    app = web.Application()
+    app.router.add_post("/chat/completions", api.handle)
+    server = TestServer(app)
+    await server.start_server()
+    client = AsyncLLMClient("clé-de-test", "modèle", base_url=str(server.make_url("")), **options)
+    try:
+        return await asyncio.gather(*(client.complete(MESSAGES) for _ in range(requests)))
+    finally:
+        await client.aclose()
+        await server.close()
+
+def test_retries_rate_limit_server_error_and_timeout():
+    api = StubAPI([
+        (429, {"Retry-After": "0.3"}, 0.0, None),
+        (503, {}, 0.0, None),
+        (200, {}, 1.0, "trop tard"),
+        (200, {}, 0.0, "succès")
+    ])
+    
+    responses = asyncio.run(call(api, max_retries=4, backoff_base=0.05, timeout=0.4))
+    
+    assert responses == ["succès"]
+    assert len(api.arrivals) == 4
+    after_429, after_503, after_timeout = api.gaps()
+    # Retry-After est respecté ; une erreur 5xx est retentée après un délai borné par backoff_base
+    assert after_429 >= 0.3
+    assert after_503 < 0.3
+    # L'appel lent est abandonné au bout du timeout, puis retenté
+    assert 0.4 <= after_timeout < 1.0
+
+def test_client_error_is_not_retried():
+    api = StubAPI([(400, {}, 0.0, None)])
+    
+    with pytest.raises(RuntimeError, match="refusé"):
+        asyncio.run(call(api, max_retries=3, backoff_base=0.01))
+    assert len(api.arrivals) == 1
+
+def test_gives_up_after_max_retries():
+    api = StubAPI([(503, {}, 0.0, None)] * 5)
+    
+    with pytest.raises(RuntimeError, match="3 tentatives"):
+        asyncio.run(call(api, max_retries=2, backoff_base=0.01))
+    assert len(api.arrivals) == 3
+
+def test_network_errors_are_retried():
+    # Port libéré aussitôt réservé : les connexions sont refusées
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    
+    async def run():
+        client = AsyncLLMClient("clé-de-test", "modèle", base_url=f"http://127.0.0.1:{port}", max_retries=2, backoff_base=0.01)
+        try:
+            await client.complete(MESSAGES)
+        finally:
+            await client.aclose()
+    
+    with pytest.raises(RuntimeError, match="3 tentatives"):
+        asyncio.run(run())
+
+def test_concurrency_is_capped():
+    api = StubAPI(delay=0.1)
+    
+    responses = asyncio.run(call(api, requests=10, max_concurrency=3))
+    
+    assert len(responses) == 10
+    assert api.max_in_flight == 3
+
+def test_request_rate_is_limited():
+    api = StubAPI()
+    
+    asyncio.run(call(api, requests=5, requests_per_second=10, burst=1))
+    
+    # Un appel toutes les 100 ms, le premier sans attendre
+    assert api.arrivals[-1] - api.arrivals[0] >= 0.35
+
+def test_token_bucket_allows_bursts_then_paces():
+    async def acquire_all():
+        bucket = TokenBucket(rate=20, capacity=2)
+        start = time.monotonic()
+        for _ in range(6):
+            await bucket.acquire()
+        return time.monotonic() - start
+    
+    # Deux jetons disponibles d'emblée, puis un toutes les 50 ms
+    assert 0.18 <= asyncio.run(acquire_all()) < 0.5
+
+def test_first_hedged_response_wins():
+    api = StubAPI([
+        (200, {}, 1.0, "lente"),
+        (200, {}, 0.0, "rapide")
+    ])
+    
+    start = time.monotonic()
+    responses = asyncio.run(call(api, hedge_after=0.1))
+    
+    assert responses == ["rapide"]
+    assert len(api.arrivals) == 2
+    # Écart mesuré côté serveur : la première arrivée peut elle-même avoir été retardée
+    assert 0.05 <= api.gaps()[0] < 0.5
+    assert time.monotonic() - start < 1.0
+
+def test_llm_handler_uses_async_client():
+    pytest.importorskip("langchain_groq")
+    from utils.llm_handler import LLMHandler
+    
+    api = StubAPI([(429, {"Retry-After": "0.1"}, 0.0, None), (200, {}, 0.0, "réponse du LLM")])
+    
+    async def run():
+        app = web.Application()
+        app.router.add_post("/chat/completions", api.handle)
+        server = TestServer(app)
+        await server.start_server()
+        handler = LLMHandler(api_key="clé-de-test", client_options={"base_url": str(server.make_url(""))})
+        try:
+            return await handler.aget_response("Question ?", [{"text": "Contexte", "metadata": {"source": "a.pdf"}}])
+        finally:
+            await handler.aclose()
+            await server.close()
+    
+    assert asyncio.run(run()) == "réponse du LLM"
+    assert len(api.arrivals) == 2
+
+class ThreadedStub:
+    """Serveur bouchon sur sa propre boucle, dans un thread : il survit aux boucles des clients."""
+    
+    def __init__(self, api: StubAPI):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+        app = web.Application()
+        app.router.add_post("/chat/completions", api.handle)
+        self.server = TestServer(app)
+        asyncio.run_coroutine_threadsafe(self.server.start_server(), self.loop).result()
+        self.url = str(self.server.make_url(""))
+    
+    def close(self):
+        asyncio.run_coroutine_threadsafe(self.server.close(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+def test_session_of_a_finished_loop_is_closed():
+    stub = ThreadedStub(StubAPI())
+    client = AsyncLLMClient("clé-de-test", "modèle", base_url=stub.url)
+    sessions = []
+    
+    async def complete():
+        response = await client.complete(MESSAGES)
+        sessions.append(client._session)
+        return response
+    
+    try:
+        # Une boucle par appel, comme avec des appels successifs à asyncio.run
+        assert asyncio.run(complete()) == "réponse 0"
+        assert asyncio.run(complete()) == "réponse 1"
+        assert sessions[0] is not sessions[1]
+        assert sessions[0].closed
+    finally:
+        asyncio.run(client.aclose())
+        stub.close()
+
+def test_session_of_a_running_loop_is_closed_on_that_loop():
+    stub = ThreadedStub(StubAPI())
+    client = AsyncLLMClient("clé-de-test", "modèle", base_url=stub.url)
+    other_loop = asyncio.new_event_loop()
+    other_thread = threading.Thread(target=other_loop.run_forever, daemon=True)
+    other_thread.start()
+    
+    try:
+        asyncio.run_coroutine_threadsafe(client.complete(MESSAGES), other_loop).result()
+        previous = client._session
+        
+        async def complete_then_wait():
+            response = await client.complete(MESSAGES)
+            # La fermeture est confiée à l'autre boucle, qui tourne toujours
+            for _ in range(50):
+                if previous.closed:
+                    break
+                await asyncio.sleep(0.01)
+            return response
+        
+        assert asyncio.run(complete_then_wait()) == "réponse 1"
+        assert previous.closed
+    finally:
+        asyncio.run(client.aclose())
+        other_loop.call_soon_threadsafe(other_loop.stop)
+        other_thread.join()
+        other_loop.close()
+        stub.close()
@@ -0,0 +1,271 @@
+"""
+Tests de la persistance du vector store : journal, compaction, versions publiées et migrations.
+"""
+import json
+import os
+import threading
+from unittest import mock
+
+import numpy as np
+import pytest
+
+from utils.sharded_store import CollectionManager, ShardedVectorStore
+from utils.vector_store import VectorStore
+
+DIMENSION = 8
+
+rng = np.random.default_rng(0)
+
+def chunks(source, n, tag=""):
+    docs = [{"text": f"{source} {tag} chunk {i}", "metadata": {"source": source}} for i in range(n)]
+    return docs, rng.random((n, DIMENSION), dtype=np.float32)
+
+def all_ids(store):
+    """Identifiants de tous les chunks retournés par une recherche exacte sur tout le stockage."""
+    if len(store) == 0:
+        return set()
+    query = np.zeros((1, DIMENSION), dtype=np.float32)
+    return {doc["id"] for doc, _ in store.search_batch(query, len(store))[0]}
+
+def checkpoint(directory):
+    with open(os.path.join(directory, "vector_store.checkpoint.json"), encoding="utf-8") as f:
+        return json.load(f)
+
+def test_wal_replay_after_crash_before_checkpoint(tmp_path):
+    directory = str(tmp_path)
+    # Journal jamais compacté : seul le point de reprise initial existe
+    store = VectorStore(dimension=DIMENSION, compaction_ratio=1e9, background_compaction=False)
+    store.add_documents(*chunks("a", 20))
+    store.save(directory)
+    store.upsert_source("b", *chunks("b", 10))
+    store.delete_source("a")
+    store.upsert_source("a", *chunks("a", 5, "v2"))
+    store.save(directory)
+    assert checkpoint(directory)["sequence"] == 1
+    
+    query = rng.random((3, DIMENSION), dtype=np.float32)
+    expected = [[doc["id"] for doc, _ in ranking] for ranking in store.search_batch(query, 5)]
+    sources = store.list_sources()
+    
+    # Arrêt brutal entre l'écriture du journal et la validation des documents, écriture suivante tronquée
+    store.add_documents(*chunks("c", 7))
+    with mock.patch.object(VectorStore, "_commit", side_effect=OSError("arrêt brutal")):
+        with pytest.raises(OSError):
+            store.save(directory)
+    store.close()
+    wal_path = os.path.join(directory, "vector_store.wal")
+    with open(wal_path, "ab") as f:
+        f.write(b"RWAL\x01garbage")
+    wal_size = os.path.getsize(wal_path)
+    
+    reloaded = VectorStore(dimension=DIMENSION, compaction_ratio=1e9, background_compaction=False)
+    assert reloaded.load(directory)
+    
+    assert reloaded.list_sources() == sources
+    assert [[doc["id"] for doc, _ in ranking] for ranking in reloaded.search_batch(query, 5)] == expected
+    # Le chargement ne réécrit pas le journal
+    assert os.path.getsize(wal_path) == wal_size
+    
+    # La séquence jamais validée est écartée avant d'être réutilisée
+    reloaded.add_documents(*chunks("d", 3))
+    reloaded.save(directory)
+    reloaded.close()
+    again = VectorStore(dimension=DIMENSION)
+    assert again.load(directory)
+    assert again.list_sources() == {**sources, "d": 3}
+    assert len(again) == sum(again.list_sources().values())
+    again.close()
+
+def test_compaction_rewrites_checkpoint_and_empties_wal(tmp_path):
+    directory = str(tmp_path)
+    store = VectorStore(dimension=DIMENSION, background_compaction=False)
+    store.add_documents(*chunks("a", 20))
+    store.save(directory)
+    store.upsert_source("b", *chunks("b", 10))
+    store.save(directory, compact=True)
+    
+    assert checkpoint(directory) == {"index": "vector_store.0000000002.index", "sequence": 2}
+    assert not os.path.exists(os.path.join(directory, "vector_store.0000000001.index"))
+    assert os.path.getsize(os.path.join(directory, "vector_store.wal")) == 0
+    
+    reloaded = VectorStore(dimension=DIMENSION)
+    assert reloaded.load(directory)
+    assert all_ids(reloaded) == all_ids(store)
+    store.close()
+    reloaded.close()
+
+def test_failed_load_leaves_store_unchanged(tmp_path):
+    directory = str(tmp_path)
+    saved = VectorStore(dimension=DIMENSION)
+    saved.add_documents(*chunks("saved", 10))
+    saved.save(directory)
+    saved.close()
+    
+    store = VectorStore(dimension=DIMENSION)
+    store.add_documents(*chunks("a", 5))
+    ids = all_ids(store)
+    
+    # Le point de reprise disparaît après la lecture de l'index (compaction concurrente)
+    with mock.patch("utils.vector_store.os.path.getsize", side_effect=FileNotFoundError):
+        assert not store.load(directory)
+    
+    assert store.list_sources() == {"a": 5}
+    assert all_ids(store) == ids
+    store.add_documents(*chunks("b", 2))
+    store.save(str(tmp_path / "other"))
+    assert store.load(directory)
+    assert store.list_sources() == {"saved": 10}
+    store.close()
+
+def test_load_right_after_background_compaction_started(tmp_path):
+    directory = str(tmp_path)
+    store = VectorStore(dimension=DIMENSION, compaction_ratio=0)
+    store.add_documents(*chunks("a", 50))
+    store.save(directory)
+    store.add_documents(*chunks("b", 50))
+    store.save(directory)
+    
+    assert store.load(directory)
+    
+    assert store.list_sources() == {"a": 50, "b": 50}
+    assert all_ids(store) == set(range(100))
+    store.close()
+
+def test_load_during_concurrent_compaction(tmp_path):
+    directory = str(tmp_path)
+    batch = 10
+    writer = VectorStore(dimension=DIMENSION, compaction_ratio=0)
+    writer.add_documents(*chunks("s", batch))
+    writer.save(directory)
+    
+    def write():
+        # Chaque sauvegarde ajoute un lot et compacte en arrière-plan
+        for i in range(30):
+            writer.add_documents(*chunks(f"s{i}", batch))
+            writer.save(directory)
+    
+    thread = threading.Thread(target=write)
+    reader = VectorStore(dimension=DIMENSION)
+    loaded = 0
+    thread.start()
+    while thread.is_alive():
+        before = all_ids(reader)
+        if reader.load(directory):
+            # Chargement réussi : un état validé complet, sans lot manquant
+            loaded += 1
+            ids = all_ids(reader)
+            assert len(ids) % batch == 0
+            assert ids == set(range(len(ids)))
+        else:
+            assert all_ids(reader) == before
+    thread.join()
+    writer.close()
+    
+    assert reader.load(directory)
+    assert all_ids(reader) == set(range(31 * batch))
+    assert loaded > 0
+    reader.close()
+
+def test_searches_keep_their_version_during_upsert_and_delete():
+    store = VectorStore(dimension=DIMENSION)
+    store.add_documents(*chunks("a", 5))
+    store.add_documents(*chunks("b", 5))
+    query = rng.random((1, DIMENSION), dtype=np.float32)
+    
+    def texts():
+        # Recherche depuis un autre thread, pendant l'écriture en cours
+        found = []
+        thread = threading.Thread(target=lambda: found.extend(
+            doc["text"] for doc, _ in store.search_batch(query, 20)[0]
+        ))
+        thread.start()
+        thread.join()
+        return sorted(found)
+    
+    before = texts()
+    with store.batch():
+        store.delete_source("a")
+        store.upsert_source("b", *chunks("b", 3, "v2"))
+        store.add_documents(*chunks("c", 2))
+        assert texts() == before
+    
+    after = texts()
+    assert after == sorted(
+        [f"b v2 chunk {i}" for i in range(3)] + [f"c  chunk {i}" for i in range(2)]
+    )
+
+def test_pinned_version_ignores_in_place_adds_and_keeps_deleted_documents():
+    store = VectorStore(dimension=DIMENSION)
+    store.add_documents(*chunks("a", 5))
+    store.add_documents(*chunks("b", 5))
+    query = rng.random((1, DIMENSION), dtype=np.float32)
+    
+    with store._reading() as snapshot:
+        # Ajout en place dans l'index exact publié : au-delà du watermark de la version lue
+        store.add_documents(*chunks("c", 5))
+        assert snapshot.index is store.index and snapshot.index.ntotal == 15
+        ranking = store._dense_search(snapshot, query, 20, None, None)[0]
+        assert {idx for idx, _ in ranking} == set(range(10))
+        
+        # La suppression attend la fin de cette recherche pour effacer les documents
+        deletion = threading.Thread(target=store.delete_source, args=("a",))
+        deletion.start()
+        while not store._snapshot.hidden:
+            deletion.join(0.01)
+        assert all(chunk_id not in store._snapshot for chunk_id in range(5))
+        assert all(chunk_id in snapshot for chunk_id in range(5))
+        assert sorted(snapshot.documents.get_many(list(range(5)))) == list(range(5))
+        assert {doc["metadata"]["source"] for doc, _ in store.search_batch(query, 20)[0]} == {"b", "c"}
+    
+    deletion.join()
+    assert store.documents.get_many(list(range(5))) == {}
+    assert not store._snapshot.hidden
+    assert store.list_sources() == {"b": 5, "c": 5}
+
+def test_sharded_store_round_trip(tmp_path):
+    directory = str(tmp_path)
+    store = ShardedVectorStore(n_shards=2, dimension=DIMENSION)
+    store.add_documents(*chunks("x", 15))
+    store.add_documents(*chunks("y", 15))
+    store.save(directory)
+    store.add_documents(*chunks("z", 3))
+    store.save(directory)
+    sources = store.list_sources()
+    store.close()
+    
+    reloaded = ShardedVectorStore(n_shards=4, dimension=DIMENSION)
+    assert reloaded.load(directory)
+    assert len(reloaded.shards) == 2
+    assert reloaded.list_sources() == sources
+    reloaded.close()
+
+def test_incomplete_shard_is_an_error(tmp_path):
+    manager = CollectionManager(data_dir=str(tmp_path), n_shards=2, dimension=DIMENSION)
+    store = manager.get("docs")
+    store.add_documents(*chunks("x", 20))
+    manager.save("docs")
+    manager.close()
+    os.remove(os.path.join(manager.directory("docs"), "vector_store.shard1.sqlite"))
+    
+    with pytest.raises(RuntimeError):
+        CollectionManager(data_dir=str(tmp_path), n_shards=2, dimension=DIMENSION).get("docs")
+
+def test_legacy_store_is_migrated_to_default_collection(tmp_path):
+    import faiss
+    
+    # Ancien format : un index entier et ses documents, sans point de reprise ni journal
+    legacy = VectorStore(dimension=DIMENSION)
+    legacy.add_documents(*chunks("ancien", 12))
+    faiss.write_index(legacy.index, str(tmp_path / "vector_store.index"))
+    legacy.documents.save(str(tmp_path / "vector_store.sqlite"))
+    legacy.close()
+    
+    manager = CollectionManager(data_dir=str(tmp_path), n_shards=2, dimension=DIMENSION)
+    store = manager.get()
+    
+    assert store.list_sources() == {"ancien": 12}
+    assert os.path.exists(os.path.join(manager.directory("default"), "vector_store.shards.json"))
+    manager.close()
+    reopened = CollectionManager(data_dir=str(tmp_path), n_shards=2, dimension=DIMENSION)
+    assert reopened.get().list_sources() == {"ancien": 12}
+    reopened.close()
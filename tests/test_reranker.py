@@ -0,0 +1,65 @@
+"""
+Tests du cache de scores du réordonnanceur, avec un modèle factice.
+"""
+from utils.reranker import CrossEncoderReranker
+
+class FakeCrossEncoder:
+    """Cross-encoder factice : le score d'une paire est la longueur du texte du chunk."""
+    
+    def __init__(self):
+        self.pairs = []
+    
+    def predict(self, pairs, batch_size=16):
+        self.pairs.extend(pairs)
+        return [float(len(text)) for _, text in pairs]
+
+def hit(doc_id, text):
+    return ({"id": doc_id, "text": text, "metadata": {}}, 0.0)
+
+def test_reranks_by_cross_encoder_score():
+    reranker = CrossEncoderReranker(model=FakeCrossEncoder())
+    
+    ranked = reranker.rerank("question", [hit(0, "a"), hit(1, "ccc"), hit(2, "bb")], k=2)
+    
+    assert [(doc["id"], score) for doc, score in ranked] == [(1, 3.0), (2, 2.0)]
+
+def test_cache_is_keyed_by_chunk_text_not_id():
+    model = FakeCrossEncoder()
+    reranker = CrossEncoderReranker(model=model)
+    reranker.rerank("question", [hit(0, "ancien chunk")])
+    
+    # Collection vidée puis réalimentée : l'identifiant 0 désigne un autre chunk
+    ranked = reranker.rerank("question", [hit(0, "nouveau chunk plus long")])
+    
+    assert ranked[0][1] == float(len("nouveau chunk plus long"))
+    assert len(model.pairs) == 2
+
+def test_same_text_is_served_from_cache():
+    model = FakeCrossEncoder()
+    reranker = CrossEncoderReranker(model=model)
+    reranker.rerank("question", [hit(0, "chunk")])
+    
+    # Même texte sous un autre identifiant (réindexation) : score réutilisé
+    ranked = reranker.rerank("question", [hit(7, "chunk")])
+    
+    assert ranked[0][1] == 5.0
+    assert len(model.pairs) == 1
+    assert reranker.stats()["cached_scores"] == 1
+
+def test_clear_empties_the_cache():
+    model = FakeCrossEncoder()
+    reranker = CrossEncoderReranker(model=model)
+    reranker.rerank("question", [hit(0, "chunk")])
+    
+    reranker.clear()
+    reranker.rerank("question", [hit(0, "chunk")])
+    
+    assert reranker.stats()["cached_scores"] == 1
+    assert len(model.pairs) == 2
+
+def test_cache_evicts_least_recently_used_scores():
+    reranker = CrossEncoderReranker(model=FakeCrossEncoder(), cache_size=2)
+    
+    reranker.rerank("question", [hit(0, "a"), hit(1, "bb"), hit(2, "ccc")])
+    
+    assert reranker.stats()["cached_scores"] == 2
@@ -0,0 +1,43 @@
+"""
+Tests du rattachement des spans aux traces des requêtes.
+"""
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.telemetry import Telemetry
+
+def span_names(trace):
+    return [span["name"] for span in trace.to_dict()["spans"]]
+
+def test_spans_of_another_thread_need_a_copy_of_the_context():
+    telemetry = Telemetry()
+    
+    def step():
+        with telemetry.span("vector_store.search"):
+            pass
+    
+    with ThreadPoolExecutor(max_workers=1) as executor, telemetry.trace() as trace:
+        executor.submit(step).result()
+        assert span_names(trace) == []
+        executor.submit(contextvars.copy_context().run, step).result()
+        assert span_names(trace) == ["vector_store.search"]
+
+def test_shared_step_is_added_to_every_trace_of_the_batch():
+    telemetry = Telemetry()
+    traces = []
+    for _ in range(2):
+        with telemetry.trace() as trace:
+            traces.append(telemetry.current_trace())
+    
+    def batch():
+        with telemetry.shared_trace(traces + [None]):
+            with telemetry.span("rag.search", queries=2):
+                telemetry.count("queries", 2)
+    
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        executor.submit(contextvars.copy_context().run, batch).result()
+    
+    for trace in traces:
+        assert span_names(trace) == ["rag.search"]
+        assert trace.to_dict()["counters"] == {"queries": 2}
+    assert telemetry.current_trace() is None
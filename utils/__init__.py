@@ -1,17 +1,49 @@
 """
 Package d'utilitaires pour le système Q&A basé sur RAG.
+
+Les classes sont importées à la demande : importer le package ne charge ni
+langchain, ni FAISS, ni les bibliothèques vocales.
 """
+import importlib
+
+# Collection utilisée par défaut, définie ici pour être lue sans charger FAISS
+DEFAULT_COLLECTION = "default"
+
+# Classe exportée -> module qui la définit
+_EXPORTS = {
+    'DocumentProcessor': '.document_processor',
+    'EmbeddingManager': '.embeddings',
+    'SentenceTransformerBackend': '.embedding_backends',
+    'ONNXBackend': '.embedding_backends',
+    'EmbeddingCache': '.embedding_cache',
+    'VectorStore': '.vector_store',
+    'ShardedVectorStore': '.sharded_store',
+    'CollectionManager': '.sharded_store',
+    'DocumentStore': '.document_store',
+    'LexicalIndex': '.lexical_index',
+    'LLMHandler': '.llm_handler',
+    'AsyncLLMClient': '.llm_client',
+    'VoiceHandler': '.voice_handler',
+    'IngestionPipeline': '.ingestion',
+    'RAGService': '.rag_service',
+    'SemanticResponseCache': '.response_cache',
+    'CrossEncoderReranker': '.reranker',
+    'ContextAssembler': '.context_builder',
+    'BackgroundLoader': '.warmup',
+    'Telemetry': '.telemetry',
+    'WriteAheadLog': '.write_ahead_log'
+}
+
+__all__ = ['DEFAULT_COLLECTION'] + list(_EXPORTS)
 
-from .document_processor import DocumentProcessor
-from .embeddings import EmbeddingManager
-from .vector_store import VectorStore
-from .llm_handler import LLMHandler
-from .voice_handler import VoiceHandler
+def __getattr__(name):
+    """Importe le module d'une classe exportée au premier accès."""
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+    globals()[name] = value
+    return value
 
-__all__ = [
-    'DocumentProcessor',
-    'EmbeddingManager',
-    'VectorStore',
-    'LLMHandler',
-    'VoiceHandler'
-]
+def __dir__():
+    """Liste les attributs du package, y compris les classes pas encore importées."""
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,188 @@
+"""
+Module pour assembler le contexte du prompt dans un budget de tokens.
+"""
+import re
+from typing import List, Dict, Any, Optional, Callable
+
+class ContextAssembler:
+    """Fusionne, dédoublonne et tronque les chunks retrouvés pour tenir dans un budget de tokens."""
+    
+    def __init__(
+        self,
+        max_tokens: int = 3000,
+        duplicate_threshold: float = 0.85,
+        max_overlap_chars: int = 400,
+        chars_per_token: float = 4.0,
+        token_counter: Optional[Callable[[str], int]] = None
+    ):
+        """
+        Initialise l'assembleur de contexte.
+        
+        Args:
+            max_tokens: Budget maximal de tokens pour l'ensemble du contexte
+            duplicate_threshold: Part des trigrammes de mots d'un passage déjà présents
+                dans un passage mieux classé au-delà de laquelle il est considéré comme un doublon
+            max_overlap_chars: Longueur maximale du chevauchement recherché entre
+                deux chunks consécutifs d'une même source
+            chars_per_token: Nombre moyen de caractères par token pour l'estimation
+            token_counter: Fonction de comptage exacte des tokens (remplace l'estimation)
+        """
+        self.max_tokens = max_tokens
+        self.duplicate_threshold = duplicate_threshold
+        self.max_overlap_chars = max_overlap_chars
+        self.chars_per_token = chars_per_token
+        self.token_counter = token_counter
+    
+    def count_tokens(self, text: str) -> int:
+        """
+        Compte (ou estime) le nombre de tokens d'un texte.
+        
+        Args:
+            text: Texte à mesurer
+        
+        Returns:
+            Nombre de tokens
+        """
+        if self.token_counter is not None:
+            return self.token_counter(text)
+        return int(len(text) / self.chars_per_token) + 1
+    
+    def _merge_text(self, first: str, second: str) -> str:
+        """
+        Concatène deux chunks consécutifs en supprimant leur chevauchement.
+        
+        Args:
+            first: Texte du premier chunk
+            second: Texte du chunk suivant
+        
+        Returns:
+            Texte fusionné
+        """
+        longest = min(len(first), len(second), self.max_overlap_chars)
+        for length in range(longest, 0, -1):
+            if first.endswith(second[:length]):
+                return first + second[length:]
+        return first + "\n" + second
+    
+    @staticmethod
+    def _shingles(text: str) -> set:
+        """Calcule l'ensemble des trigrammes de mots d'un texte."""
+        words = re.findall(r"\w+", text.lower())
+        if len(words) < 3:
+            return {tuple(words)}
+        return {tuple(words[i:i + 3]) for i in range(len(words) - 2)}
+    
+    def _merge_adjacent(self, docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Regroupe les chunks consécutifs d'une même source en passages.
+        
+        Args:
+            docs: Documents classés par pertinence décroissante
+        
+        Returns:
+            Passages ({"source", "text", "rank"}), classés par meilleur rang
+        """
+        passages = []
+        by_source = {}
+        for rank, doc in enumerate(docs):
+            metadata = doc["metadata"]
+            if "chunk_id" in metadata:
+                by_source.setdefault(metadata["source"], []).append((metadata["chunk_id"], rank, doc))
+            else:
+                passages.append({"source": metadata["source"], "text": doc["text"], "rank": rank})
+        
+        for source, entries in by_source.items():
+            entries.sort(key=lambda entry: entry[0])
+            current = None
+            for chunk_id, rank, doc in entries:
+                if current is not None and chunk_id == current["last_chunk_id"] + 1:
+                    current["text"] = self._merge_text(current["text"], doc["text"])
+                    current["rank"] = min(current["rank"], rank)
+                    current["last_chunk_id"] = chunk_id
+                elif current is not None and chunk_id == current["last_chunk_id"]:
+                    continue
+                else:
+                    current = {"source": source, "text": doc["text"], "rank": rank, "last_chunk_id": chunk_id}
+                    passages.append(current)
+        
+        passages.sort(key=lambda passage: passage["rank"])
+        return passages
+    
+    def _drop_duplicates(self, passages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Supprime les passages quasi identiques à un passage mieux classé.
+        
+        Args:
+            passages: Passages classés par pertinence
+        
+        Returns:
+            Passages sans doublons
+        """
+        kept = []
+        kept_shingles = []
+        for passage in passages:
+            shingles = self._shingles(passage["text"])
+            duplicate = False
+            for other in kept_shingles:
+                # Mesure d'inclusion plutôt que Jaccard : un chunk contenu dans un passage fusionné est un doublon
+                smallest = min(len(shingles), len(other))
+                if smallest and len(shingles & other) / smallest >= self.duplicate_threshold:
+                    duplicate = True
+                    break
+            if not duplicate:
+                kept.append(passage)
+                kept_shingles.append(shingles)
+        return kept
+    
+    def _truncate(self, text: str, max_tokens: int) -> str:
+        """
+        Tronque un texte à un nombre de tokens, sur une limite de mot.
+        
+        Args:
+            text: Texte à tronquer
+            max_tokens: Nombre maximal de tokens
+        
+        Returns:
+            Texte tronqué
+        """
+        low, high = 0, len(text)
+        while low < high:
+            middle = (low + high + 1) // 2
+            if self.count_tokens(text[:middle]) <= max_tokens:
+                low = middle
+            else:
+                high = middle - 1
+        cut = text[:low]
+        if low < len(text) and " " in cut:
+            cut = cut[:cut.rindex(" ")]
+        return cut + "…"
+    
+    def assemble(self, docs: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+        """
+        Construit les passages de contexte dans le budget de tokens.
+        
+        Args:
+            docs: Documents retrouvés, classés par pertinence décroissante
+        
+        Returns:
+            Passages retenus ({"source", "text"}), par pertinence décroissante
+        """
+        passages = self._drop_duplicates(self._merge_adjacent(docs))
+        
+        result = []
+        remaining = self.max_tokens
+        for passage in passages:
+            header = f"Source: {passage['source']}\n"
+            cost = self.count_tokens(header + passage["text"])
+            if cost <= remaining:
+                result.append({"source": passage["source"], "text": passage["text"]})
+                remaining -= cost
+                continue
+            
+            # Tronquer le dernier passage s'il reste une place utile, puis s'arrêter
+            available = remaining - self.count_tokens(header)
+            if available >= 50:
+                result.append({"source": passage["source"], "text": self._truncate(passage["text"], available)})
+            break
+        
+        return result
@@ -13,6 +13,8 @@ from langchain_community.document_loaders import (
 )
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 
+from .telemetry import telemetry
+
 class DocumentProcessor:
     """Classe pour traiter divers formats de documents."""
     
@@ -61,8 +63,11 @@ class DocumentProcessor:
                 raise ValueError(f"Format de fichier non pris en charge: {ext}")
             
             # Charger et diviser le document
-            documents = loader.load()
-            chunks = self.text_splitter.split_documents(documents)
+            with telemetry.span("documents.load", source=file_name):
+                documents = loader.load()
+            with telemetry.span("documents.split", source=file_name):
+                chunks = self.text_splitter.split_documents(documents)
+            telemetry.count("chunks", len(chunks))
             
             # Créer une liste de dictionnaires avec texte et métadonnées
             result = []
@@ -70,9 +75,10 @@ class DocumentProcessor:
                 result.append({
                     "text": chunk.page_content,
                     "metadata": {
+                        # Les métadonnées du chargeur d'abord : leur "source" est le fichier temporaire
+                        **chunk.metadata,
                         "source": file_name,
-                        "chunk_id": i,
-                        **chunk.metadata
+                        "chunk_id": i
                     }
                 })
             
@@ -93,8 +99,11 @@ class DocumentProcessor:
             Liste de dictionnaires contenant le texte et les métadonnées
         """
         loader = WebBaseLoader(url)
-        documents = loader.load()
-        chunks = self.text_splitter.split_documents(documents)
+        with telemetry.span("documents.load", source=url):
+            documents = loader.load()
+        with telemetry.span("documents.split", source=url):
+            chunks = self.text_splitter.split_documents(documents)
+        telemetry.count("chunks", len(chunks))
         
         # Créer une liste de dictionnaires avec texte et métadonnées
         result = []
@@ -0,0 +1,343 @@
+"""
+Module pour stocker le texte et les métadonnées des chunks sur disque avec SQLite.
+"""
+import os
+import re
+import json
+import sqlite3
+import threading
+from typing import List, Dict, Any, Iterable, Tuple
+import numpy as np
+
+# Clés de métadonnées utilisables dans un filtre (insérées dans un chemin JSON)
+_FILTER_KEY_RE = re.compile(r"\w+")
+
+class DocumentStore:
+    """Stockage des chunks indexé par identifiant, adossé à une base SQLite."""
+    
+    def __init__(self, path: str = ":memory:"):
+        """
+        Initialise le stockage des documents.
+        
+        Args:
+            path: Chemin du fichier SQLite (":memory:" pour un stockage en mémoire)
+        """
+        self.path = path
+        if path != ":memory:":
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+        
+        # La connexion est partagée entre les threads de Streamlit
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.executescript(
+            """CREATE TABLE IF NOT EXISTS documents (
+                id INTEGER PRIMARY KEY,
+                source TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                text TEXT NOT NULL,
+                metadata TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS documents_source ON documents (source);
+            CREATE TABLE IF NOT EXISTS vectors (
+                id INTEGER PRIMARY KEY,
+                vector BLOB NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );"""
+        )
+        self._conn.commit()
+    
+    @staticmethod
+    def _to_row(doc: Dict[str, Any]) -> Tuple[str, str]:
+        """Sérialise le texte et les métadonnées d'un document."""
+        return doc["text"], json.dumps(doc["metadata"], ensure_ascii=False, default=str)
+    
+    def __len__(self) -> int:
+        """Retourne le nombre de documents stockés."""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+    
+    def __contains__(self, doc_id: int) -> bool:
+        """Indique si un identifiant est présent."""
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM documents WHERE id = ?", (int(doc_id),)).fetchone()
+        return row is not None
+    
+    @property
+    def next_id(self) -> int:
+        """Prochain identifiant libre (jamais réutilisé après une suppression)."""
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = 'next_id'").fetchone()
+        return int(row[0]) if row else 0
+    
+    @next_id.setter
+    def next_id(self, value: int):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('next_id', ?)",
+                (str(int(value)),)
+            )
+    
+    @property
+    def sequence(self) -> int:
+        """Séquence du journal de l'index validée avec les documents (voir `VectorStore.save`)."""
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = 'sequence'").fetchone()
+        return int(row[0]) if row else 0
+    
+    @sequence.setter
+    def sequence(self, value: int):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('sequence', ?)",
+                (str(int(value)),)
+            )
+    
+    def add_many(self, entries: Iterable[Tuple[int, str, str, Dict[str, Any]]]):
+        """
+        Ajoute des documents.
+        
+        Args:
+            entries: Tuples (identifiant, source, empreinte du texte, document)
+        """
+        rows = [
+            (int(doc_id), source, text_hash, *self._to_row(doc))
+            for doc_id, source, text_hash, doc in entries
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO documents (id, source, text_hash, text, metadata) "
+                "VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+    
+    def update_many(self, docs: Dict[int, Dict[str, Any]]):
+        """
+        Remplace le texte et les métadonnées de documents existants.
+        
+        Args:
+            docs: Dictionnaire identifiant -> document
+        """
+        rows = [(*self._to_row(doc), int(doc_id)) for doc_id, doc in docs.items()]
+        with self._lock:
+            self._conn.executemany("UPDATE documents SET text = ?, metadata = ? WHERE id = ?", rows)
+    
+    def get_many(self, ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        """
+        Récupère des documents par identifiant.
+        
+        Args:
+            ids: Identifiants recherchés
+        
+        Returns:
+            Dictionnaire identifiant -> document (avec sa clé "id") pour les identifiants trouvés
+        """
+        found = {}
+        ids = [int(doc_id) for doc_id in ids]
+        with self._lock:
+            # Requêtes par lots pour rester sous la limite de variables SQLite
+            for start in range(0, len(ids), 500):
+                batch = ids[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT id, text, metadata FROM documents WHERE id IN ({placeholders})",
+                    batch
+                ).fetchall()
+                for doc_id, text, metadata in rows:
+                    found[doc_id] = {"id": doc_id, "text": text, "metadata": json.loads(metadata)}
+        return found
+    
+    def delete_many(self, ids: List[int]):
+        """
+        Supprime des documents.
+        
+        Args:
+            ids: Identifiants à supprimer
+        """
+        rows = [(int(doc_id),) for doc_id in ids]
+        with self._lock:
+            self._conn.executemany("DELETE FROM documents WHERE id = ?", rows)
+            self._conn.executemany("DELETE FROM vectors WHERE id = ?", rows)
+    
+    def put_vectors(self, ids: List[int], vectors: np.ndarray):
+        """
+        Stocke les vecteurs pleine précision de documents.
+        
+        Args:
+            ids: Identifiants des documents
+            vectors: Vecteurs correspondants (float32)
+        """
+        rows = [
+            (int(doc_id), np.asarray(vector, dtype='float32').tobytes())
+            for doc_id, vector in zip(ids, vectors)
+        ]
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO vectors (id, vector) VALUES (?, ?)", rows)
+    
+    def get_vectors(self, ids: List[int]) -> Dict[int, np.ndarray]:
+        """
+        Récupère les vecteurs pleine précision de documents.
+        
+        Args:
+            ids: Identifiants recherchés
+        
+        Returns:
+            Dictionnaire identifiant -> vecteur pour les identifiants trouvés
+        """
+        found = {}
+        ids = [int(doc_id) for doc_id in ids]
+        with self._lock:
+            for start in range(0, len(ids), 500):
+                batch = ids[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT id, vector FROM vectors WHERE id IN ({placeholders})",
+                    batch
+                ).fetchall()
+                for doc_id, blob in rows:
+                    found[doc_id] = np.frombuffer(blob, dtype='float32')
+        return found
+    
+    def ids(self) -> np.ndarray:
+        """
+        Retourne tous les identifiants, dans l'ordre d'insertion.
+        
+        Returns:
+            Tableau numpy int64 des identifiants
+        """
+        with self._lock:
+            rows = self._conn.execute("SELECT id FROM documents ORDER BY id").fetchall()
+        return np.array([row[0] for row in rows], dtype='int64')
+    
+    @staticmethod
+    def validate_filters(filters: Dict[str, Any]):
+        """
+        Vérifie la structure de filtres avant leur utilisation.
+        
+        Args:
+            filters: Dictionnaire clé -> condition (voir `filter_ids`)
+        
+        Raises:
+            ValueError: Si une clé ou une condition est invalide
+        """
+        if not isinstance(filters, dict):
+            raise ValueError("Les filtres doivent être un dictionnaire")
+        for key, condition in filters.items():
+            if not isinstance(key, str) or not _FILTER_KEY_RE.fullmatch(key):
+                raise ValueError(f"Clé de filtre invalide: {key}")
+            if isinstance(condition, dict):
+                if not condition or set(condition) - {"min", "max"}:
+                    raise ValueError(f"Intervalle invalide pour '{key}' (clés attendues: min, max)")
+                values = list(condition.values())
+            elif isinstance(condition, (list, tuple, set)):
+                values = list(condition)
+            else:
+                values = [condition]
+            if not all(isinstance(value, (str, int, float)) for value in values):
+                raise ValueError(f"Valeur de filtre invalide pour '{key}'")
+    
+    def filter_ids(self, filters: Dict[str, Any]) -> np.ndarray:
+        """
+        Retourne les identifiants des documents qui satisfont des filtres.
+        
+        La clé "source" porte sur la source du chunk (colonne indexée), les
+        autres clés sur ses métadonnées (par exemple "page"). Une condition
+        est une valeur (égalité), une liste de valeurs (appartenance) ou un
+        dictionnaire {"min": ..., "max": ...} (intervalle inclusif). Les
+        conditions sont combinées par un ET logique.
+        
+        Args:
+            filters: Dictionnaire clé -> condition
+        
+        Returns:
+            Tableau numpy int64 trié des identifiants correspondants
+        """
+        self.validate_filters(filters)
+        
+        clauses = []
+        params = []
+        for key, condition in filters.items():
+            column = "source" if key == "source" else f"json_extract(metadata, '$.{key}')"
+            
+            if isinstance(condition, dict):
+                if "min" in condition:
+                    clauses.append(f"{column} >= ?")
+                    params.append(condition["min"])
+                if "max" in condition:
+                    clauses.append(f"{column} <= ?")
+                    params.append(condition["max"])
+            elif isinstance(condition, (list, tuple, set)):
+                values = list(condition)
+                if not values:
+                    return np.array([], dtype='int64')
+                clauses.append(f"{column} IN ({','.join('?' * len(values))})")
+                params.extend(values)
+            else:
+                clauses.append(f"{column} = ?")
+                params.append(condition)
+        
+        where = " AND ".join(clauses) or "1"
+        with self._lock:
+            rows = self._conn.execute(f"SELECT id FROM documents WHERE {where} ORDER BY id", params).fetchall()
+        return np.array([row[0] for row in rows], dtype='int64')
+    
+    def source_entries(self, source: str) -> Dict[int, str]:
+        """
+        Retourne le manifeste d'une source.
+        
+        Args:
+            source: Identifiant de la source
+        
+        Returns:
+            Dictionnaire identifiant -> empreinte du texte
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, text_hash FROM documents WHERE source = ? ORDER BY id",
+                (source,)
+            ).fetchall()
+        return dict(rows)
+    
+    def list_sources(self) -> Dict[str, int]:
+        """
+        Liste les sources stockées.
+        
+        Returns:
+            Dictionnaire source -> nombre de documents
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT source, COUNT(*) FROM documents GROUP BY source ORDER BY MIN(id)"
+            ).fetchall()
+        return dict(rows)
+    
+    def save(self, path: str):
+        """
+        Valide les modifications en cours dans le fichier SQLite.
+        
+        Si `path` désigne un autre fichier que celui en cours (ou si le
+        stockage est en mémoire), la base est copiée vers `path`, qui devient
+        le fichier de travail.
+        
+        Args:
+            path: Chemin du fichier SQLite de destination
+        """
+        with self._lock:
+            self._conn.commit()
+            if self.path != ":memory:" and os.path.abspath(path) == os.path.abspath(self.path):
+                return
+            
+            destination = sqlite3.connect(path, check_same_thread=False)
+            self._conn.backup(destination)
+            self._conn.close()
+            self._conn = destination
+            self.path = path
+    
+    def close(self):
+        """Ferme la connexion à la base (les modifications non sauvegardées sont perdues)."""
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,228 @@
+"""
+Module regroupant les moteurs d'inférence locaux pour les embeddings.
+"""
+from typing import List, Iterator, Optional
+import numpy as np
+
+EMBEDDING_BACKENDS = ("sentence-transformers", "onnx")
+DEFAULT_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+# Fichiers ONNX publiés avec le modèle sur le Hub (le second est quantifié en int8)
+_ONNX_FILE = "onnx/model.onnx"
+_ONNX_QUANTIZED_FILE = "onnx/model_quint8_avx2.onnx"
+
+def length_sorted_batches(texts: List[str], batch_size: int) -> Iterator[List[int]]:
+    """
+    Découpe une liste de textes en lots de longueurs proches.
+    
+    Les textes d'un lot sont complétés jusqu'au plus long d'entre eux : les
+    trier par longueur limite les tokens de remplissage calculés pour rien.
+    
+    Args:
+        texts: Textes à encoder
+        batch_size: Taille maximale d'un lot
+    
+    Returns:
+        Itérateur sur les positions des textes de chaque lot
+    """
+    order = sorted(range(len(texts)), key=lambda position: len(texts[position]), reverse=True)
+    for start in range(0, len(order), batch_size):
+        yield order[start:start + batch_size]
+
+class SentenceTransformerBackend:
+    """Inférence PyTorch via sentence-transformers."""
+    
+    def __init__(
+        self,
+        model_name: str = DEFAULT_MODEL,
+        batch_size: int = 32,
+        max_seq_length: int = 256,
+        num_threads: Optional[int] = None,
+        device: str = "cpu"
+    ):
+        """
+        Charge le modèle.
+        
+        Args:
+            model_name: Nom du modèle sur le Hub Hugging Face
+            batch_size: Nombre de textes encodés par passe
+            max_seq_length: Nombre maximal de tokens par texte (tronqué au-delà)
+            num_threads: Nombre de threads de calcul de PyTorch (réglage global au processus, défaut de PyTorch si None)
+            device: Périphérique de calcul
+        """
+        # Import différé : PyTorch est long à charger
+        import torch
+        from sentence_transformers import SentenceTransformer
+        
+        if num_threads is not None:
+            torch.set_num_threads(num_threads)
+        self.batch_size = batch_size
+        self.model = SentenceTransformer(model_name, device=device)
+        self.model.max_seq_length = max_seq_length
+        self.dimension = self.model.get_sentence_embedding_dimension()
+    
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """
+        Encode des textes.
+        
+        Args:
+            texts: Textes à encoder
+        
+        Returns:
+            Matrice float32 (nombre de textes, dimension)
+        """
+        if not texts:
+            return np.empty((0, self.dimension), dtype=np.float32)
+        
+        # sentence-transformers trie déjà les textes par longueur avant de former les lots
+        embeddings = self.model.encode(
+            list(texts),
+            batch_size=self.batch_size,
+            convert_to_numpy=True,
+            show_progress_bar=False
+        )
+        return np.asarray(embeddings, dtype=np.float32)
+
+class ONNXBackend:
+    """Inférence ONNX Runtime, en float32 ou quantifiée en int8."""
+    
+    def __init__(
+        self,
+        model_name: str = DEFAULT_MODEL,
+        batch_size: int = 32,
+        max_seq_length: int = 256,
+        num_threads: Optional[int] = None,
+        quantized: bool = False,
+        model_file: Optional[str] = None,
+        normalize: bool = True
+    ):
+        """
+        Télécharge le modèle ONNX et son tokenizer depuis le Hub et ouvre la session.
+        
+        Args:
+            model_name: Nom du modèle sur le Hub Hugging Face
+            batch_size: Nombre de textes encodés par passe
+            max_seq_length: Nombre maximal de tokens par texte (tronqué au-delà)
+            num_threads: Nombre de threads intra-opérateur (défaut d'ONNX Runtime si None)
+            quantized: Utiliser la version quantifiée en int8 du modèle
+            model_file: Chemin du fichier ONNX dans le dépôt du modèle (remplace `quantized`)
+            normalize: Normaliser les embeddings (comme le module Normalize de all-MiniLM-L6-v2)
+        
+        Raises:
+            RuntimeError: Si onnxruntime n'est pas installé
+        """
+        try:
+            import onnxruntime
+        except ImportError:
+            raise RuntimeError("Le moteur ONNX nécessite onnxruntime : pip install onnxruntime")
+        from huggingface_hub import hf_hub_download
+        from tokenizers import Tokenizer
+        
+        self.batch_size = batch_size
+        self.normalize = normalize
+        
+        self.tokenizer = Tokenizer.from_pretrained(model_name)
+        self.tokenizer.enable_truncation(max_length=max_seq_length)
+        self.tokenizer.enable_padding()
+        
+        options = onnxruntime.SessionOptions()
+        options.inter_op_num_threads = 1
+        if num_threads is not None:
+            options.intra_op_num_threads = num_threads
+        path = hf_hub_download(model_name, model_file or (_ONNX_QUANTIZED_FILE if quantized else _ONNX_FILE))
+        self.session = onnxruntime.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+        self.dimension = self.session.get_outputs()[0].shape[-1]
+    
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        """
+        Encode un lot de textes (mean pooling sur les tokens non masqués).
+        
+        Args:
+            texts: Textes du lot
+        
+        Returns:
+            Matrice float32 (taille du lot, dimension)
+        """
+        encodings = self.tokenizer.encode_batch(texts)
+        inputs = {
+            "input_ids": np.array([encoding.ids for encoding in encodings], dtype=np.int64),
+            "attention_mask": np.array([encoding.attention_mask for encoding in encodings], dtype=np.int64),
+            "token_type_ids": np.array([encoding.type_ids for encoding in encodings], dtype=np.int64)
+        }
+        inputs = {name: value for name, value in inputs.items() if name in self.input_names}
+        
+        token_embeddings = self.session.run(None, inputs)[0]
+        mask = inputs["attention_mask"][:, :, None].astype(np.float32)
+        embeddings = (token_embeddings * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+        if self.normalize:
+            embeddings /= np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+        return embeddings.astype(np.float32)
+    
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """
+        Encode des textes par lots de longueurs proches.
+        
+        Args:
+            texts: Textes à encoder
+        
+        Returns:
+            Matrice float32 (nombre de textes, dimension), dans l'ordre des textes
+        """
+        texts = list(texts)
+        result = np.empty((len(texts), self.dimension), dtype=np.float32)
+        for positions in length_sorted_batches(texts, self.batch_size):
+            result[positions] = self._embed_batch([texts[position] for position in positions])
+        return result
+
+def create_backend(backend: str = "sentence-transformers", model_name: str = DEFAULT_MODEL, **options):
+    """
+    Crée un moteur d'inférence.
+    
+    Args:
+        backend: Nom du moteur ("sentence-transformers" ou "onnx")
+        model_name: Nom du modèle sur le Hub Hugging Face
+        **options: Options du moteur (batch_size, max_seq_length, num_threads, quantized...)
+    
+    Returns:
+        Moteur exposant `dimension` et `embed(texts) -> np.ndarray`
+    
+    Raises:
+        ValueError: Si le moteur est inconnu
+    """
+    if backend == "sentence-transformers":
+        return SentenceTransformerBackend(model_name, **options)
+    if backend == "onnx":
+        return ONNXBackend(model_name, **options)
+    raise ValueError(f"Moteur d'embeddings inconnu : {backend} (attendu : {', '.join(EMBEDDING_BACKENDS)})")
+
+def check_compatibility(candidate, reference, texts: List[str], min_cosine: float = 0.99) -> float:
+    """
+    Vérifie qu'un moteur produit des embeddings interchangeables avec ceux d'un autre.
+    
+    À lancer avant de changer de moteur sur un index existant : les vecteurs
+    déjà indexés restent valides si chaque texte obtient des embeddings proches.
+    
+    Args:
+        candidate: Moteur à valider
+        reference: Moteur ayant produit l'index existant
+        texts: Textes représentatifs du corpus
+        min_cosine: Similarité cosinus minimale acceptée entre les deux embeddings d'un texte
+    
+    Returns:
+        Plus faible similarité cosinus observée
+    
+    Raises:
+        ValueError: Si un texte obtient des embeddings trop éloignés
+    """
+    first = candidate.embed(texts)
+    second = reference.embed(texts)
+    if first.shape != second.shape:
+        raise ValueError(f"Dimensions incompatibles : {first.shape[1]} contre {second.shape[1]}")
+    
+    norms = np.linalg.norm(first, axis=1) * np.linalg.norm(second, axis=1)
+    cosines = (first * second).sum(axis=1) / np.maximum(norms, 1e-12)
+    worst = float(cosines.min())
+    if worst < min_cosine:
+        raise ValueError(f"Embeddings incompatibles : similarité cosinus minimale {worst:.4f} < {min_cosine}")
+    return worst
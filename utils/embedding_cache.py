@@ -0,0 +1,125 @@
+"""
+Module pour mettre en cache les embeddings sur disque avec SQLite.
+"""
+import os
+import sqlite3
+import hashlib
+import threading
+from typing import List, Dict, Union
+import numpy as np
+
+class EmbeddingCache:
+    """Cache persistant des embeddings, adressé par le contenu des textes."""
+    
+    def __init__(self, path: str):
+        """
+        Initialise le cache d'embeddings.
+        
+        Args:
+            path: Chemin du fichier SQLite du cache
+        """
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        
+        # La connexion est partagée entre les threads de Streamlit
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS embeddings (
+                model_name TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                PRIMARY KEY (model_name, text_hash)
+            )"""
+        )
+        self._conn.commit()
+    
+    @staticmethod
+    def hash_text(text: str) -> str:
+        """
+        Calcule l'empreinte d'un texte.
+        
+        Args:
+            text: Texte à hacher
+        
+        Returns:
+            Empreinte SHA-256 hexadécimale du texte
+        """
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+    
+    def get_many(self, model_name: str, hashes: List[str]) -> Dict[str, List[float]]:
+        """
+        Récupère les embeddings présents dans le cache, sous forme de listes.
+        
+        Args:
+            model_name: Encodeur ayant produit les embeddings (voir `EmbeddingManager.cache_namespace`)
+            hashes: Empreintes des textes recherchés
+        
+        Returns:
+            Dictionnaire empreinte -> embedding pour les entrées trouvées
+        """
+        return {text_hash: vector.tolist() for text_hash, vector in self.get_many_arrays(model_name, hashes).items()}
+    
+    def get_many_arrays(self, model_name: str, hashes: List[str]) -> Dict[str, np.ndarray]:
+        """
+        Récupère les embeddings présents dans le cache, sans conversion en listes Python.
+        
+        Args:
+            model_name: Encodeur ayant produit les embeddings (voir `EmbeddingManager.cache_namespace`)
+            hashes: Empreintes des textes recherchés
+        
+        Returns:
+            Dictionnaire empreinte -> embedding float32 (en lecture seule) pour les entrées trouvées
+        """
+        found = {}
+        unique_hashes = list(dict.fromkeys(hashes))
+        
+        with self._lock:
+            # Requêtes par lots pour rester sous la limite de variables SQLite
+            for start in range(0, len(unique_hashes), 500):
+                batch = unique_hashes[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings "
+                    f"WHERE model_name = ? AND text_hash IN ({placeholders})",
+                    [model_name, *batch]
+                ).fetchall()
+                for text_hash, vector in rows:
+                    found[text_hash] = np.frombuffer(vector, dtype=np.float32)
+        
+        return found
+    
+    def put_many(self, model_name: str, entries: Dict[str, Union[np.ndarray, List[float]]]):
+        """
+        Enregistre des embeddings dans le cache.
+        
+        Args:
+            model_name: Encodeur ayant produit les embeddings (voir `EmbeddingManager.cache_namespace`)
+            entries: Dictionnaire empreinte -> embedding
+        """
+        if not entries:
+            return
+        
+        rows = [
+            (model_name, text_hash, np.asarray(vector, dtype=np.float32).tobytes())
+            for text_hash, vector in entries.items()
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model_name, text_hash, vector) VALUES (?, ?, ?)",
+                rows
+            )
+            self._conn.commit()
+    
+    def __len__(self) -> int:
+        """Retourne le nombre d'embeddings en cache."""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+    
+    def close(self):
+        """Ferme la connexion au cache."""
+        with self._lock:
+            self._conn.close()
@@ -1,21 +1,127 @@
 """
 Module pour gérer les embeddings avec Hugging Face.
 """
-from typing import List, Dict, Any
-from langchain_community.embeddings import HuggingFaceEmbeddings
+from typing import List, Dict, Any, Optional
+import numpy as np
+
+from .embedding_cache import EmbeddingCache
+from .embedding_backends import create_backend, DEFAULT_MODEL
+from .telemetry import telemetry
 
 class EmbeddingManager:
     """Classe pour gérer les embeddings avec Hugging Face."""
     
-    def __init__(self, model_name: str = "sentence-transformers/all-MiniLM-L6-v2"):
+    def __init__(
+        self,
+        model_name: str = DEFAULT_MODEL,
+        cache: Optional[EmbeddingCache] = None,
+        backend: str = "sentence-transformers",
+        batch_size: int = 32,
+        max_seq_length: int = 256,
+        num_threads: Optional[int] = None,
+        quantized: bool = False,
+        encoder: Optional[Any] = None
+    ):
         """
         Initialise le gestionnaire d'embeddings.
         
+        Les moteurs produisent des embeddings proches les uns des autres (voir
+        `check_compatibility`), mais pas identiques : le cache est cloisonné par
+        modèle, moteur et précision (`cache_namespace`), pour qu'un index ne
+        mélange jamais des vecteurs en cache d'un autre encodeur.
+        
         Args:
             model_name: Nom du modèle d'embedding Hugging Face
+            cache: Cache persistant des embeddings (désactivé si None)
+            backend: Moteur d'inférence ("sentence-transformers" ou "onnx")
+            batch_size: Nombre de textes encodés par passe
+            max_seq_length: Nombre maximal de tokens par texte (256 pour all-MiniLM-L6-v2)
+            num_threads: Nombre de threads de calcul (défaut du moteur si None)
+            quantized: Utiliser le modèle quantifié en int8 (moteur "onnx" uniquement)
+            encoder: Moteur déjà construit, exposant `dimension` et `embed(texts)`
+                (remplace `backend` et ses options)
+        
+        Raises:
+            ValueError: Si la quantification est demandée hors du moteur ONNX
         """
+        options = {"batch_size": batch_size, "max_seq_length": max_seq_length, "num_threads": num_threads}
+        if quantized:
+            if backend != "onnx":
+                raise ValueError("La quantification int8 n'est disponible qu'avec le moteur 'onnx'.")
+            options["quantized"] = True
+        
         self.model_name = model_name
-        self.embeddings = HuggingFaceEmbeddings(model_name=self.model_name)
+        self.backend = backend
+        self.quantized = quantized
+        self.encoder = encoder if encoder is not None else create_backend(backend, model_name, **options)
+        self.dimension = self.encoder.dimension
+        self.cache = cache
+    
+    @property
+    def cache_namespace(self) -> str:
+        """Espace du cache des embeddings de cet encodeur : modèle, moteur et précision."""
+        return f"{self.model_name}|{self.backend}|{'int8' if self.quantized else 'fp32'}"
+    
+    def get_embeddings_array(self, texts: List[str]) -> np.ndarray:
+        """
+        Génère les embeddings d'une liste de textes sous forme de matrice.
+        
+        Si un cache est configuré, seuls les textes absents du cache sont
+        envoyés au modèle, en un seul lot et sans doublons.
+        
+        Args:
+            texts: Liste de textes à convertir en embeddings
+        
+        Returns:
+            Matrice float32 contiguë (nombre de textes, dimension), à passer telle quelle au vector store
+        """
+        texts = list(texts)
+        if self.cache is None or not texts:
+            with telemetry.span("embeddings.encode", texts=len(texts)):
+                telemetry.count("embedded_texts", len(texts))
+                return self.encoder.embed(texts)
+        
+        with telemetry.span("embeddings.cache_lookup", texts=len(texts)):
+            hashes = [EmbeddingCache.hash_text(text) for text in texts]
+            cached = self.cache.get_many_arrays(self.cache_namespace, hashes)
+        
+        # Regrouper les textes manquants, une seule fois par empreinte
+        missing = {}
+        for text_hash, text in zip(hashes, texts):
+            if text_hash not in cached and text_hash not in missing:
+                missing[text_hash] = text
+        telemetry.count("embedding_cache_hits", len(texts) - len(missing))
+        telemetry.count("embedding_cache_misses", len(missing))
+        
+        if missing:
+            with telemetry.span("embeddings.encode", texts=len(missing)):
+                computed = self.encoder.embed(list(missing.values()))
+            telemetry.count("embedded_texts", len(missing))
+            new_entries = dict(zip(missing.keys(), computed))
+            self.cache.put_many(self.cache_namespace, new_entries)
+            cached.update(new_entries)
+        
+        result = np.empty((len(texts), self.dimension), dtype=np.float32)
+        for position, text_hash in enumerate(hashes):
+            result[position] = cached[text_hash]
+        return result
+    
+    def get_query_embeddings_array(self, queries: List[str]) -> np.ndarray:
+        """
+        Génère les embeddings de plusieurs requêtes en un seul lot, sous forme de matrice.
+        
+        Les requêtes ne passent pas par le cache : elles sont rarement
+        répétées à l'identique et le lot est encodé en un seul appel au modèle.
+        
+        Args:
+            queries: Textes des requêtes
+        
+        Returns:
+            Matrice float32 contiguë (nombre de requêtes, dimension), dans l'ordre des requêtes
+        """
+        queries = list(queries)
+        with telemetry.span("embeddings.encode_queries", queries=len(queries)):
+            return self.encoder.embed(queries)
     
     def get_embeddings(self, texts: List[str]) -> List[List[float]]:
         """
@@ -27,7 +133,7 @@ class EmbeddingManager:
         Returns:
             Liste d'embeddings (vecteurs)
         """
-        return self.embeddings.embed_documents(texts)
+        return self.get_embeddings_array(texts).tolist()
     
     def get_query_embedding(self, query: str) -> List[float]:
         """
@@ -39,4 +145,16 @@ class EmbeddingManager:
         Returns:
             Embedding (vecteur) de la requête
         """
-        return self.embeddings.embed_query(query)
+        return self.get_query_embeddings_array([query])[0].tolist()
+    
+    def get_query_embeddings(self, queries: List[str]) -> List[List[float]]:
+        """
+        Génère les embeddings de plusieurs requêtes en un seul lot.
+        
+        Args:
+            queries: Textes des requêtes
+        
+        Returns:
+            Liste d'embeddings (vecteurs), dans l'ordre des requêtes
+        """
+        return self.get_query_embeddings_array(queries).tolist()
@@ -0,0 +1,214 @@
+"""
+Module pour évaluer le rappel des configurations d'index approximatives.
+"""
+import time
+from typing import List, Dict, Any, Optional
+import numpy as np
+import faiss
+
+from .vector_store import VectorStore, as_embedding_matrix
+
+# Coût comparé pour choisir une configuration : latence médiane ou mémoire par vecteur
+OBJECTIVES = ("latency", "memory")
+
+def exact_neighbors(vectors: np.ndarray, query_embeddings: np.ndarray, k: int, metric: str = "l2") -> np.ndarray:
+    """
+    Calcule la vérité terrain par recherche exacte (index plat).
+    
+    Args:
+        vectors: Matrice des vecteurs indexés (leur position est leur identifiant)
+        query_embeddings: Matrice des embeddings des requêtes
+        k: Nombre de voisins par requête
+        metric: Métrique de comparaison ("l2", "inner_product" ou "cosine")
+    
+    Returns:
+        Matrice (nombre de requêtes, k) des positions des plus proches voisins
+    """
+    if metric == "cosine":
+        vectors = vectors.copy()
+        query_embeddings = query_embeddings.copy()
+        faiss.normalize_L2(vectors)
+        faiss.normalize_L2(query_embeddings)
+    index = faiss.IndexFlat(vectors.shape[1], faiss.METRIC_L2 if metric == "l2" else faiss.METRIC_INNER_PRODUCT)
+    index.add(vectors)
+    _, neighbors = index.search(query_embeddings, min(k, len(vectors)))
+    return neighbors
+
+def recall_at_k(retrieved: List[List[int]], exact: np.ndarray, k: int) -> float:
+    """
+    Calcule le rappel moyen à k.
+    
+    Args:
+        retrieved: Identifiants retournés pour chaque requête, du plus au moins proche
+        exact: Vérité terrain (voir `exact_neighbors`)
+        k: Nombre de résultats considérés
+    
+    Returns:
+        Part moyenne des k vrais voisins retrouvés parmi les k premiers résultats
+    """
+    recalls = [
+        len(set(ids[:k]) & set(truth[:k].tolist())) / min(k, len(truth))
+        for ids, truth in zip(retrieved, exact)
+    ]
+    return float(np.mean(recalls))
+
+def mean_reciprocal_rank(retrieved: List[List[int]], exact: np.ndarray) -> float:
+    """
+    Calcule le MRR du vrai plus proche voisin.
+    
+    Args:
+        retrieved: Identifiants retournés pour chaque requête, du plus au moins proche
+        exact: Vérité terrain (voir `exact_neighbors`)
+    
+    Returns:
+        Moyenne de 1 / rang du vrai plus proche voisin (0 s'il n'est pas retourné)
+    """
+    ranks = []
+    for ids, truth in zip(retrieved, exact):
+        nearest = int(truth[0])
+        ranks.append(1.0 / (ids.index(nearest) + 1) if nearest in ids else 0.0)
+    return float(np.mean(ranks))
+
+def default_configurations(n_vectors: int, dimension: int) -> List[Dict[str, Any]]:
+    """
+    Propose une grille de configurations à évaluer.
+    
+    Chaque index est construit une fois ; `nprobe` et `ef_search` sont des
+    paramètres de recherche balayés sur le même index.
+    
+    Args:
+        n_vectors: Nombre de vecteurs indexés
+        dimension: Dimension des vecteurs
+    
+    Returns:
+        Liste de configurations {"index_type", "encoding", "rerank", "nlist", "nprobe" | "ef_search"}
+    """
+    # Environ 4√n listes, avec au moins 39 vecteurs d'entraînement par liste
+    nlist = int(max(1, min(4 * np.sqrt(n_vectors), n_vectors // 39)))
+    pq_m = next(m for m in (48, 32, 24, 16, 8, 4, 2, 1) if dimension % m == 0)
+    
+    configurations = [{"index_type": "flat", "encoding": "float32", "rerank": False}]
+    for encoding in ("fp16", "sq8", "pq"):
+        for rerank in (False, True):
+            configurations.append({"index_type": "flat", "encoding": encoding, "rerank": rerank, "pq_m": pq_m})
+    for nprobe in (1, 4, 8, 16, 32, 64):
+        if nprobe <= nlist:
+            configurations.append({"index_type": "ivf_flat", "encoding": "float32", "rerank": False, "nlist": nlist, "nprobe": nprobe})
+            configurations.append({"index_type": "ivf_flat", "encoding": "sq8", "rerank": True, "nlist": nlist, "nprobe": nprobe})
+            configurations.append({"index_type": "ivf_pq", "encoding": "pq", "rerank": True, "nlist": nlist, "nprobe": nprobe, "pq_m": pq_m})
+    for ef_search in (16, 32, 64, 128, 256):
+        configurations.append({"index_type": "hnsw", "encoding": "float32", "rerank": False, "ef_search": ef_search})
+        configurations.append({"index_type": "hnsw", "encoding": "sq8", "rerank": True, "ef_search": ef_search})
+    return configurations
+
+def describe(configuration: Dict[str, Any]) -> str:
+    """Retourne un libellé court d'une configuration, par exemple "ivf_flat/sq8+rerank nprobe=16"."""
+    label = f"{configuration['index_type']}/{configuration['encoding']}"
+    if configuration.get("rerank"):
+        label += "+rerank"
+    if "nprobe" in configuration:
+        label += f" nprobe={configuration['nprobe']}"
+    if "ef_search" in configuration:
+        label += f" ef_search={configuration['ef_search']}"
+    return label
+
+def evaluate_configurations(
+    documents: List[Dict[str, Any]],
+    embeddings: np.ndarray,
+    query_embeddings: np.ndarray,
+    configurations: Optional[List[Dict[str, Any]]] = None,
+    k: int = 10,
+    metric: str = "l2"
+) -> List[Dict[str, Any]]:
+    """
+    Mesure le rappel, le MRR, la latence et la mémoire de chaque configuration.
+    
+    Args:
+        documents: Chunks indexés (texte et métadonnées)
+        embeddings: Embeddings des chunks
+        query_embeddings: Embeddings des requêtes d'évaluation
+        configurations: Configurations à évaluer (`default_configurations` si None)
+        k: Nombre de résultats par requête
+        metric: Métrique des index évalués et de la vérité terrain
+    
+    Returns:
+        Pour chaque configuration : libellé, paramètres, recall@k, MRR, latences et octets par vecteur
+    """
+    embeddings = as_embedding_matrix(embeddings, embeddings.shape[-1])
+    query_embeddings = as_embedding_matrix(query_embeddings, embeddings.shape[1])
+    if configurations is None:
+        configurations = default_configurations(len(embeddings), embeddings.shape[1])
+    exact = exact_neighbors(embeddings, query_embeddings, k, metric)
+    
+    # Un index par combinaison de paramètres de construction, partagé par les paramètres de recherche
+    stores = {}
+    results = []
+    try:
+        for configuration in configurations:
+            build = {key: value for key, value in configuration.items() if key not in ("nprobe", "ef_search")}
+            key = tuple(sorted(build.items()))
+            if key not in stores:
+                store = VectorStore(dimension=embeddings.shape[1], promotion_threshold=0, metric=metric, **build)
+                start = time.perf_counter()
+                store.add_documents(documents, embeddings)
+                stores[key] = (store, time.perf_counter() - start)
+            store, build_seconds = stores[key]
+            
+            retrieved = []
+            latencies = []
+            for query in query_embeddings:
+                start = time.perf_counter()
+                hits = store.search_batch(
+                    query[None, :],
+                    k,
+                    nprobe=configuration.get("nprobe"),
+                    ef_search=configuration.get("ef_search")
+                )[0]
+                latencies.append(time.perf_counter() - start)
+                retrieved.append([doc["id"] for doc, _ in hits])
+            
+            latencies_ms = np.array(latencies) * 1000.0
+            results.append({
+                "name": describe(configuration),
+                "configuration": configuration,
+                "recall_at_k": round(recall_at_k(retrieved, exact, k), 4),
+                "mrr": round(mean_reciprocal_rank(retrieved, exact), 4),
+                "p50_ms": round(float(np.percentile(latencies_ms, 50)), 3),
+                "p99_ms": round(float(np.percentile(latencies_ms, 99)), 3),
+                "qps": round(len(latencies) / sum(latencies), 1),
+                "bytes_per_vector": round(store.memory_usage()["bytes_per_vector"], 1),
+                "build_seconds": round(build_seconds, 3)
+            })
+    finally:
+        for store, _ in stores.values():
+            store.close()
+    return results
+
+def cheapest_configuration(
+    results: List[Dict[str, Any]],
+    target_recall: float,
+    objective: str = "latency"
+) -> Optional[Dict[str, Any]]:
+    """
+    Choisit la configuration la moins coûteuse atteignant un rappel cible.
+    
+    Args:
+        results: Résultats de `evaluate_configurations`
+        target_recall: Recall@k minimal
+        objective: Coût à minimiser ("latency" : latence médiane, "memory" : octets par vecteur) ;
+            l'autre coût départage les ex aequo
+    
+    Returns:
+        Résultat de la configuration retenue, ou None si aucune n'atteint la cible
+    
+    Raises:
+        ValueError: Si l'objectif est inconnu
+    """
+    if objective not in OBJECTIVES:
+        raise ValueError(f"Objectif non pris en charge: {objective}")
+    eligible = [result for result in results if result["recall_at_k"] >= target_recall]
+    if not eligible:
+        return None
+    if objective == "latency":
+        return min(eligible, key=lambda result: (result["p50_ms"], result["bytes_per_vector"]))
+    return min(eligible, key=lambda result: (result["bytes_per_vector"], result["p50_ms"]))
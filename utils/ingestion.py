@@ -0,0 +1,152 @@
+"""
+Module pour l'ingestion parallèle et en flux des documents.
+"""
+import io
+import queue
+import contextlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import List, Dict, Any, Iterator
+import numpy as np
+
+from .document_processor import DocumentProcessor
+
+def _process_file_bytes(data: bytes, file_name: str, chunk_size: int, chunk_overlap: int) -> List[Dict[str, Any]]:
+    """
+    Découpe un fichier dans un processus de travail.
+    
+    Args:
+        data: Contenu binaire du fichier
+        file_name: Nom du fichier
+        chunk_size: Taille des chunks de texte
+        chunk_overlap: Chevauchement entre les chunks
+    
+    Returns:
+        Liste de dictionnaires contenant le texte et les métadonnées
+    """
+    processor = DocumentProcessor(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    return processor.process_file(io.BytesIO(data), file_name)
+
+class IngestionPipeline:
+    """Pipeline d'ingestion qui recouvre analyse, embeddings et indexation."""
+    
+    def __init__(
+        self,
+        document_processor,
+        embedding_manager,
+        vector_store,
+        file_workers: int = 2,
+        url_workers: int = 8,
+        batch_size: int = 64,
+        max_pending: int = 4,
+        store_lock=None
+    ):
+        """
+        Initialise le pipeline d'ingestion.
+        
+        Args:
+            document_processor: Processeur utilisé pour les URLs et les paramètres de découpage
+            embedding_manager: Gestionnaire d'embeddings
+            vector_store: Stockage vectoriel à mettre à jour
+            file_workers: Nombre de processus pour l'analyse des fichiers (PDF, Excel...)
+            url_workers: Nombre de threads pour le téléchargement des URLs
+            batch_size: Nombre de chunks par lot d'embeddings
+            max_pending: Nombre maximal de sources analysées ou en cours d'analyse
+                en attente d'indexation (borne la mémoire)
+            store_lock: Verrou optionnel pris pendant la mise à jour de chaque source dans le vector store
+        """
+        self.document_processor = document_processor
+        self.embedding_manager = embedding_manager
+        self.vector_store = vector_store
+        self.file_workers = file_workers
+        self.url_workers = url_workers
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self.store_lock = store_lock or contextlib.nullcontext()
+    
+    def run(self, files: List[Any], urls: List[str]) -> Iterator[Dict[str, Any]]:
+        """
+        Ingère des fichiers et des URLs, en produisant des événements de progression.
+        
+        L'analyse des sources se fait en parallèle (processus pour les fichiers,
+        threads pour les URLs) pendant que le thread appelant calcule les
+        embeddings par lots et met à jour le vector store source par source.
+        Le thread appelant est le seul à modifier le vector store, ce qui
+        permet de mettre à jour l'interface Streamlit depuis la boucle.
+        Chaque source est publiée dès qu'elle est indexée, sous `store_lock`
+        le temps de sa seule mise à jour : les autres écritures ne sont pas
+        bloquées pendant toute l'ingestion. Les processus d'analyse sont
+        lancés par "spawn" : un fork du processus appelant, qui a déjà des
+        threads, pourrait hériter de verrous tenus et se bloquer.
+        
+        Args:
+            files: Fichiers téléchargés (objets exposant `name` et `getvalue()`)
+            urls: URLs à traiter
+        
+        Returns:
+            Itérateur d'événements ("error" ou "indexed") avec `source`,
+            `done` et `total`
+        """
+        tasks = [("file", file) for file in files] + [("url", url) for url in urls]
+        total = len(tasks)
+        if total == 0:
+            return
+        
+        pending_tasks = iter(tasks)
+        results = queue.Queue()
+        
+        with ProcessPoolExecutor(max_workers=self.file_workers, mp_context=multiprocessing.get_context("spawn")) as process_pool, \
+                ThreadPoolExecutor(max_workers=self.url_workers) as thread_pool:
+            
+            def submit_next():
+                task = next(pending_tasks, None)
+                if task is None:
+                    return
+                kind, item = task
+                if kind == "file":
+                    source = item.name
+                    future = process_pool.submit(
+                        _process_file_bytes,
+                        item.getvalue(),
+                        item.name,
+                        self.document_processor.chunk_size,
+                        self.document_processor.chunk_overlap
+                    )
+                else:
+                    source = item
+                    future = thread_pool.submit(self.document_processor.process_url, item)
+                future.add_done_callback(lambda f, source=source: results.put((source, f)))
+            
+            # Remplir la fenêtre de sources en vol
+            for _ in range(min(self.max_pending, total)):
+                submit_next()
+            
+            for done in range(1, total + 1):
+                source, future = results.get()
+                submit_next()
+                
+                try:
+                    chunks = future.result()
+                except Exception as e:
+                    yield {"type": "error", "source": source, "error": str(e), "done": done, "total": total}
+                    continue
+                
+                # Calculer les embeddings par lots de taille fixe, directement dans une matrice float32
+                embeddings = np.empty((len(chunks), self.embedding_manager.dimension), dtype=np.float32)
+                for start in range(0, len(chunks), self.batch_size):
+                    batch = chunks[start:start + self.batch_size]
+                    embeddings[start:start + len(batch)] = self.embedding_manager.get_embeddings_array(
+                        [doc["text"] for doc in batch]
+                    )
+                
+                # Publier la source aussitôt, sans garder le verrou pendant l'événement
+                with self.store_lock:
+                    stats = self.vector_store.upsert_source(source, chunks, embeddings)
+                yield {
+                    "type": "indexed",
+                    "source": source,
+                    "chunks": len(chunks),
+                    "done": done,
+                    "total": total,
+                    **stats
+                }
@@ -0,0 +1,220 @@
+"""
+Module pour la recherche lexicale BM25 sur un index inversé SQLite.
+"""
+import os
+import re
+import math
+import heapq
+import sqlite3
+import threading
+import unicodedata
+from collections import Counter, defaultdict
+from typing import List, Iterable, Tuple, Optional, Container
+
+# Mots, éventuellement composés (références, codes d'erreur : "ab-1234", "v2.1")
+_TOKEN_RE = re.compile(r"\w+(?:[-./]\w+)*")
+_SEPARATOR_RE = re.compile(r"[-./]")
+
+def tokenize(text: str) -> List[str]:
+    """
+    Découpe un texte en termes pour l'index lexical.
+    
+    Le texte est mis en minuscules et débarrassé de ses accents. Les termes
+    composés sont conservés entiers et également découpés en leurs parties,
+    pour qu'une référence comme "AB-1234" soit trouvée par "AB-1234" comme par "1234".
+    
+    Args:
+        text: Texte à découper
+    
+    Returns:
+        Liste des termes
+    """
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    
+    tokens = []
+    for token in _TOKEN_RE.findall(text):
+        tokens.append(token)
+        if _SEPARATOR_RE.search(token):
+            tokens.extend(part for part in _SEPARATOR_RE.split(token) if part)
+    return tokens
+
+class LexicalIndex:
+    """Index inversé avec score BM25, adossé à une base SQLite."""
+    
+    def __init__(self, path: str = ":memory:", k1: float = 1.2, b: float = 0.75):
+        """
+        Initialise l'index lexical.
+        
+        Args:
+            path: Chemin du fichier SQLite (":memory:" pour un index en mémoire)
+            k1: Paramètre de saturation de la fréquence des termes
+            b: Paramètre de normalisation par la longueur des documents
+        """
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        if path != ":memory:":
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+        
+        # La connexion est partagée entre les threads de Streamlit
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.executescript(
+            """CREATE TABLE IF NOT EXISTS postings (
+                term TEXT NOT NULL,
+                doc_id INTEGER NOT NULL,
+                tf INTEGER NOT NULL,
+                PRIMARY KEY (term, doc_id)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS postings_doc ON postings (doc_id);
+            CREATE TABLE IF NOT EXISTS lengths (
+                doc_id INTEGER PRIMARY KEY,
+                length INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );"""
+        )
+        self._conn.commit()
+        self._stats = None  # (nombre de documents, longueur moyenne), recalculé après modification
+    
+    def __len__(self) -> int:
+        """Retourne le nombre de documents indexés."""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM lengths").fetchone()[0]
+    
+    @property
+    def sequence(self) -> int:
+        """Séquence du journal de l'index validée avec l'index lexical (voir `VectorStore.save`)."""
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = 'sequence'").fetchone()
+        return int(row[0]) if row else 0
+    
+    @sequence.setter
+    def sequence(self, value: int):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('sequence', ?)",
+                (str(int(value)),)
+            )
+    
+    def add_many(self, entries: Iterable[Tuple[int, str]]):
+        """
+        Indexe des documents.
+        
+        Args:
+            entries: Tuples (identifiant, texte)
+        """
+        postings = []
+        lengths = []
+        for doc_id, text in entries:
+            terms = Counter(tokenize(text))
+            postings.extend((term, int(doc_id), tf) for term, tf in terms.items())
+            lengths.append((int(doc_id), sum(terms.values())))
+        
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO postings (term, doc_id, tf) VALUES (?, ?, ?)", postings)
+            self._conn.executemany("INSERT OR REPLACE INTO lengths (doc_id, length) VALUES (?, ?)", lengths)
+            self._stats = None
+    
+    def delete_many(self, ids: List[int]):
+        """
+        Retire des documents de l'index.
+        
+        Args:
+            ids: Identifiants à retirer
+        """
+        rows = [(int(doc_id),) for doc_id in ids]
+        with self._lock:
+            self._conn.executemany("DELETE FROM postings WHERE doc_id = ?", rows)
+            self._conn.executemany("DELETE FROM lengths WHERE doc_id = ?", rows)
+            self._stats = None
+    
+    def _collection_stats(self) -> Tuple[int, float]:
+        """Retourne le nombre de documents et leur longueur moyenne."""
+        if self._stats is None:
+            count, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(length), 0) FROM lengths").fetchone()
+            self._stats = (count, total / count if count else 0.0)
+        return self._stats
+    
+    def search_batch(
+        self,
+        queries: List[str],
+        k: int = 4,
+        allowed_ids: Optional[Container[int]] = None
+    ) -> List[List[Tuple[int, float]]]:
+        """
+        Recherche les documents les mieux classés par BM25 pour plusieurs requêtes.
+        
+        Les listes de postings d'un terme commun à plusieurs requêtes ne sont
+        lues qu'une fois.
+        
+        Args:
+            queries: Textes des requêtes
+            k: Nombre de résultats par requête
+            allowed_ids: Identifiants autorisés, ensemble ou tout conteneur supportant `in` (tous si None)
+        
+        Returns:
+            Pour chaque requête, liste de tuples (identifiant, score BM25), du meilleur au moins bon
+        """
+        query_terms = [set(tokenize(query)) for query in queries]
+        postings = {}
+        
+        with self._lock:
+            doc_count, avg_length = self._collection_stats()
+            if doc_count == 0:
+                return [[] for _ in queries]
+            
+            for term in set().union(*query_terms):
+                postings[term] = self._conn.execute(
+                    "SELECT p.doc_id, p.tf, l.length FROM postings p "
+                    "JOIN lengths l ON l.doc_id = p.doc_id WHERE p.term = ?",
+                    (term,)
+                ).fetchall()
+        
+        results = []
+        for terms in query_terms:
+            scores = defaultdict(float)
+            for term in terms:
+                rows = postings[term]
+                if not rows:
+                    continue
+                idf = math.log(1 + (doc_count - len(rows) + 0.5) / (len(rows) + 0.5))
+                for doc_id, tf, length in rows:
+                    if allowed_ids is not None and doc_id not in allowed_ids:
+                        continue
+                    norm = self.k1 * (1 - self.b + self.b * length / avg_length)
+                    scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+            results.append(heapq.nlargest(k, scores.items(), key=lambda item: item[1]))
+        return results
+    
+    def save(self, path: str):
+        """
+        Valide les modifications en cours dans le fichier SQLite.
+        
+        Si `path` désigne un autre fichier que celui en cours (ou si l'index
+        est en mémoire), la base est copiée vers `path`, qui devient le
+        fichier de travail.
+        
+        Args:
+            path: Chemin du fichier SQLite de destination
+        """
+        with self._lock:
+            self._conn.commit()
+            if self.path != ":memory:" and os.path.abspath(path) == os.path.abspath(self.path):
+                return
+            
+            destination = sqlite3.connect(path, check_same_thread=False)
+            self._conn.backup(destination)
+            self._conn.close()
+            self._conn = destination
+            self.path = path
+    
+    def close(self):
+        """Ferme la connexion à la base (les modifications non sauvegardées sont perdues)."""
+        with self._lock:
+            self._conn.close()
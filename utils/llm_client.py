@@ -0,0 +1,277 @@
+"""
+Module pour appeler l'API de chat du LLM en asynchrone.
+
+Les appels partagent un pool de connexions HTTP ; leur nombre simultané et
+leur débit sont bornés, et les erreurs transitoires (limite de débit,
+erreurs serveur, coupures réseau) sont retentées avec un délai aléatoire
+croissant.
+"""
+import os
+import time
+import random
+import asyncio
+from typing import List, Dict, Any, Optional
+import aiohttp
+
+from .telemetry import telemetry
+
+# API compatible OpenAI de Groq ; GROQ_BASE_URL permet de viser un autre serveur (bouchon de test...)
+DEFAULT_BASE_URL = "https://api.groq.com/openai/v1"
+
+# Statuts HTTP qui justifient une nouvelle tentative
+RETRYABLE_STATUSES = frozenset({408, 409, 429, 500, 502, 503, 504})
+
+class TokenBucket:
+    """Limiteur de débit par seau à jetons."""
+    
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        """
+        Initialise le seau, plein.
+        
+        Args:
+            rate: Nombre moyen d'acquisitions par seconde
+            capacity: Taille maximale d'une rafale (défaut: max(1, rate))
+        """
+        if rate <= 0:
+            raise ValueError("rate doit être strictement positif")
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+    
+    async def acquire(self):
+        """Attend qu'un jeton soit disponible et le consomme (les appelants sont servis dans l'ordre)."""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+class AsyncLLMClient:
+    """Client asynchrone de l'API de chat, avec pool de connexions, limites et nouvelles tentatives."""
+    
+    def __init__(
+        self,
+        api_key: str,
+        model_name: str,
+        base_url: Optional[str] = None,
+        max_concurrency: int = 8,
+        requests_per_second: Optional[float] = None,
+        burst: Optional[float] = None,
+        max_retries: int = 4,
+        backoff_base: float = 0.5,
+        backoff_max: float = 20.0,
+        hedge_after: Optional[float] = None,
+        timeout: float = 60.0
+    ):
+        """
+        Initialise le client (la session HTTP est ouverte au premier appel).
+        
+        Args:
+            api_key: Clé API
+            model_name: Modèle interrogé
+            base_url: URL de l'API (défaut: GROQ_BASE_URL, sinon l'API Groq)
+            max_concurrency: Nombre maximal d'appels simultanés (et de connexions du pool)
+            requests_per_second: Débit moyen maximal des appels (illimité si None)
+            burst: Nombre d'appels pouvant partir d'un coup sous la limite de débit
+            max_retries: Nombre de nouvelles tentatives après une erreur transitoire
+            backoff_base: Délai de la première nouvelle tentative, en secondes, doublé à chaque tentative
+            backoff_max: Délai maximal entre deux tentatives, en secondes
+            hedge_after: Délai en secondes après lequel un appel sans réponse est doublé
+                d'un second appel identique, la première réponse l'emportant (désactivé si None)
+            timeout: Durée maximale d'un appel, en secondes
+        """
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency doit être supérieur ou égal à 1")
+        
+        self.api_key = api_key
+        self.model_name = model_name
+        self.base_url = (base_url or os.environ.get("GROQ_BASE_URL") or DEFAULT_BASE_URL).rstrip("/")
+        self.max_concurrency = max_concurrency
+        self.requests_per_second = requests_per_second
+        self.burst = burst
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge_after = hedge_after
+        self.timeout = timeout
+        
+        # Session, sémaphore et seau sont liés à la boucle asyncio qui les a créés
+        self._loop = None
+        self._session = None
+        self._semaphore = None
+        self._bucket = None
+        self._closing = set()  # Fermetures en cours des sessions d'anciennes boucles
+    
+    def _bind(self) -> aiohttp.ClientSession:
+        """
+        Crée la session et les limites pour la boucle asyncio courante, si nécessaire.
+        
+        La session d'une autre boucle est fermée : sur sa boucle si elle tourne
+        encore, sinon sur la boucle courante (les connexions d'une boucle déjà
+        fermée ne sont libérées qu'au ramasse-miettes ; appeler `aclose` avant
+        la fin d'une boucle l'évite).
+        """
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._session is None or self._session.closed:
+            if self._session is not None and not self._session.closed:
+                self._close_session(self._session, self._loop, loop)
+            self._loop = loop
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_concurrency),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                headers={"Authorization": f"Bearer {self.api_key}"}
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._bucket = TokenBucket(self.requests_per_second, self.burst) if self.requests_per_second else None
+        return self._session
+    
+    def _close_session(self, session: aiohttp.ClientSession, session_loop, loop):
+        """
+        Ferme la session liée à une autre boucle sans attendre.
+        
+        Args:
+            session: Session à fermer
+            session_loop: Boucle qui a créé la session
+            loop: Boucle courante
+        """
+        if session_loop.is_running() and not session_loop.is_closed():
+            asyncio.run_coroutine_threadsafe(session.close(), session_loop)
+            return
+        # Boucle terminée (asyncio.run) : ses connexions ne serviront plus, les fermer d'ici
+        task = loop.create_task(session.close())
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+    
+    def _backoff(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        """
+        Calcule le délai avant une nouvelle tentative.
+        
+        Args:
+            attempt: Numéro de la tentative échouée (0 pour la première)
+            retry_after: Délai demandé par le serveur (en-tête Retry-After), en secondes
+        
+        Returns:
+            Délai aléatoire entre 0 et backoff_base * 2^attempt (borné), ou au moins le délai demandé
+        """
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        if retry_after is not None:
+            delay = min(self.backoff_max, retry_after) + random.uniform(0, self.backoff_base)
+        return delay
+    
+    @staticmethod
+    def _retry_after(response: aiohttp.ClientResponse) -> Optional[float]:
+        """Lit l'en-tête Retry-After (en secondes) d'une réponse."""
+        try:
+            return float(response.headers["Retry-After"])
+        except (KeyError, ValueError):
+            return None
+    
+    async def _post(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Envoie un appel, en retentant les erreurs transitoires.
+        
+        Args:
+            payload: Corps JSON de l'appel
+        
+        Returns:
+            Corps JSON de la réponse
+        
+        Raises:
+            RuntimeError: Si l'API refuse l'appel ou si les tentatives sont épuisées
+        """
+        session = self._bind()
+        url = f"{self.base_url}/chat/completions"
+        for attempt in range(self.max_retries + 1):
+            if self._bucket is not None:
+                await self._bucket.acquire()
+            retry_after = None
+            try:
+                async with self._semaphore:
+                    with telemetry.span("llm.request", attempt=attempt) as span:
+                        async with session.post(url, json=payload) as response:
+                            span.set(status=response.status)
+                            if response.status == 200:
+                                return await response.json()
+                            error = f"HTTP {response.status}: {(await response.text())[:200]}"
+                            if response.status not in RETRYABLE_STATUSES:
+                                raise RuntimeError(f"Appel au LLM refusé ({error})")
+                            retry_after = self._retry_after(response)
+                            if response.status == 429:
+                                telemetry.count("llm_rate_limited")
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                error = f"{type(e).__name__}: {e}"
+            
+            if attempt == self.max_retries:
+                break
+            telemetry.count("llm_retries")
+            await asyncio.sleep(self._backoff(attempt, retry_after))
+        raise RuntimeError(f"Appel au LLM en échec après {self.max_retries + 1} tentatives ({error})")
+    
+    async def _hedged_post(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Envoie un appel, doublé d'un second s'il n'a pas répondu après `hedge_after` secondes.
+        
+        La première réponse réussie est retenue et l'autre appel annulé ; une
+        erreur n'est levée que si les deux appels échouent.
+        
+        Args:
+            payload: Corps JSON de l'appel
+        
+        Returns:
+            Corps JSON de la réponse
+        """
+        primary = asyncio.ensure_future(self._post(payload))
+        done, _ = await asyncio.wait({primary}, timeout=self.hedge_after)
+        if done:
+            return primary.result()
+        
+        telemetry.count("llm_hedged_requests")
+        pending = {primary, asyncio.ensure_future(self._post(payload))}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    if not pending:
+                        raise task.exception()
+        finally:
+            for task in pending:
+                task.cancel()
+    
+    async def complete(self, messages: List[Dict[str, str]], **parameters) -> str:
+        """
+        Génère une réponse de chat.
+        
+        Args:
+            messages: Messages {"role": ..., "content": ...}
+            **parameters: Paramètres supplémentaires de l'API (temperature, max_tokens...)
+        
+        Returns:
+            Texte de la réponse
+        
+        Raises:
+            RuntimeError: Si l'appel échoue définitivement
+        """
+        payload = {"model": self.model_name, "messages": messages, **parameters}
+        if self.hedge_after is None:
+            body = await self._post(payload)
+        else:
+            body = await self._hedged_post(payload)
+        
+        try:
+            return body["choices"][0]["message"]["content"]
+        except (KeyError, IndexError, TypeError):
+            raise RuntimeError("Réponse du LLM invalide.")
+    
+    async def aclose(self):
+        """Ferme la session HTTP et ses connexions."""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
@@ -1,28 +1,51 @@
 """
 Module pour gérer l'intégration avec Groq LLM.
 """
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Iterator, AsyncIterator
 import os
+import time
 from langchain_groq import ChatGroq
 from langchain.prompts import ChatPromptTemplate
 from langchain.chains import LLMChain
 
+from .response_cache import SemanticResponseCache
+from .context_builder import ContextAssembler
+from .llm_client import AsyncLLMClient
+from .telemetry import telemetry
+
+# Rôle des messages langchain dans l'API de chat
+_MESSAGE_ROLES = {"human": "user", "ai": "assistant", "system": "system"}
+
 class LLMHandler:
     """Classe pour gérer les interactions avec le LLM via Groq."""
     
-    def __init__(self, api_key: str = None, model_name: str = "llama-4-scout-17b-16e-instruct"):
+    def __init__(
+        self,
+        api_key: str = None,
+        model_name: str = "llama-4-scout-17b-16e-instruct",
+        response_cache: Optional[SemanticResponseCache] = None,
+        context_assembler: Optional[ContextAssembler] = None,
+        client_options: Optional[Dict[str, Any]] = None
+    ):
         """
         Initialise le gestionnaire LLM.
         
         Args:
             api_key: Clé API Groq (si None, tente de la récupérer depuis les variables d'environnement)
             model_name: Nom du modèle à utiliser (par défaut llama3-8b-8192)
+            response_cache: Cache sémantique des réponses (désactivé si None)
+            context_assembler: Assembleur du contexte dans un budget de tokens
+                (budget par défaut si None)
+            client_options: Options du client HTTP asynchrone utilisé par `aget_response`
+                (max_concurrency, requests_per_second, max_retries, hedge_after... voir `AsyncLLMClient`)
         """
         self.api_key = api_key or os.environ.get("GROQ_API_KEY")
         if not self.api_key:
             raise ValueError("Clé API Groq non fournie. Définissez GROQ_API_KEY dans les variables d'environnement ou passez-la en paramètre.")
         
         self.model_name = model_name
+        self.response_cache = response_cache
+        self.context_assembler = context_assembler or ContextAssembler()
         self.llm = ChatGroq(
             api_key=self.api_key,
             model_name=self.model_name
@@ -48,32 +71,250 @@ class LLMHandler:
             llm=self.llm,
             prompt=self.prompt_template
         )
+        
+        # Chaîne équivalente produisant les tokens au fil de l'eau
+        self.stream_chain = self.prompt_template | self.llm
+        
+        # Client asynchrone partagé par les appels concurrents de `aget_response`
+        self.async_client = AsyncLLMClient(self.api_key, self.model_name, **(client_options or {}))
     
-    def get_response(self, query: str, context_docs: List[Dict[str, Any]]) -> str:
+    def _format_context(self, context_docs: List[Dict[str, Any]]) -> str:
         """
-        Génère une réponse à partir de la requête et du contexte.
+        Formate les documents de contexte pour le prompt.
+        
+        Les chunks consécutifs d'une même source sont fusionnés, les passages
+        quasi identiques supprimés et le tout tronqué au budget de tokens.
         
         Args:
-            query: Requête de l'utilisateur
             context_docs: Documents de contexte pertinents
         
         Returns:
-            Réponse générée par le LLM
+            Texte du contexte
         """
-        # Formater le contexte
-        context_text = "\n\n".join([
-            f"Source: {doc['metadata']['source']}\n{doc['text']}"
-            for doc in context_docs
-        ])
+        with telemetry.span("llm.build_prompt", chunks=len(context_docs)):
+            context_text = "\n\n".join([
+                f"Source: {passage['source']}\n{passage['text']}"
+                for passage in self.context_assembler.assemble(context_docs)
+            ])
         
         # Si aucun contexte n'est fourni
         if not context_text:
             context_text = "Aucune information pertinente trouvée."
         
+        telemetry.count("context_tokens", self.context_assembler.count_tokens(context_text))
+        return context_text
+    
+    def _cache_key(
+        self,
+        context_docs: List[Dict[str, Any]],
+        query_embedding: Optional[List[float]]
+    ) -> Optional[List[int]]:
+        """
+        Détermine les identifiants de chunks servant de clé au cache de réponses.
+        
+        Args:
+            context_docs: Documents de contexte pertinents
+            query_embedding: Embedding de la requête
+        
+        Returns:
+            Identifiants des chunks, ou None si le cache ne peut pas être utilisé
+        """
+        if self.response_cache is None or query_embedding is None:
+            return None
+        if not all("id" in doc for doc in context_docs):
+            return None
+        return [doc["id"] for doc in context_docs]
+    
+    def _lookup_cache(self, query_embedding: List[float], chunk_ids: List[int]) -> Optional[str]:
+        """Cherche une réponse dans le cache de réponses et compte le succès ou l'échec."""
+        with telemetry.span("llm.cache_lookup"):
+            cached = self.response_cache.get(query_embedding, chunk_ids)
+        telemetry.count("response_cache_hits" if cached is not None else "response_cache_misses")
+        return cached
+    
+    def _store_in_cache(
+        self,
+        query_embedding: List[float],
+        chunk_ids: List[int],
+        context_docs: List[Dict[str, Any]],
+        response: str
+    ):
+        """Enregistre une réponse complète dans le cache de réponses."""
+        sources = [doc["metadata"]["source"] for doc in context_docs]
+        self.response_cache.put(query_embedding, chunk_ids, sources, response)
+    
+    def get_response(
+        self,
+        query: str,
+        context_docs: List[Dict[str, Any]],
+        query_embedding: Optional[List[float]] = None
+    ) -> str:
+        """
+        Génère une réponse à partir de la requête et du contexte.
+        
+        Si un cache de réponses est configuré et que l'embedding de la requête
+        est fourni, une requête proche ayant retrouvé exactement les mêmes
+        chunks réutilise la réponse en cache sans appeler le LLM.
+        
+        Args:
+            query: Requête de l'utilisateur
+            context_docs: Documents de contexte pertinents
+            query_embedding: Embedding de la requête (requis pour utiliser le cache)
+        
+        Returns:
+            Réponse générée par le LLM
+        """
+        chunk_ids = self._cache_key(context_docs, query_embedding)
+        if chunk_ids is not None:
+            cached = self._lookup_cache(query_embedding, chunk_ids)
+            if cached is not None:
+                return cached
+        
         # Invoquer la chaîne LLM
-        response = self.chain.invoke({
-            "question": query,
-            "context": context_text
-        })
+        context = self._format_context(context_docs)
+        with telemetry.span("llm.generate", model=self.model_name):
+            response = self.chain.invoke({
+                "question": query,
+                "context": context
+            })
+        telemetry.count("completion_tokens", self.context_assembler.count_tokens(response["text"]))
+        
+        if chunk_ids is not None:
+            self._store_in_cache(query_embedding, chunk_ids, context_docs, response["text"])
         
         return response["text"]
+    
+    async def aget_response(
+        self,
+        query: str,
+        context_docs: List[Dict[str, Any]],
+        query_embedding: Optional[List[float]] = None
+    ) -> str:
+        """
+        Version asynchrone de `get_response`, qui ne bloque aucun thread pendant l'appel réseau.
+        
+        L'appel passe par `async_client` : connexions réutilisées, nombre
+        d'appels simultanés et débit bornés, nouvelles tentatives sur les
+        erreurs transitoires (limite de débit comprise).
+        
+        Args:
+            query: Requête de l'utilisateur
+            context_docs: Documents de contexte pertinents
+            query_embedding: Embedding de la requête (requis pour utiliser le cache)
+        
+        Returns:
+            Réponse générée par le LLM
+        
+        Raises:
+            RuntimeError: Si l'appel au LLM échoue définitivement
+        """
+        chunk_ids = self._cache_key(context_docs, query_embedding)
+        if chunk_ids is not None:
+            cached = self._lookup_cache(query_embedding, chunk_ids)
+            if cached is not None:
+                return cached
+        
+        context = self._format_context(context_docs)
+        messages = [
+            {"role": _MESSAGE_ROLES.get(message.type, "user"), "content": message.content}
+            for message in self.prompt_template.format_messages(question=query, context=context)
+        ]
+        with telemetry.span("llm.generate", model=self.model_name):
+            response = await self.async_client.complete(messages)
+        telemetry.count("completion_tokens", self.context_assembler.count_tokens(response))
+        
+        if chunk_ids is not None:
+            self._store_in_cache(query_embedding, chunk_ids, context_docs, response)
+        
+        return response
+    
+    async def aclose(self):
+        """Ferme les connexions du client asynchrone."""
+        await self.async_client.aclose()
+    
+    def stream_response(
+        self,
+        query: str,
+        context_docs: List[Dict[str, Any]],
+        query_embedding: Optional[List[float]] = None
+    ) -> Iterator[str]:
+        """
+        Génère une réponse token par token.
+        
+        Une réponse trouvée dans le cache est renvoyée en un seul fragment ;
+        sinon la réponse complète est mise en cache une fois le flux terminé.
+        
+        Args:
+            query: Requête de l'utilisateur
+            context_docs: Documents de contexte pertinents
+            query_embedding: Embedding de la requête (requis pour utiliser le cache)
+        
+        Returns:
+            Itérateur sur les fragments de texte de la réponse
+        """
+        chunk_ids = self._cache_key(context_docs, query_embedding)
+        if chunk_ids is not None:
+            cached = self._lookup_cache(query_embedding, chunk_ids)
+            if cached is not None:
+                yield cached
+                return
+        
+        parts = []
+        context = self._format_context(context_docs)
+        with telemetry.span("llm.generate", model=self.model_name, stream=True) as span:
+            started = time.perf_counter()
+            for chunk in self.stream_chain.stream({
+                "question": query,
+                "context": context
+            }):
+                if chunk.content:
+                    if not parts:
+                        span.set(first_token_ms=round((time.perf_counter() - started) * 1000.0, 3))
+                    parts.append(chunk.content)
+                    yield chunk.content
+        telemetry.count("completion_tokens", self.context_assembler.count_tokens("".join(parts)))
+        
+        if chunk_ids is not None:
+            self._store_in_cache(query_embedding, chunk_ids, context_docs, "".join(parts))
+    
+    async def astream_response(
+        self,
+        query: str,
+        context_docs: List[Dict[str, Any]],
+        query_embedding: Optional[List[float]] = None
+    ) -> AsyncIterator[str]:
+        """
+        Version asynchrone de `stream_response`.
+        
+        Args:
+            query: Requête de l'utilisateur
+            context_docs: Documents de contexte pertinents
+            query_embedding: Embedding de la requête (requis pour utiliser le cache)
+        
+        Returns:
+            Itérateur asynchrone sur les fragments de texte de la réponse
+        """
+        chunk_ids = self._cache_key(context_docs, query_embedding)
+        if chunk_ids is not None:
+            cached = self._lookup_cache(query_embedding, chunk_ids)
+            if cached is not None:
+                yield cached
+                return
+        
+        parts = []
+        context = self._format_context(context_docs)
+        with telemetry.span("llm.generate", model=self.model_name, stream=True) as span:
+            started = time.perf_counter()
+            async for chunk in self.stream_chain.astream({
+                "question": query,
+                "context": context
+            }):
+                if chunk.content:
+                    if not parts:
+                        span.set(first_token_ms=round((time.perf_counter() - started) * 1000.0, 3))
+                    parts.append(chunk.content)
+                    yield chunk.content
+        telemetry.count("completion_tokens", self.context_assembler.count_tokens("".join(parts)))
+        
+        if chunk_ids is not None:
+            self._store_in_cache(query_embedding, chunk_ids, context_docs, "".join(parts))
@@ -0,0 +1,373 @@
+"""
+Module regroupant la logique RAG partagée, indépendante de l'interface Streamlit.
+"""
+import os
+import json
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple, Callable, AsyncIterator
+import numpy as np
+
+from .document_processor import DocumentProcessor
+from .embeddings import EmbeddingManager
+from .embedding_cache import EmbeddingCache
+from .vector_store import VectorStore
+from .sharded_store import CollectionManager, DEFAULT_COLLECTION
+from .llm_handler import LLMHandler
+from .ingestion import IngestionPipeline
+from .response_cache import SemanticResponseCache
+from .reranker import CrossEncoderReranker
+from .telemetry import telemetry
+
+NO_CONTEXT_RESPONSE = (
+    "Je n'ai pas trouvé d'informations pertinentes dans les documents fournis. "
+    "Veuillez essayer une autre question ou ajouter plus de documents."
+)
+
+class QueryBatcher:
+    """Regroupe les requêtes concurrentes en micro-lots pour l'encodage et la recherche."""
+    
+    def __init__(
+        self,
+        search_fn: Callable[
+            [List[str], int, List[Optional[Dict[str, Any]]]],
+            List[Tuple[List[float], List[Tuple[Dict[str, Any], float]]]]
+        ],
+        max_batch_size: int = 32,
+        max_wait_ms: float = 5.0,
+        executor: Optional[ThreadPoolExecutor] = None
+    ):
+        """
+        Initialise le regroupeur de requêtes.
+        
+        Args:
+            search_fn: Fonction synchrone (requêtes, k, filtres) -> tuple (embedding, résultats) par requête
+            max_batch_size: Taille maximale d'un lot
+            max_wait_ms: Délai maximal d'attente avant d'envoyer un lot incomplet
+            executor: Exécuteur dans lequel lancer `search_fn` (créé si None)
+        """
+        self.search_fn = search_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.executor = executor or ThreadPoolExecutor(max_workers=2)
+        self._pending = []
+        self._timer = None
+    
+    async def submit(
+        self,
+        query: str,
+        k: int = 4,
+        filters: Optional[Dict[str, Any]] = None
+    ) -> Tuple[List[float], List[Tuple[Dict[str, Any], float]]]:
+        """
+        Ajoute une requête au lot courant et attend son résultat.
+        
+        Args:
+            query: Texte de la requête
+            k: Nombre de résultats souhaités
+            filters: Filtres sur la source et les métadonnées des chunks
+        
+        Returns:
+            Tuple (embedding de la requête, liste de tuples (document, score))
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((query, k, filters, telemetry.current_trace(), future))
+        
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        
+        return await future
+    
+    def _flush(self):
+        """Envoie le lot courant à l'exécuteur."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            asyncio.ensure_future(self._run(batch))
+    
+    async def _run(self, batch: List[Tuple[str, int, Optional[Dict[str, Any]], Any, asyncio.Future]]):
+        """
+        Exécute un lot et distribue les résultats.
+        
+        Les spans de la recherche sont rattachés à la trace de chaque requête du lot.
+        
+        Args:
+            batch: Tuples (requête, k, filtres, trace, future) du lot
+        """
+        loop = asyncio.get_running_loop()
+        queries = [query for query, _, _, _, _ in batch]
+        filters = [query_filters for _, _, query_filters, _, _ in batch]
+        k = max(k for _, k, _, _, _ in batch)
+        traces = [trace for _, _, _, trace, _ in batch]
+        
+        def search():
+            with telemetry.shared_trace(traces):
+                return self.search_fn(queries, k, filters)
+        
+        try:
+            results = await loop.run_in_executor(self.executor, contextvars.copy_context().run, search)
+        except Exception as e:
+            for _, _, _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        
+        for (_, query_k, _, _, future), (query_embedding, hits) in zip(batch, results):
+            if not future.done():
+                future.set_result((query_embedding, hits[:query_k]))
+
+class RAGService:
+    """Service RAG partageant un seul modèle d'embeddings et un seul index entre les requêtes."""
+    
+    def __init__(
+        self,
+        data_dir: str = "data",
+        collection: str = DEFAULT_COLLECTION,
+        n_shards: int = 4,
+        document_processor: Optional[DocumentProcessor] = None,
+        embedding_manager: Optional[EmbeddingManager] = None,
+        vector_store: Optional[VectorStore] = None,
+        llm_handler: Optional[LLMHandler] = None,
+        response_cache: Optional[SemanticResponseCache] = None,
+        search_mode: str = "hybrid",
+        embedding_options: Optional[Dict[str, Any]] = None,
+        llm_options: Optional[Dict[str, Any]] = None,
+        reranker: Optional[CrossEncoderReranker] = None,
+        rerank_candidates: int = 20,
+        store_options: Optional[Dict[str, Any]] = None,
+        min_score: Optional[float] = None
+    ):
+        """
+        Initialise le service et charge la base de connaissances existante.
+        
+        Args:
+            data_dir: Répertoire des données persistées
+            collection: Nom de la collection servie
+            n_shards: Nombre de shards d'une nouvelle collection
+            document_processor: Processeur de documents (créé si None)
+            embedding_manager: Gestionnaire d'embeddings (créé avec cache si None)
+            vector_store: Stockage vectoriel (collection chargée depuis `data_dir` si None)
+            llm_handler: Gestionnaire LLM (créé si GROQ_API_KEY est définie et None fourni)
+            response_cache: Cache sémantique des réponses (créé si None)
+            search_mode: Mode de recherche du vector store ("vector", "lexical" ou "hybrid")
+            embedding_options: Options du moteur d'embeddings créé par défaut (backend, batch_size, num_threads...)
+            llm_options: Options du client LLM asynchrone créé par défaut (max_concurrency, requests_per_second...)
+            reranker: Cross-encoder réordonnant les candidats de la recherche (désactivé si None)
+            rerank_candidates: Nombre de candidats recherchés par requête avant le réordonnancement
+            store_options: Paramètres des vector stores des collections (metric, index_type...)
+            min_score: Similarité dense minimale des documents retrouvés ; une requête sans
+                document assez similaire reçoit la réponse par défaut sans appel au LLM
+                (métriques "cosine" et "inner_product", désactivé si None)
+        """
+        self.data_dir = data_dir
+        self.collection = collection
+        self.search_mode = search_mode
+        self.reranker = reranker
+        self.rerank_candidates = rerank_candidates
+        self.min_score = min_score
+        os.makedirs(self.data_dir, exist_ok=True)
+        
+        self.document_processor = document_processor or DocumentProcessor()
+        self.embedding_manager = embedding_manager or EmbeddingManager(
+            cache=EmbeddingCache(os.path.join(self.data_dir, "embeddings_cache.sqlite")),
+            **(embedding_options or {})
+        )
+        self.collections = CollectionManager(self.data_dir, n_shards=n_shards, **(store_options or {}))
+        self.store_dir = self.collections.directory(collection)
+        if vector_store is None:
+            vector_store = self.collections.get(collection)
+        self.vector_store = vector_store
+        self.response_cache = response_cache or SemanticResponseCache()
+        if llm_handler is None and os.environ.get("GROQ_API_KEY"):
+            llm_handler = LLMHandler(response_cache=self.response_cache, client_options=llm_options)
+        self.llm_handler = llm_handler
+    
+    def retrieve_batch(
+        self,
+        queries: List[str],
+        k: int = 4,
+        filters: Optional[List[Optional[Dict[str, Any]]]] = None
+    ) -> List[Tuple[np.ndarray, List[Tuple[Dict[str, Any], float]]]]:
+        """
+        Encode un lot de requêtes et recherche leurs documents pertinents.
+        
+        Les requêtes sont encodées en un seul appel, puis recherchées par
+        groupes partageant les mêmes filtres. Avec un cross-encoder, les
+        `rerank_candidates` premiers candidats sont réordonnés et seuls les k
+        meilleurs sont retournés.
+        
+        Args:
+            queries: Textes des requêtes
+            k: Nombre de résultats par requête
+            filters: Filtres de chaque requête sur la source et les métadonnées (None pour aucun)
+        
+        Returns:
+            Pour chaque requête, tuple (embedding, liste de tuples (document, score))
+        """
+        telemetry.count("queries", len(queries))
+        query_embeddings = self.embedding_manager.get_query_embeddings_array(queries)
+        filters = filters or [None] * len(queries)
+        
+        groups = {}
+        for position, query_filters in enumerate(filters):
+            key = json.dumps(query_filters, sort_keys=True, default=str)
+            groups.setdefault(key, (query_filters, []))[1].append(position)
+        
+        search_k = max(k, self.rerank_candidates) if self.reranker is not None else k
+        results = [None] * len(queries)
+        # Le vector store se partage entre threads : les recherches n'attendent pas une ingestion en cours
+        with telemetry.span("rag.search", queries=len(queries), groups=len(groups)):
+            for query_filters, positions in groups.values():
+                group_results = self.vector_store.search_batch(
+                    query_embeddings[positions],
+                    search_k,
+                    query_texts=[queries[position] for position in positions],
+                    mode=self.search_mode,
+                    filters=query_filters,
+                    min_score=self.min_score
+                )
+                for position, hits in zip(positions, group_results):
+                    results[position] = hits
+        if self.reranker is not None:
+            results = self.reranker.rerank_batch(queries, results, k)
+        return list(zip(query_embeddings, results))
+    
+    def answer(
+        self,
+        query: str,
+        context_docs: List[Dict[str, Any]],
+        query_embedding: Optional[List[float]] = None
+    ) -> str:
+        """
+        Génère une réponse à partir des documents retrouvés.
+        
+        Args:
+            query: Requête de l'utilisateur
+            context_docs: Documents de contexte pertinents
+            query_embedding: Embedding de la requête (active le cache de réponses)
+        
+        Returns:
+            Réponse générée, ou message par défaut si aucun document n'est pertinent
+        """
+        if not context_docs:
+            return NO_CONTEXT_RESPONSE
+        if self.llm_handler is None:
+            raise RuntimeError("Aucun LLM configuré. Définissez GROQ_API_KEY.")
+        return self.llm_handler.get_response(query, context_docs, query_embedding=query_embedding)
+    
+    async def aanswer(
+        self,
+        query: str,
+        context_docs: List[Dict[str, Any]],
+        query_embedding: Optional[List[float]] = None
+    ) -> str:
+        """
+        Version asynchrone de `answer`.
+        
+        Args:
+            query: Requête de l'utilisateur
+            context_docs: Documents de contexte pertinents
+            query_embedding: Embedding de la requête (active le cache de réponses)
+        
+        Returns:
+            Réponse générée, ou message par défaut si aucun document n'est pertinent
+        """
+        if not context_docs:
+            return NO_CONTEXT_RESPONSE
+        if self.llm_handler is None:
+            raise RuntimeError("Aucun LLM configuré. Définissez GROQ_API_KEY.")
+        return await self.llm_handler.aget_response(query, context_docs, query_embedding=query_embedding)
+    
+    async def astream_answer(
+        self,
+        query: str,
+        context_docs: List[Dict[str, Any]],
+        query_embedding: Optional[List[float]] = None
+    ) -> AsyncIterator[str]:
+        """
+        Génère une réponse fragment par fragment.
+        
+        Args:
+            query: Requête de l'utilisateur
+            context_docs: Documents de contexte pertinents
+            query_embedding: Embedding de la requête (active le cache de réponses)
+        
+        Returns:
+            Itérateur asynchrone sur les fragments de la réponse
+        """
+        if not context_docs:
+            yield NO_CONTEXT_RESPONSE
+            return
+        if self.llm_handler is None:
+            raise RuntimeError("Aucun LLM configuré. Définissez GROQ_API_KEY.")
+        async for token in self.llm_handler.astream_response(query, context_docs, query_embedding=query_embedding):
+            yield token
+    
+    def ingest(self, files: List[Any], urls: List[str]) -> List[Dict[str, Any]]:
+        """
+        Ingère des fichiers et des URLs puis sauvegarde la base.
+        
+        Args:
+            files: Fichiers (objets exposant `name` et `getvalue()`)
+            urls: URLs à traiter
+        
+        Returns:
+            Liste des événements produits par le pipeline d'ingestion
+        """
+        pipeline = IngestionPipeline(
+            self.document_processor,
+            self.embedding_manager,
+            self.vector_store
+        )
+        events = list(pipeline.run(files, urls))
+        self.vector_store.save(self.store_dir)
+        
+        # Les réponses construites sur des sources modifiées ne sont plus valides
+        self.response_cache.invalidate_sources(
+            event["source"]
+            for event in events
+            if event["type"] == "indexed" and (event["added"] or event["removed"])
+        )
+        return events
+    
+    def metrics(self, format: str = "prometheus") -> str:
+        """
+        Exporte les métriques de télémétrie du processus.
+        
+        Args:
+            format: "prometheus" (texte d'exposition) ou "json"
+        
+        Returns:
+            Métriques sérialisées
+        
+        Raises:
+            ValueError: Si le format est inconnu
+        """
+        if format == "prometheus":
+            return telemetry.to_prometheus()
+        if format == "json":
+            return json.dumps(telemetry.snapshot(), ensure_ascii=False)
+        raise ValueError(f"Format de métriques non pris en charge: {format}")
+    
+    def health(self) -> Dict[str, Any]:
+        """
+        Décrit l'état du service.
+        
+        Returns:
+            Dictionnaire avec la collection, le nombre de chunks et de sources, et la disponibilité du LLM
+        """
+        return {
+            "status": "ok",
+            "collection": self.collection,
+            "chunks": len(self.vector_store),
+            "sources": len(self.vector_store.list_sources()),
+            "llm": self.llm_handler is not None,
+            "reranker": self.reranker.stats() if self.reranker is not None else None,
+            "response_cache": self.response_cache.stats()
+        }
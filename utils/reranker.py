@@ -0,0 +1,218 @@
+"""
+Module pour réordonner les documents retrouvés avec un cross-encoder local.
+
+Le cross-encoder lit la requête et le texte d'un chunk ensemble : il classe
+mieux que la similarité des embeddings, mais coûte une inférence par paire.
+Il n'est donc appliqué qu'aux N premiers candidats de la recherche, par lots,
+et ses scores sont mis en cache par (requête, texte du chunk).
+"""
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Tuple
+
+from .telemetry import telemetry
+
+DEFAULT_RERANK_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+
+def load_cross_encoder(
+    model_name: str = DEFAULT_RERANK_MODEL,
+    max_seq_length: int = 256,
+    num_threads: Optional[int] = None,
+    device: str = "cpu"
+):
+    """
+    Charge un cross-encoder sentence-transformers.
+    
+    Args:
+        model_name: Nom du cross-encoder sur le Hub Hugging Face
+        max_seq_length: Nombre maximal de tokens par paire (tronqué au-delà)
+        num_threads: Nombre de threads de calcul de PyTorch (réglage global au processus, défaut de PyTorch si None)
+        device: Périphérique de calcul
+    
+    Returns:
+        Modèle exposant `predict(paires, batch_size)`
+    """
+    # Import différé : PyTorch est long à charger
+    import torch
+    from sentence_transformers import CrossEncoder
+    
+    if num_threads is not None:
+        torch.set_num_threads(num_threads)
+    return CrossEncoder(model_name, max_length=max_seq_length, device=device)
+
+class CrossEncoderReranker:
+    """Second classement des candidats par un cross-encoder, avec cache des scores et budget de latence."""
+    
+    def __init__(
+        self,
+        model_name: str = DEFAULT_RERANK_MODEL,
+        batch_size: int = 16,
+        max_seq_length: int = 256,
+        num_threads: Optional[int] = None,
+        device: str = "cpu",
+        cache_size: int = 10000,
+        latency_budget_ms: Optional[float] = None,
+        model: Optional[Any] = None
+    ):
+        """
+        Charge le modèle.
+        
+        Les scores sont mis en cache par empreinte de la requête et du texte
+        du chunk, et non par identifiant : un identifiant réattribué à un
+        autre chunk (collection vidée, puis réalimentée) ne reprend pas le
+        score de l'ancien.
+        
+        Args:
+            model_name: Nom du cross-encoder sur le Hub Hugging Face
+            batch_size: Nombre de paires (requête, chunk) évaluées par passe
+            max_seq_length: Nombre maximal de tokens par paire (tronqué au-delà)
+            num_threads: Nombre de threads de calcul de PyTorch (réglage global au processus, défaut de PyTorch si None)
+            device: Périphérique de calcul
+            cache_size: Nombre maximal de scores conservés (éviction LRU)
+            latency_budget_ms: Durée maximale d'un réordonnancement ; au-delà, les requêtes
+                pas encore évaluées gardent l'ordre de la recherche (illimitée si None)
+            model: Modèle déjà chargé, partagé entre réordonnanceurs (voir `load_cross_encoder`)
+        """
+        if batch_size < 1:
+            raise ValueError("batch_size doit être supérieur ou égal à 1")
+        
+        self.model = model or load_cross_encoder(model_name, max_seq_length, num_threads, device)
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.cache_size = cache_size
+        self.latency_budget_ms = latency_budget_ms
+        
+        self._lock = threading.Lock()
+        self._scores = OrderedDict()  # (empreinte de la requête, empreinte du texte du chunk) -> score
+    
+    @staticmethod
+    def hash_text(text: str) -> str:
+        """
+        Calcule l'empreinte d'une requête ou du texte d'un chunk.
+        
+        Args:
+            text: Texte à hacher
+        
+        Returns:
+            Empreinte SHA-256 hexadécimale du texte
+        """
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+    
+    def _cached(self, key: Tuple[str, str]) -> Optional[float]:
+        """Retourne le score en cache d'une paire, ou None."""
+        with self._lock:
+            score = self._scores.get(key)
+            if score is not None:
+                self._scores.move_to_end(key)
+            return score
+    
+    def _store(self, keys: List[Tuple[str, str]], scores: List[float]):
+        """Met en cache les scores de paires évaluées, en évinçant les plus anciens."""
+        with self._lock:
+            for key, score in zip(keys, scores):
+                self._scores[key] = score
+                self._scores.move_to_end(key)
+            while len(self._scores) > self.cache_size:
+                self._scores.popitem(last=False)
+    
+    def rerank(
+        self,
+        query: str,
+        hits: List[Tuple[Dict[str, Any], float]],
+        k: int = 4
+    ) -> List[Tuple[Dict[str, Any], float]]:
+        """
+        Réordonne les candidats d'une requête.
+        
+        Args:
+            query: Texte de la requête
+            hits: Candidats de la recherche, tuples (document, score) dans l'ordre de la recherche
+            k: Nombre de documents à retourner
+        
+        Returns:
+            Les k meilleurs tuples (document, score du cross-encoder), ou les k premiers
+            candidats de la recherche si le budget de latence est dépassé
+        """
+        return self.rerank_batch([query], [hits], k)[0]
+    
+    def rerank_batch(
+        self,
+        queries: List[str],
+        hits: List[List[Tuple[Dict[str, Any], float]]],
+        k: int = 4
+    ) -> List[List[Tuple[Dict[str, Any], float]]]:
+        """
+        Réordonne les candidats de plusieurs requêtes, en regroupant leurs paires dans les mêmes lots.
+        
+        Les paires sont évaluées requête après requête : si le budget de latence
+        est dépassé, les requêtes déjà entièrement évaluées sont réordonnées et
+        les autres gardent l'ordre de la recherche. Les scores déjà calculés
+        restent en cache pour les requêtes suivantes.
+        
+        Args:
+            queries: Textes des requêtes
+            hits: Candidats de chaque requête, tuples (document, score) dans l'ordre de la recherche
+            k: Nombre de documents à retourner par requête
+        
+        Returns:
+            Pour chaque requête, liste de k tuples (document, score)
+        """
+        start = time.perf_counter()
+        scores = [[None] * len(query_hits) for query_hits in hits]
+        pending = []  # (position de la requête, rang du candidat, clé du cache) des paires à évaluer
+        for position, (query, query_hits) in enumerate(zip(queries, hits)):
+            query_hash = self.hash_text(query)
+            for rank, (doc, _) in enumerate(query_hits):
+                key = (query_hash, self.hash_text(doc["text"]))
+                scores[position][rank] = self._cached(key)
+                if scores[position][rank] is None:
+                    pending.append((position, rank, key))
+        telemetry.count("rerank_cache_hits", sum(len(query_hits) for query_hits in hits) - len(pending))
+        
+        with telemetry.span("rag.rerank", queries=len(queries), pairs=len(pending)) as span:
+            evaluated = 0
+            batch_ms = 0.0
+            while evaluated < len(pending):
+                # Ne pas lancer un lot qui finirait après le budget (estimé d'après le lot précédent)
+                elapsed_ms = (time.perf_counter() - start) * 1000
+                if self.latency_budget_ms is not None and elapsed_ms + batch_ms > self.latency_budget_ms:
+                    break
+                batch_start = time.perf_counter()
+                batch = pending[evaluated:evaluated + self.batch_size]
+                pairs = [(queries[position], hits[position][rank][0]["text"]) for position, rank, _ in batch]
+                batch_scores = [float(score) for score in self.model.predict(pairs, batch_size=len(pairs))]
+                for (position, rank, _), score in zip(batch, batch_scores):
+                    scores[position][rank] = score
+                self._store([key for _, _, key in batch], batch_scores)
+                evaluated += len(batch)
+                batch_ms = (time.perf_counter() - batch_start) * 1000
+            span.set(evaluated=evaluated)
+        
+        results = []
+        for query_hits, query_scores in zip(hits, scores):
+            if any(score is None for score in query_scores):
+                # Budget dépassé avant d'évaluer tous les candidats : ordre de la recherche
+                telemetry.count("rerank_fallbacks")
+                results.append(query_hits[:k])
+                continue
+            order = sorted(range(len(query_hits)), key=lambda rank: query_scores[rank], reverse=True)
+            results.append([(query_hits[rank][0], query_scores[rank]) for rank in order[:k]])
+        return results
+    
+    def clear(self):
+        """Vide le cache des scores."""
+        with self._lock:
+            self._scores.clear()
+    
+    def stats(self) -> Dict[str, Any]:
+        """
+        Décrit le réordonnanceur.
+        
+        Returns:
+            Dictionnaire avec le modèle, le nombre de scores en cache et le budget de latence
+        """
+        with self._lock:
+            cached = len(self._scores)
+        return {"model": self.model_name, "cached_scores": cached, "latency_budget_ms": self.latency_budget_ms}
@@ -0,0 +1,171 @@
+"""
+Module pour mettre en cache les réponses du LLM par similarité sémantique des requêtes.
+"""
+import time
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Iterable
+import numpy as np
+
+class SemanticResponseCache:
+    """Cache LRU des réponses, indexé par contexte retrouvé et similarité de la requête."""
+    
+    def __init__(
+        self,
+        similarity_threshold: float = 0.95,
+        max_entries: int = 1000,
+        ttl_seconds: Optional[float] = 3600
+    ):
+        """
+        Initialise le cache de réponses.
+        
+        Args:
+            similarity_threshold: Similarité cosinus minimale entre deux requêtes pour un succès
+            max_entries: Nombre maximal de réponses conservées (éviction LRU)
+            ttl_seconds: Durée de vie d'une réponse en secondes (None pour illimitée)
+        """
+        self.similarity_threshold = similarity_threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # Clé -> entrée, de la moins à la plus récemment utilisée
+        self._by_context = {}  # Ensemble d'identifiants de chunks -> clés des entrées
+        self._next_key = 0
+        
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+    
+    @staticmethod
+    def _normalize(embedding: List[float]) -> np.ndarray:
+        """Normalise un embedding pour le calcul de la similarité cosinus."""
+        vector = np.asarray(embedding, dtype='float32')
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+    
+    def _remove(self, key: int):
+        """Supprime une entrée et sa référence dans l'index par contexte."""
+        entry = self._entries.pop(key)
+        keys = self._by_context[entry["context"]]
+        keys.remove(key)
+        if not keys:
+            del self._by_context[entry["context"]]
+    
+    def _expired(self, entry: Dict[str, Any], now: float) -> bool:
+        """Indique si une entrée a dépassé sa durée de vie."""
+        return self.ttl_seconds is not None and now - entry["created_at"] > self.ttl_seconds
+    
+    def get(self, query_embedding: List[float], chunk_ids: Iterable[int]) -> Optional[str]:
+        """
+        Cherche une réponse pour une requête proche avec exactement le même contexte.
+        
+        Args:
+            query_embedding: Embedding de la requête
+            chunk_ids: Identifiants des chunks retrouvés pour la requête
+        
+        Returns:
+            Réponse en cache, ou None
+        """
+        context = frozenset(chunk_ids)
+        query = self._normalize(query_embedding)
+        now = time.time()
+        
+        with self._lock:
+            best_key = None
+            best_similarity = self.similarity_threshold
+            for key in list(self._by_context.get(context, ())):
+                entry = self._entries[key]
+                if self._expired(entry, now):
+                    self._remove(key)
+                    self.evictions += 1
+                    continue
+                similarity = float(np.dot(query, entry["embedding"]))
+                if similarity >= best_similarity:
+                    best_key, best_similarity = key, similarity
+            
+            if best_key is None:
+                self.misses += 1
+                return None
+            
+            self._entries.move_to_end(best_key)
+            self.hits += 1
+            return self._entries[best_key]["response"]
+    
+    def put(
+        self,
+        query_embedding: List[float],
+        chunk_ids: Iterable[int],
+        sources: Iterable[str],
+        response: str
+    ):
+        """
+        Enregistre une réponse.
+        
+        Args:
+            query_embedding: Embedding de la requête
+            chunk_ids: Identifiants des chunks utilisés comme contexte
+            sources: Sources de ces chunks (pour l'invalidation)
+            response: Réponse générée par le LLM
+        """
+        context = frozenset(chunk_ids)
+        with self._lock:
+            key = self._next_key
+            self._next_key += 1
+            self._entries[key] = {
+                "embedding": self._normalize(query_embedding),
+                "context": context,
+                "sources": frozenset(sources),
+                "response": response,
+                "created_at": time.time()
+            }
+            self._by_context.setdefault(context, []).append(key)
+            
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+    
+    def invalidate_sources(self, sources: Iterable[str]) -> int:
+        """
+        Supprime les réponses construites à partir de sources modifiées ou supprimées.
+        
+        Args:
+            sources: Sources qui ont changé
+        
+        Returns:
+            Nombre de réponses supprimées
+        """
+        sources = set(sources)
+        with self._lock:
+            stale = [key for key, entry in self._entries.items() if entry["sources"] & sources]
+            for key in stale:
+                self._remove(key)
+            self.invalidations += len(stale)
+        return len(stale)
+    
+    def clear(self):
+        """Vide le cache."""
+        with self._lock:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+            self._by_context.clear()
+    
+    def stats(self) -> Dict[str, Any]:
+        """
+        Retourne les métriques du cache.
+        
+        Returns:
+            Dictionnaire avec la taille, les succès, les échecs, le taux de succès,
+            les évictions et les invalidations
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations
+            }
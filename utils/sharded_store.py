@@ -0,0 +1,512 @@
+"""
+Module pour répartir une collection sur plusieurs index FAISS et gérer des collections nommées.
+"""
+import os
+import re
+import json
+import zlib
+import shutil
+import threading
+import contextlib
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple, Union
+import numpy as np
+
+from . import DEFAULT_COLLECTION  # Collection par défaut (reprend l'ancien vector store unique au premier accès)
+from .vector_store import VectorStore, as_embedding_matrix
+from .telemetry import telemetry
+from .write_ahead_log import atomic_write_json
+
+# Nom de base de l'ancien vector store unique, dans le répertoire des données
+_LEGACY_STORE_NAME = "vector_store"
+
+_COLLECTION_NAME_RE = re.compile(r"[\w-]+")
+
+# Fichiers de l'ancien vector store unique, index compactés (`vector_store.NNNNNNNNNN.index`) compris
+_LEGACY_FILE_RE = re.compile(rf"{_LEGACY_STORE_NAME}\.(index|\d+\.index|checkpoint\.json|wal|sqlite|bm25\.sqlite|pkl)")
+
+# Fichiers dont la présence indique qu'un VectorStore a été sauvegardé
+_SAVED_STORE_FILES = ("checkpoint.json", "index", "sqlite", "pkl")
+
+class ShardedVectorStore:
+    """Collection répartie sur plusieurs VectorStore, avec recherche parallèle sur les shards."""
+    
+    def __init__(self, n_shards: int = 4, max_workers: Optional[int] = None, **store_kwargs):
+        """
+        Initialise la collection.
+        
+        Chaque source est rattachée à un seul shard (par hachage de son nom) :
+        ingérer ou supprimer une source ne modifie que ce shard, et seuls les
+        shards modifiés sont réécrits à la sauvegarde. Les identifiants de
+        chunks exposés sont globaux (identifiant local * n_shards + shard).
+        Comme chaque shard, la collection peut être interrogée pendant une
+        ingestion ; les modifications sont sérialisées.
+        
+        Args:
+            n_shards: Nombre de shards (index FAISS indépendants)
+            max_workers: Nombre de threads pour la recherche parallèle (défaut: n_shards)
+            **store_kwargs: Paramètres transmis à chaque VectorStore (dimension, index_type...)
+        """
+        if n_shards < 1:
+            raise ValueError("n_shards doit être supérieur ou égal à 1")
+        
+        self.n_shards = n_shards
+        self.store_kwargs = store_kwargs
+        self.shards = [VectorStore(**store_kwargs) for _ in range(n_shards)]
+        self.dimension = self.shards[0].dimension
+        self.metric = self.shards[0].metric
+        
+        # FAISS relâche le GIL pendant la recherche : les shards sont parcourus en parallèle
+        self._executor = ThreadPoolExecutor(max_workers=max_workers or n_shards)
+        self._dirty = set(range(n_shards))  # Shards modifiés depuis la dernière sauvegarde
+        self._location = None  # (répertoire, nom) de la dernière sauvegarde ou du dernier chargement
+        self._write_lock = threading.RLock()
+    
+    def __len__(self) -> int:
+        """Retourne le nombre de chunks indexés dans tous les shards."""
+        return sum(len(shard) for shard in self.shards)
+    
+    @contextlib.contextmanager
+    def batch(self):
+        """
+        Regroupe des modifications en une seule publication par shard (voir `VectorStore.batch`).
+        
+        Les shards sont publiés l'un après l'autre à la fin du bloc.
+        """
+        with self._write_lock, contextlib.ExitStack() as stack:
+            for shard in self.shards:
+                stack.enter_context(shard.batch())
+            yield
+    
+    @property
+    def needs_checkpoint(self) -> bool:
+        """Indique si un shard doit être réécrit en entier à la prochaine sauvegarde (voir `VectorStore.needs_checkpoint`)."""
+        return any(shard.needs_checkpoint for shard in self.shards)
+    
+    def _shard_for(self, source: str) -> int:
+        """Retourne l'indice du shard d'une source (hachage stable)."""
+        return zlib.crc32(source.encode("utf-8")) % self.n_shards
+    
+    def _global_id(self, shard_index: int, local_id: int) -> int:
+        """Convertit un identifiant local à un shard en identifiant global."""
+        return local_id * self.n_shards + shard_index
+    
+    def add_documents(
+        self,
+        documents: List[Dict[str, Any]],
+        embeddings: Union[np.ndarray, List[List[float]]],
+        source: Optional[str] = None
+    ) -> List[int]:
+        """
+        Ajoute des documents, chacun dans le shard de sa source.
+        
+        Args:
+            documents: Liste de dictionnaires contenant le texte et les métadonnées
+            embeddings: Embeddings correspondants (matrice float32 de préférence)
+            source: Source à laquelle rattacher les chunks (défaut: `metadata["source"]`)
+        
+        Returns:
+            Identifiants globaux attribués aux chunks ajoutés
+        """
+        groups = {}
+        for position, doc in enumerate(documents):
+            doc_source = source if source is not None else doc["metadata"]["source"]
+            groups.setdefault((self._shard_for(doc_source), doc_source), []).append(position)
+        
+        embeddings = as_embedding_matrix(embeddings, self.dimension)
+        ids = [None] * len(documents)
+        with self._write_lock:
+            for (shard_index, doc_source), positions in groups.items():
+                local_ids = self.shards[shard_index].add_documents(
+                    [documents[position] for position in positions],
+                    embeddings[positions],
+                    source=doc_source
+                )
+                for position, local_id in zip(positions, local_ids):
+                    ids[position] = self._global_id(shard_index, local_id)
+                self._dirty.add(shard_index)
+        return ids
+    
+    def upsert_source(
+        self,
+        source: str,
+        documents: List[Dict[str, Any]],
+        embeddings: Union[np.ndarray, List[List[float]]]
+    ) -> Dict[str, int]:
+        """
+        Remplace le contenu d'une source dans son shard (voir `VectorStore.upsert_source`).
+        
+        Args:
+            source: Identifiant de la source
+            documents: Nouvelle liste complète des chunks de la source
+            embeddings: Embeddings correspondants
+        
+        Returns:
+            Statistiques de la mise à jour (added, removed, unchanged)
+        """
+        shard_index = self._shard_for(source)
+        with self._write_lock:
+            stats = self.shards[shard_index].upsert_source(source, documents, embeddings)
+            if stats["added"] or stats["removed"] or stats["unchanged"]:
+                self._dirty.add(shard_index)
+        return stats
+    
+    def delete_source(self, source: str) -> int:
+        """
+        Supprime tous les chunks d'une source.
+        
+        Args:
+            source: Identifiant de la source à supprimer
+        
+        Returns:
+            Nombre de chunks supprimés
+        """
+        shard_index = self._shard_for(source)
+        with self._write_lock:
+            removed = self.shards[shard_index].delete_source(source)
+            if removed:
+                self._dirty.add(shard_index)
+        return removed
+    
+    def list_sources(self) -> Dict[str, int]:
+        """
+        Liste les sources de tous les shards.
+        
+        Returns:
+            Dictionnaire source -> nombre de chunks
+        """
+        sources = {}
+        for shard in self.shards:
+            sources.update(shard.list_sources())
+        return sources
+    
+    def similarity_search(
+        self,
+        query_embedding: Union[np.ndarray, List[float]],
+        k: int = 4,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        query_text: Optional[str] = None,
+        mode: str = "vector",
+        filters: Optional[Dict[str, Any]] = None,
+        min_score: Optional[float] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Recherche les documents les plus similaires à la requête dans tous les shards.
+        
+        Args:
+            query_embedding: Embedding de la requête
+            k: Nombre de résultats à retourner
+            nprobe: Nombre de listes IVF à visiter (ignoré pour les autres index)
+            ef_search: Taille de la file de recherche HNSW (ignoré pour les autres index)
+            query_text: Texte de la requête (requis pour les modes "lexical" et "hybrid")
+            mode: Mode de recherche ("vector", "lexical" ou "hybrid")
+            filters: Filtres sur la source et les métadonnées
+            min_score: Similarité dense minimale des résultats (voir `VectorStore.search_batch`)
+        
+        Returns:
+            Liste des documents les plus pertinents
+        """
+        query_texts = [query_text] if query_text is not None else None
+        results = self.search_batch(
+            as_embedding_matrix(query_embedding, self.dimension),
+            k,
+            nprobe=nprobe,
+            ef_search=ef_search,
+            query_texts=query_texts,
+            mode=mode,
+            filters=filters,
+            min_score=min_score
+        )
+        return [doc for doc, _ in results[0]]
+    
+    def search_batch(
+        self,
+        query_embeddings: Union[np.ndarray, List[List[float]]],
+        k: int = 4,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        query_texts: Optional[List[str]] = None,
+        mode: str = "vector",
+        rrf_k: int = 60,
+        filters: Optional[Dict[str, Any]] = None,
+        min_score: Optional[float] = None
+    ) -> List[List[Tuple[Dict[str, Any], float]]]:
+        """
+        Recherche un lot de requêtes dans tous les shards en parallèle et fusionne les top-k.
+        
+        Les scores BM25 et RRF sont calculés par shard : leur fusion entre
+        shards est une approximation du classement d'un index unique. De
+        même, en mode "hybrid" avec `min_score`, un shard sans candidat dense
+        au-dessus du seuil ne contribue aucun résultat BM25.
+        
+        Args:
+            query_embeddings: Embeddings des requêtes
+            k: Nombre de résultats à retourner par requête
+            nprobe: Nombre de listes IVF à visiter (ignoré pour les autres index)
+            ef_search: Taille de la file de recherche HNSW (ignoré pour les autres index)
+            query_texts: Textes des requêtes (requis pour les modes "lexical" et "hybrid")
+            mode: Mode de recherche ("vector", "lexical" ou "hybrid")
+            rrf_k: Constante de la fusion RRF
+            filters: Filtres sur la source et les métadonnées
+            min_score: Similarité dense minimale des résultats (voir `VectorStore.search_batch`)
+        
+        Returns:
+            Pour chaque requête, liste de tuples (document, score), du plus au moins pertinent
+        """
+        query_embeddings = as_embedding_matrix(query_embeddings, self.dimension)
+        with telemetry.span("vector_store.search_shards", queries=len(query_embeddings)):
+            # Chaque shard reçoit une copie du contexte pour rattacher ses spans à la trace en cours
+            futures = [
+                (shard_index, self._executor.submit(
+                    contextvars.copy_context().run,
+                    shard.search_batch,
+                    query_embeddings,
+                    k,
+                    nprobe=nprobe,
+                    ef_search=ef_search,
+                    query_texts=query_texts,
+                    mode=mode,
+                    rrf_k=rrf_k,
+                    filters=filters,
+                    min_score=min_score
+                ))
+                for shard_index, shard in enumerate(self.shards)
+                if len(shard) > 0
+            ]
+            
+            merged = [[] for _ in range(len(query_embeddings))]
+            for shard_index, future in futures:
+                for hits, shard_results in zip(merged, future.result()):
+                    for doc, score in shard_results:
+                        hits.append(({**doc, "id": self._global_id(shard_index, doc["id"])}, score))
+        
+        # Distance L2 : plus petit = meilleur ; similarités, scores BM25 et RRF : plus grand = meilleur
+        descending = mode != "vector" or self.metric != "l2"
+        return [sorted(hits, key=lambda hit: hit[1], reverse=descending)[:k] for hits in merged]
+    
+    def import_store(self, store: VectorStore):
+        """
+        Répartit le contenu d'un VectorStore unique dans les shards.
+        
+        Args:
+            store: Vector store à importer (les vecteurs sont relus depuis son index)
+        """
+        for source in store.list_sources():
+            ids = list(store.documents.source_entries(source))
+            docs = store.documents.get_many(ids)
+            vectors = store.index.reconstruct_batch(np.array(ids, dtype='int64'))
+            self.add_documents(
+                [{"text": docs[chunk_id]["text"], "metadata": docs[chunk_id]["metadata"]} for chunk_id in ids],
+                vectors,
+                source=source
+            )
+    
+    def save(self, directory: str, name: str = "vector_store"):
+        """
+        Sauvegarde les shards modifiés.
+        
+        Chaque shard est enregistré dans ses propres fichiers
+        (`{name}.shard{i}.*`) ; un manifeste `{name}.shards.json` indique le
+        nombre de shards.
+        
+        Args:
+            directory: Répertoire où sauvegarder les fichiers
+            name: Nom de base pour les fichiers
+        """
+        os.makedirs(directory, exist_ok=True)
+        location = (os.path.abspath(directory), name)
+        with self._write_lock:
+            to_save = self._dirty if location == self._location else set(range(self.n_shards))
+            
+            for shard_index in sorted(to_save):
+                self.shards[shard_index].save(directory, f"{name}.shard{shard_index}")
+            
+            atomic_write_json(os.path.join(directory, f"{name}.shards.json"), {"n_shards": self.n_shards})
+            
+            self._dirty = set()
+            self._location = location
+    
+    def load(self, directory: str, name: str = "vector_store") -> bool:
+        """
+        Charge les shards d'une collection.
+        
+        Le nombre de shards est lu dans le manifeste. Sans manifeste, un
+        vector store unique de même nom (ancien format) est réparti dans les
+        shards de l'instance ; il sera écrit au format shardé à la prochaine
+        sauvegarde.
+        
+        Args:
+            directory: Répertoire contenant les fichiers
+            name: Nom de base des fichiers
+        
+        Returns:
+            True si le chargement a réussi, False sinon
+        
+        Raises:
+            RuntimeError: Si un shard sauvegardé ne peut pas être chargé (il
+                serait sinon remplacé par un shard vide à la prochaine sauvegarde)
+        """
+        manifest_path = os.path.join(directory, f"{name}.shards.json")
+        if not os.path.exists(manifest_path):
+            legacy = VectorStore(**self.store_kwargs)
+            if not legacy.load(directory, name):
+                legacy.close()
+                return False
+            self.import_store(legacy)
+            legacy.close()
+            return True
+        
+        with open(manifest_path, encoding="utf-8") as f:
+            n_shards = json.load(f)["n_shards"]
+        
+        shards = [VectorStore(**self.store_kwargs) for _ in range(n_shards)]
+        for shard_index, shard in enumerate(shards):
+            shard_name = f"{name}.shard{shard_index}"
+            if shard.load(directory, shard_name):
+                continue
+            # Un shard jamais sauvegardé (resté vide) n'a pas de fichiers
+            if any(os.path.exists(os.path.join(directory, f"{shard_name}.{extension}")) for extension in _SAVED_STORE_FILES):
+                for shard in shards:
+                    shard.close()
+                raise RuntimeError(f"Fichiers du shard {shard_name} incomplets dans {directory}")
+        
+        with self._write_lock:
+            previous, self.shards = self.shards, shards
+            self.n_shards = n_shards
+            # Les shards reconstruits au chargement (changement de métrique...) sont à réécrire
+            self._dirty = {shard_index for shard_index, shard in enumerate(shards) if shard.needs_checkpoint}
+            self._location = (os.path.abspath(directory), name)
+        
+        # La fermeture attend la fin des recherches en cours sur les anciens shards
+        for shard in previous:
+            shard.close()
+        return True
+    
+    def close(self):
+        """Ferme les shards et le pool de recherche."""
+        for shard in self.shards:
+            shard.close()
+        self._executor.shutdown(wait=False)
+
+class CollectionManager:
+    """Gestion de collections nommées, chacune stockée dans son propre répertoire."""
+    
+    def __init__(self, data_dir: str = "data", n_shards: int = 4, **store_kwargs):
+        """
+        Initialise le gestionnaire de collections.
+        
+        Args:
+            data_dir: Répertoire des données ; les collections sont dans `data_dir/collections/<nom>`
+            n_shards: Nombre de shards des nouvelles collections
+            **store_kwargs: Paramètres transmis à chaque VectorStore
+        """
+        self.data_dir = data_dir
+        self.root = os.path.join(data_dir, "collections")
+        self.n_shards = n_shards
+        self.store_kwargs = store_kwargs
+        self._collections = {}
+        
+        # Une collection peut être demandée en même temps par le préchargement et l'interface
+        self._lock = threading.RLock()
+    
+    def directory(self, name: str) -> str:
+        """
+        Retourne le répertoire d'une collection.
+        
+        Args:
+            name: Nom de la collection (lettres, chiffres, "_" et "-")
+        
+        Returns:
+            Chemin du répertoire de la collection
+        """
+        if not _COLLECTION_NAME_RE.fullmatch(name):
+            raise ValueError(f"Nom de collection invalide: {name}")
+        return os.path.join(self.root, name)
+    
+    def get(self, name: str = DEFAULT_COLLECTION) -> ShardedVectorStore:
+        """
+        Retourne une collection, en la chargeant depuis le disque au premier accès.
+        
+        La collection par défaut reprend l'ancien vector store unique
+        (`data_dir/vector_store.*`) s'il existe. Les shards reconstruits au
+        chargement (index sauvegardé avec une autre métrique) sont réécrits
+        aussitôt, pour ne pas les reconstruire à chaque démarrage.
+        
+        Args:
+            name: Nom de la collection
+        
+        Returns:
+            Collection (vide si elle n'existe pas encore)
+        
+        Raises:
+            RuntimeError: Si un shard sauvegardé ne peut pas être chargé
+        """
+        with self._lock:
+            if name in self._collections:
+                return self._collections[name]
+            
+            store = ShardedVectorStore(n_shards=self.n_shards, **self.store_kwargs)
+            try:
+                if store.load(self.directory(name)):
+                    if store.needs_checkpoint:
+                        store.save(self.directory(name))
+                elif name == DEFAULT_COLLECTION:
+                    if store.load(self.data_dir, _LEGACY_STORE_NAME):
+                        store.save(self.directory(name))
+            except Exception:
+                store.close()
+                raise
+            self._collections[name] = store
+            return store
+    
+    def save(self, name: str = DEFAULT_COLLECTION):
+        """
+        Sauvegarde une collection ouverte.
+        
+        Args:
+            name: Nom de la collection
+        """
+        self.get(name).save(self.directory(name))
+    
+    def list_collections(self) -> List[str]:
+        """
+        Liste les collections sauvegardées ou ouvertes.
+        
+        Returns:
+            Noms des collections, par ordre alphabétique
+        """
+        with self._lock:
+            names = set(self._collections)
+        if os.path.isdir(self.root):
+            names.update(entry for entry in os.listdir(self.root) if os.path.isdir(os.path.join(self.root, entry)))
+        return sorted(names)
+    
+    def drop(self, name: str):
+        """
+        Supprime une collection et ses fichiers.
+        
+        Pour la collection par défaut, les fichiers de l'ancien vector store
+        unique sont aussi supprimés afin qu'ils ne soient pas réimportés.
+        
+        Args:
+            name: Nom de la collection
+        """
+        with self._lock:
+            store = self._collections.pop(name, None)
+        if store is not None:
+            store.close()
+        shutil.rmtree(self.directory(name), ignore_errors=True)
+        
+        if name == DEFAULT_COLLECTION and os.path.isdir(self.data_dir):
+            for file_name in os.listdir(self.data_dir):
+                if _LEGACY_FILE_RE.fullmatch(file_name):
+                    os.remove(os.path.join(self.data_dir, file_name))
+    
+    def close(self):
+        """Ferme toutes les collections ouvertes."""
+        with self._lock:
+            for store in self._collections.values():
+                store.close()
+            self._collections.clear()
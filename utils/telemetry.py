@@ -0,0 +1,370 @@
+"""
+Module pour mesurer la durée des étapes du pipeline RAG et compter les volumes traités.
+
+Les étapes sont mesurées par des spans (`telemetry.span("embeddings.encode")`),
+agrégés en histogrammes de durées et exportables au format texte Prometheus
+ou en lignes JSON. Désactivée, la télémétrie se réduit à un test par span.
+"""
+import os
+import json
+import time
+import threading
+import contextvars
+from typing import Any, Dict, List, Optional, Tuple
+
+# Bornes des histogrammes de durées, en secondes
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Trace de la requête en cours (liste des spans terminés), propre à chaque thread et tâche asyncio
+_current_trace = contextvars.ContextVar("rag_trace", default=None)
+# Profondeur d'imbrication du span courant, pour l'affichage de la trace
+_current_depth = contextvars.ContextVar("rag_span_depth", default=0)
+
+class _NoopSpan:
+    """Span vide retourné lorsque la télémétrie est désactivée."""
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        return False
+    
+    def set(self, **attributes):
+        """Ignore les attributs."""
+
+_NOOP_SPAN = _NoopSpan()
+
+class Span:
+    """Mesure la durée d'une étape et l'enregistre à sa sortie."""
+    
+    def __init__(self, telemetry: "Telemetry", name: str, trace: Optional["Trace"], attributes: Dict[str, Any]):
+        """
+        Args:
+            telemetry: Télémétrie qui agrège la durée
+            name: Nom de l'étape
+            trace: Trace de la requête en cours (None hors trace)
+            attributes: Attributs de l'étape (tailles de lot, nombre de résultats...)
+        """
+        self.telemetry = telemetry
+        self.name = name
+        self.trace = trace
+        self.attributes = attributes
+        self._start = None
+        self._depth = 0
+        self._token = None
+    
+    def __enter__(self):
+        if self.trace is not None:
+            self._depth = _current_depth.get()
+            self._token = _current_depth.set(self._depth + 1)
+        self._start = time.perf_counter()
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self._start
+        if exc_type is not None:
+            self.attributes["error"] = exc_type.__name__
+        if self.trace is not None:
+            _current_depth.reset(self._token)
+            self.trace.add(self.name, self._start, seconds, self._depth, self.attributes)
+        if self.telemetry.enabled:
+            self.telemetry.observe(self.name, seconds)
+        return False
+    
+    def set(self, **attributes):
+        """Ajoute des attributs connus seulement pendant l'étape."""
+        self.attributes.update(attributes)
+
+class Trace:
+    """Spans d'une requête, dans leur ordre de fin."""
+    
+    def __init__(self, name: str):
+        """
+        Args:
+            name: Nom de la requête tracée
+        """
+        self.name = name
+        self.started = time.perf_counter()
+        self.timestamp = time.time()
+        self.spans = []
+        self.counters = {}
+        self._lock = threading.Lock()
+    
+    def add(self, name: str, start: float, seconds: float, depth: int, attributes: Dict[str, Any]):
+        """Enregistre un span terminé."""
+        with self._lock:
+            self.spans.append({
+                "name": name,
+                "start_ms": round((start - self.started) * 1000.0, 3),
+                "duration_ms": round(seconds * 1000.0, 3),
+                "depth": depth,
+                "attributes": attributes
+            })
+    
+    def count(self, name: str, value: float):
+        """Incrémente un compteur propre à la requête."""
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Décrit la trace.
+        
+        Returns:
+            Dictionnaire avec le nom, l'horodatage, la durée totale, les spans triés par début et les compteurs
+        """
+        with self._lock:
+            spans = sorted(self.spans, key=lambda span: span["start_ms"])
+            counters = dict(self.counters)
+        return {
+            "name": self.name,
+            "timestamp": self.timestamp,
+            "duration_ms": round((time.perf_counter() - self.started) * 1000.0, 3),
+            "spans": spans,
+            "counters": counters
+        }
+
+class _SharedTrace:
+    """Trace d'une étape commune à plusieurs requêtes : ses spans et compteurs sont ajoutés à chacune de leurs traces."""
+    
+    def __init__(self, traces: List[Trace]):
+        """
+        Args:
+            traces: Traces des requêtes concernées
+        """
+        self.traces = traces
+    
+    def add(self, name: str, start: float, seconds: float, depth: int, attributes: Dict[str, Any]):
+        """Enregistre un span terminé dans chaque trace."""
+        for trace in self.traces:
+            trace.add(name, start, seconds, depth, dict(attributes))
+    
+    def count(self, name: str, value: float):
+        """Incrémente un compteur dans chaque trace."""
+        for trace in self.traces:
+            trace.count(name, value)
+
+class _TraceContext:
+    """Active une trace pour la durée d'un bloc `with`."""
+    
+    def __init__(self, telemetry: "Telemetry", trace, export: bool = True):
+        self.telemetry = telemetry
+        self.trace = trace
+        self.export = export
+        self._token = None
+    
+    def __enter__(self):
+        self._token = _current_trace.set(self.trace)
+        return self.trace
+    
+    def __exit__(self, *exc_info):
+        _current_trace.reset(self._token)
+        if self.export and self.telemetry.jsonl_path:
+            self.telemetry.write_jsonl(self.trace.to_dict())
+        return False
+
+class Telemetry:
+    """Compteurs et histogrammes de durées du processus, exportables."""
+    
+    def __init__(
+        self,
+        enabled: bool = False,
+        jsonl_path: Optional[str] = None,
+        namespace: str = "rag",
+        buckets: Tuple[float, ...] = DEFAULT_BUCKETS
+    ):
+        """
+        Initialise la télémétrie.
+        
+        Args:
+            enabled: Agréger les durées et les compteurs (sinon seules les traces actives sont remplies)
+            jsonl_path: Fichier où ajouter chaque trace terminée, en une ligne JSON (désactivé si None)
+            namespace: Préfixe des métriques Prometheus
+            buckets: Bornes des histogrammes de durées, en secondes
+        """
+        self.enabled = enabled
+        self.jsonl_path = jsonl_path
+        self.namespace = namespace
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._histograms = {}
+    
+    def span(self, name: str, **attributes):
+        """
+        Mesure une étape : `with telemetry.span("vector_store.search", queries=8):`.
+        
+        Args:
+            name: Nom de l'étape ("composant.opération")
+            **attributes: Attributs enregistrés dans la trace en cours
+        
+        Returns:
+            Gestionnaire de contexte (sans effet si la télémétrie est désactivée hors trace)
+        """
+        trace = _current_trace.get()
+        if not self.enabled and trace is None:
+            return _NOOP_SPAN
+        return Span(self, name, trace, attributes)
+    
+    def trace(self, name: str = "query"):
+        """
+        Collecte les spans d'une requête, même si la télémétrie est désactivée.
+        
+        Les spans exécutés dans d'autres threads ne sont rattachés à la trace
+        que si le thread reçoit une copie du contexte (`contextvars.copy_context`).
+        
+        Args:
+            name: Nom de la requête tracée
+        
+        Returns:
+            Gestionnaire de contexte produisant la `Trace`
+        """
+        return _TraceContext(self, Trace(name))
+    
+    def current_trace(self) -> Optional[Trace]:
+        """Retourne la trace de la requête en cours, ou None hors trace."""
+        return _current_trace.get()
+    
+    def shared_trace(self, traces: List[Optional[Trace]]):
+        """
+        Rattache les spans d'un bloc aux traces de plusieurs requêtes (étape exécutée en lot).
+        
+        Args:
+            traces: Traces des requêtes du lot (None pour une requête non tracée)
+        
+        Returns:
+            Gestionnaire de contexte
+        """
+        traces = list({id(trace): trace for trace in traces if trace is not None}.values())
+        return _TraceContext(self, _SharedTrace(traces) if traces else None, export=False)
+    
+    def count(self, name: str, value: float = 1, **labels):
+        """
+        Incrémente un compteur (et celui de la trace en cours, sans étiquettes).
+        
+        Args:
+            name: Nom du compteur (par exemple "embedding_cache_hits")
+            value: Incrément
+            **labels: Étiquettes du compteur
+        """
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.count(name, value)
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+    
+    def observe(self, name: str, seconds: float):
+        """
+        Ajoute une durée à l'histogramme d'une étape.
+        
+        Args:
+            name: Nom de l'étape
+            seconds: Durée en secondes
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for position, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    histogram["buckets"][position] += 1
+            histogram["sum"] += seconds
+            histogram["count"] += 1
+    
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Retourne l'état des compteurs et des histogrammes.
+        
+        Returns:
+            Dictionnaire {"counters": [...], "stages": {étape: {count, total_ms, mean_ms}}}
+        """
+        with self._lock:
+            counters = [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(self._counters.items())
+            ]
+            stages = {
+                name: {
+                    "count": histogram["count"],
+                    "total_ms": round(histogram["sum"] * 1000.0, 3),
+                    "mean_ms": round(histogram["sum"] * 1000.0 / histogram["count"], 3)
+                }
+                for name, histogram in sorted(self._histograms.items())
+            }
+        return {"counters": counters, "stages": stages}
+    
+    @staticmethod
+    def _format_labels(labels: Dict[str, Any]) -> str:
+        """Formate des étiquettes Prometheus ({clé="valeur",...})."""
+        if not labels:
+            return ""
+        pairs = []
+        for key, value in labels.items():
+            value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+            pairs.append(f'{key}="{value}"')
+        return "{" + ",".join(pairs) + "}"
+    
+    def to_prometheus(self) -> str:
+        """
+        Exporte les métriques au format texte de Prometheus.
+        
+        Returns:
+            Compteurs `<namespace>_<nom>_total` et histogramme `<namespace>_stage_seconds`
+        """
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = [
+                (name, {**histogram, "buckets": list(histogram["buckets"])})
+                for name, histogram in sorted(self._histograms.items())
+            ]
+        
+        lines = []
+        declared = set()
+        for (name, labels), value in counters:
+            metric = f"{self.namespace}_{name}_total"
+            if metric not in declared:
+                lines.append(f"# TYPE {metric} counter")
+                declared.add(metric)
+            lines.append(f"{metric}{self._format_labels(dict(labels))} {value}")
+        
+        metric = f"{self.namespace}_stage_seconds"
+        if histograms:
+            lines.append(f"# HELP {metric} Durée des étapes du pipeline RAG")
+            lines.append(f"# TYPE {metric} histogram")
+        for name, histogram in histograms:
+            for bound, cumulative in zip(self.buckets, histogram["buckets"]):
+                lines.append(f"{metric}_bucket{self._format_labels({'stage': name, 'le': bound})} {cumulative}")
+            lines.append(f"{metric}_bucket{self._format_labels({'stage': name, 'le': '+Inf'})} {histogram['count']}")
+            lines.append(f"{metric}_sum{self._format_labels({'stage': name})} {histogram['sum']:.6f}")
+            lines.append(f"{metric}_count{self._format_labels({'stage': name})} {histogram['count']}")
+        return "\n".join(lines) + "\n"
+    
+    def write_jsonl(self, record: Dict[str, Any], path: Optional[str] = None):
+        """
+        Ajoute un enregistrement en une ligne JSON.
+        
+        Args:
+            record: Enregistrement (trace ou instantané des métriques)
+            path: Fichier de destination (défaut: `jsonl_path`)
+        """
+        line = json.dumps(record, ensure_ascii=False, default=str) + "\n"
+        with self._lock:
+            with open(path or self.jsonl_path, "a", encoding="utf-8") as f:
+                f.write(line)
+    
+    def reset(self):
+        """Remet les compteurs et les histogrammes à zéro."""
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+# Télémétrie du processus, activée par RAG_TELEMETRY=1 ; RAG_TELEMETRY_JSONL ajoute chaque trace à un fichier
+telemetry = Telemetry(
+    enabled=os.environ.get("RAG_TELEMETRY", "0") == "1",
+    jsonl_path=os.environ.get("RAG_TELEMETRY_JSONL") or None
+)
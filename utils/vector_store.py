@@ -2,96 +2,1385 @@
 Module pour gérer le stockage vectoriel avec FAISS.
 """
 import os
+import json
 import pickle
-from typing import List, Dict, Any, Optional
+import hashlib
+import logging
+import threading
+import contextlib
+from collections import defaultdict, OrderedDict, Counter
+from typing import List, Dict, Any, Optional, Tuple, Union
 import numpy as np
 import faiss
 
+from .document_store import DocumentStore
+from .lexical_index import LexicalIndex
+from .telemetry import telemetry
+from .write_ahead_log import WriteAheadLog, OP_ADD, OP_REMOVE, atomic_write, atomic_write_json
+
+# Types d'index supportés
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+
+# Encodages des vecteurs dans l'index : pleine précision, demi-précision,
+# quantification scalaire 8 bits ou quantification par produit
+ENCODINGS = ("float32", "fp16", "sq8", "pq")
+
+# Modes de recherche : dense (FAISS), lexical (BM25) ou fusion des deux classements
+SEARCH_MODES = ("vector", "lexical", "hybrid")
+
+# Métriques de l'index : distance L2, produit scalaire, ou cosinus (produit scalaire de vecteurs normalisés)
+METRICS = ("l2", "inner_product", "cosine")
+
+# Nombre de sélections filtrées gardées en cache
+_FILTER_CACHE_SIZE = 32
+
+logger = logging.getLogger(__name__)
+
+def _hash_text(text: str) -> str:
+    """Calcule l'empreinte SHA-256 du texte d'un chunk."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def as_embedding_matrix(embeddings: Union[np.ndarray, List[List[float]]], dimension: int) -> np.ndarray:
+    """
+    Convertit des embeddings en matrice float32 contiguë, telle qu'attendue par FAISS.
+    
+    Une matrice déjà au bon format est retournée sans copie ; les listes
+    Python restent acceptées pour compatibilité.
+    
+    Args:
+        embeddings: Matrice ou liste d'embeddings (ou un seul embedding)
+        dimension: Dimension des vecteurs
+    
+    Returns:
+        Matrice float32 contiguë (nombre d'embeddings, dimension)
+    """
+    return np.ascontiguousarray(embeddings, dtype=np.float32).reshape(-1, dimension)
+
+class _SharedLock:
+    """Verrou partagé entre lecteurs et exclusif pour un écrivain, prioritaire sur les nouveaux lecteurs."""
+    
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._readers = 0
+        self._writers_waiting = 0
+        self._writing = False
+    
+    @contextlib.contextmanager
+    def shared(self):
+        """Accès en lecture, concurrent avec les autres lecteurs (non réentrant)."""
+        with self._condition:
+            self._condition.wait_for(lambda: not self._writing and not self._writers_waiting)
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._readers -= 1
+                if not self._readers:
+                    self._condition.notify_all()
+    
+    @contextlib.contextmanager
+    def exclusive(self):
+        """Accès en écriture, une fois terminées les lectures en cours."""
+        with self._condition:
+            self._writers_waiting += 1
+            self._condition.wait_for(lambda: not self._writing and not self._readers)
+            self._writers_waiting -= 1
+            self._writing = True
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._writing = False
+                self._condition.notify_all()
+
+class _Snapshot:
+    """Version publiée du stockage, lue sans verrou par les recherches."""
+    
+    def __init__(
+        self,
+        epoch: int,
+        index,
+        documents: DocumentStore,
+        lexical: LexicalIndex,
+        watermark: int,
+        hidden: frozenset
+    ):
+        """
+        Args:
+            epoch: Numéro de la version (croissant)
+            index: Index FAISS de la version ; il peut recevoir en place les vecteurs
+                des écritures suivantes (identifiants au-delà du watermark), jamais
+                d'autre modification
+            documents: Stockage des documents
+            lexical: Index lexical BM25
+            watermark: Borne exclusive des identifiants indexés dans cette version
+            hidden: Identifiants retirés de l'index dont les documents ne sont pas encore effacés
+        """
+        self.epoch = epoch
+        self.index = index
+        self.ntotal = index.ntotal  # Vecteurs de cette version, sans ceux ajoutés en place depuis
+        self.documents = documents
+        self.lexical = lexical
+        self.watermark = watermark
+        self.hidden = hidden
+        self.filter_cache = OrderedDict()  # Filtre sérialisé -> sélection précalculée
+        self.filter_cache_lock = threading.Lock()
+    
+    def __contains__(self, chunk_id: int) -> bool:
+        """Indique si un chunk présent dans la base des documents est indexé dans cette version."""
+        return chunk_id < self.watermark and chunk_id not in self.hidden
+    
+    def visible(self, ids: np.ndarray) -> np.ndarray:
+        """Restreint des identifiants de chunks à ceux indexés dans cette version."""
+        ids = ids[ids < self.watermark]
+        if self.hidden:
+            ids = ids[~np.isin(ids, np.fromiter(self.hidden, dtype='int64', count=len(self.hidden)))]
+        return ids
+
 class VectorStore:
     """Classe pour gérer le stockage et la recherche vectorielle avec FAISS."""
     
-    def __init__(self, dimension: int = 384):
+    def __init__(
+        self,
+        dimension: int = 384,
+        index_type: str = "flat",
+        nlist: int = 1024,
+        pq_m: int = 48,
+        pq_nbits: int = 8,
+        hnsw_m: int = 32,
+        train_size: int = 50000,
+        promotion_threshold: int = 100000,
+        nprobe: int = 16,
+        ef_search: int = 64,
+        filter_exact_threshold: int = 4096,
+        encoding: str = "float32",
+        rerank: bool = False,
+        rerank_factor: int = 4,
+        compaction_ratio: float = 0.25,
+        background_compaction: bool = True,
+        metric: str = "l2"
+    ):
         """
         Initialise le stockage vectoriel.
         
+        L'index démarre toujours en recherche exacte (IndexFlat). Si un type
+        d'index approximatif ou un encodage compressé est demandé, l'index est
+        promu automatiquement dès que le nombre de vecteurs atteint
+        `promotion_threshold`.
+        
+        Avec un encodage compressé, `rerank` conserve les vecteurs pleine
+        précision sur disque (base SQLite des documents) : la recherche
+        récupère `k * rerank_factor` candidats dans l'index compressé puis
+        les reclasse par distance exacte.
+        
+        Avec la métrique "cosine", les vecteurs et les requêtes sont normalisés
+        et comparés par produit scalaire : le score d'un résultat est sa
+        similarité cosinus (entre -1 et 1, plus grand = meilleur), qui permet
+        d'écarter les résultats trop peu similaires (`min_score`).
+        
+        Chaque chunk reçoit un identifiant stable, et un manifeste par source
+        conserve l'empreinte de chaque chunk afin de permettre les mises à
+        jour incrémentales (`upsert_source`) et les suppressions (`delete_source`).
+        Le texte et les métadonnées des chunks sont conservés dans un
+        `DocumentStore` SQLite, en mémoire jusqu'à la première sauvegarde,
+        et un index lexical BM25 est tenu à jour à côté de l'index FAISS.
+        
+        Une fois sauvegardé, l'index FAISS n'est plus réécrit à chaque
+        sauvegarde : les vecteurs ajoutés et supprimés sont ajoutés à un
+        journal (`{name}.wal`), et l'index n'est compacté (réécrit) que
+        lorsque le journal dépasse `compaction_ratio` fois sa taille.
+        
+        Le stockage peut être partagé entre threads. Les recherches lisent la
+        version publiée sans verrou et ne sont jamais bloquées par une
+        ingestion. Les modifications sont sérialisées et publiées d'un seul
+        coup avec les documents ajoutés à la fin de l'écriture. Les ajouts à
+        un index exact ou IVF sont faits en place, sous un verrou exclusif
+        bref, et les recherches ignorent les identifiants postérieurs à leur
+        version ; les suppressions, les promotions et les ajouts aux autres
+        index travaillent sur une copie de l'index FAISS. Les documents
+        supprimés ne sont effacés qu'une fois terminées les recherches qui
+        pouvaient encore les retourner.
+        
         Args:
             dimension: Dimension des vecteurs d'embedding
+            index_type: Type d'index cible ("flat", "ivf_flat", "ivf_pq" ou "hnsw")
+            nlist: Nombre de listes inversées pour les index IVF
+            pq_m: Nombre de sous-quantificateurs pour IVF-PQ (doit diviser la dimension)
+            pq_nbits: Nombre de bits par sous-quantificateur pour IVF-PQ
+            hnsw_m: Nombre de voisins par nœud du graphe HNSW
+            train_size: Nombre de premiers vecteurs utilisés pour l'entraînement
+            promotion_threshold: Taille à partir de laquelle l'index exact est promu
+            nprobe: Nombre de listes visitées par défaut lors d'une recherche IVF
+            ef_search: Taille de la file de recherche par défaut pour HNSW
+            filter_exact_threshold: Taille maximale d'une sélection filtrée recherchée
+                exactement dans un sous-index dédié plutôt que via un IDSelector
+            encoding: Encodage des vecteurs ("float32", "fp16", "sq8" ou "pq") ;
+                "ivf_pq" implique "pq"
+            rerank: Conserver les vecteurs pleine précision et reclasser les candidats
+            rerank_factor: Nombre de candidats récupérés par résultat avant reclassement
+            compaction_ratio: Taille du journal, relative à celle de l'index sauvegardé,
+                au-delà de laquelle l'index est compacté
+            background_compaction: Écrire l'index compacté dans un thread d'arrière-plan
+            metric: Métrique de comparaison des vecteurs ("l2", "inner_product" ou "cosine")
         """
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"Type d'index non pris en charge: {index_type}")
+        if metric not in METRICS:
+            raise ValueError(f"Métrique non prise en charge: {metric}")
+        if encoding not in ENCODINGS:
+            raise ValueError(f"Encodage non pris en charge: {encoding}")
+        if index_type == "ivf_pq" and encoding not in ("float32", "pq"):
+            raise ValueError(f"Le type d'index 'ivf_pq' est incompatible avec l'encodage '{encoding}'")
+        if index_type == "ivf_pq":
+            encoding = "pq"
+        if encoding == "pq" and dimension % pq_m != 0:
+            raise ValueError(f"pq_m ({pq_m}) doit diviser la dimension ({dimension})")
+        
         self.dimension = dimension
-        self.index = faiss.IndexFlatL2(self.dimension)
-        self.documents = []  # Stocke les documents originaux
+        self.index_type = index_type
+        self.nlist = nlist
+        self.pq_m = pq_m
+        self.pq_nbits = pq_nbits
+        self.hnsw_m = hnsw_m
+        self.train_size = train_size
+        self.promotion_threshold = promotion_threshold
+        self.nprobe = nprobe
+        self.ef_search = ef_search
+        self.filter_exact_threshold = filter_exact_threshold
+        self.encoding = encoding
+        self.rerank = rerank
+        self.rerank_factor = rerank_factor
+        self.compaction_ratio = compaction_ratio
+        self.background_compaction = background_compaction
+        self.metric = metric
+        
+        # Version publiée : index FAISS, documents originaux et manifeste des sources, index BM25
+        self._snapshot = _Snapshot(
+            0,
+            self._with_ids(self._flat_index()),
+            DocumentStore(),
+            LexicalIndex(),
+            0,
+            frozenset()
+        )
+        
+        # Écritures : sérialisées, publiées à la fin de la plus externe
+        self._write_lock = threading.RLock()
+        # Accès à l'index publié : partagé par les recherches, exclusif pour un ajout en place
+        self._index_lock = _SharedLock()
+        self._write_depth = 0
+        self._staged = None
+        self._removed = set()
+        
+        # Recherches en cours par version, pour savoir quand une ancienne version n'est plus lue
+        self._readers = threading.Condition()
+        self._active_readers = Counter()
+        
+        # Persistance : emplacement sauvegardé, journal, opérations pas encore journalisées
+        self._location = None
+        self._wal = None
+        self._checkpoint = None  # {"index": fichier de l'index compacté, "sequence": séquence incluse}
+        self._checkpoint_bytes = 0
+        self._sequence = 0  # Dernière séquence validée
+        self._stale_wal = None  # (point de reprise, séquence validée) : séquences du journal à écarter avant d'y écrire
+        self._pending = []
+        self._checkpoint_needed = False
+        self._compaction = None
+        self._compacting_index = None  # Index en cours d'écriture par la compaction d'arrière-plan
+        self._compaction_error = None
+    
+    def __len__(self) -> int:
+        """Retourne le nombre de chunks indexés."""
+        return self._snapshot.ntotal
+    
+    @property
+    def index(self):
+        """Index FAISS publié (à ne pas modifier ; peut contenir les ajouts d'une écriture en cours)."""
+        return self._snapshot.index
+    
+    @property
+    def documents(self) -> DocumentStore:
+        """Documents originaux et manifeste des sources."""
+        return self._snapshot.documents
+    
+    @property
+    def lexical(self) -> LexicalIndex:
+        """Index inversé BM25 sur le texte des chunks."""
+        return self._snapshot.lexical
+    
+    @contextlib.contextmanager
+    def _reading(self):
+        """Fournit la version publiée, gardée valide jusqu'à la fin du bloc."""
+        with self._readers:
+            snapshot = self._snapshot
+            self._active_readers[snapshot.epoch] += 1
+        try:
+            yield snapshot
+        finally:
+            with self._readers:
+                self._active_readers[snapshot.epoch] -= 1
+                if not self._active_readers[snapshot.epoch]:
+                    del self._active_readers[snapshot.epoch]
+                    self._readers.notify_all()
+    
+    @contextlib.contextmanager
+    def _writing(self):
+        """
+        Sérialise une modification et publie son résultat en une seule fois.
+        
+        Les écritures imbriquées (`upsert_source` appelle `add_documents`)
+        sont publiées à la fin de l'écriture la plus externe.
+        """
+        with self._write_lock:
+            self._write_depth += 1
+            try:
+                yield
+            finally:
+                self._write_depth -= 1
+                if self._write_depth == 0:
+                    self._publish_writes()
+    
+    def batch(self):
+        """
+        Regroupe plusieurs modifications en une seule publication.
+        
+        Les recherches concurrentes voient l'état antérieur jusqu'à la fin du
+        bloc. Une écriture qui supprime des chunks (ou ajoute à un index HNSW
+        ou compressé sans listes inversées) copie l'index FAISS : mettre à
+        jour de nombreuses sources dans un bloc `with store.batch():` ne le
+        copie qu'une fois.
+        
+        Returns:
+            Gestionnaire de contexte
+        """
+        return self._writing()
+    
+    def _working_index(self, copy: bool = False, append: bool = False):
+        """
+        Retourne l'index sur lequel portent les modifications en cours.
+        
+        Les ajouts à un index exact ou IVF portent sur l'index publié (voir
+        `_appendable`) ; toute autre modification porte sur une copie, faite
+        à la première modification de l'écriture.
+        
+        Args:
+            copy: Copier l'index publié si ce n'est pas déjà fait (avant de le modifier)
+            append: Retourner l'index qui recevra des vecteurs, publié si possible
+        
+        Returns:
+            Index FAISS
+        """
+        published = self._snapshot.index
+        if self._staged is None:
+            if append and self._appendable(published):
+                self._staged = published
+            elif copy or append:
+                self._staged = faiss.clone_index(published)
+            else:
+                return published
+        elif self._staged is published and (copy or not self._appendable(published)):
+            self._staged = faiss.clone_index(published)
+        return self._staged
+    
+    def _appendable(self, index) -> bool:
+        """
+        Indique si des vecteurs peuvent être ajoutés en place à un index publié.
+        
+        Un index exact ou IVF range les vecteurs ajoutés après les autres, que
+        les recherches des versions antérieures écartent par identifiant.
+        L'index en cours d'écriture par une compaction d'arrière-plan reste
+        figé.
+        
+        Args:
+            index: Index FAISS publié
+        
+        Returns:
+            True si l'index peut recevoir des vecteurs en place
+        """
+        if index is self._compacting_index and self._compaction is not None and self._compaction.is_alive():
+            return False
+        return isinstance(self._base_index(index), faiss.IndexFlat) or faiss.try_extract_index_ivf(index) is not None
+    
+    def _publish(self, **changes):
+        """
+        Remplace la version publiée ; les recherches en cours gardent la leur.
+        
+        Args:
+            **changes: Champs modifiés (index, documents, lexical, watermark, hidden)
+        """
+        current = self._snapshot
+        fields = {
+            "index": current.index,
+            "documents": current.documents,
+            "lexical": current.lexical,
+            "watermark": current.watermark,
+            "hidden": current.hidden
+        }
+        fields.update(changes)
+        snapshot = _Snapshot(current.epoch + 1, **fields)
+        with self._readers:
+            self._snapshot = snapshot
+    
+    def _publish_writes(self):
+        """Publie l'index modifié et les documents ajoutés, puis efface les documents supprimés."""
+        index = self._working_index()
+        removed = sorted(self._removed)
+        self._staged = None
+        self._removed = set()
+        self._publish(index=index, watermark=self.documents.next_id, hidden=frozenset(removed))
+        
+        if removed:
+            # Les recherches commencées sur l'ancienne version peuvent encore retourner ces chunks
+            self._synchronize()
+            self.documents.delete_many(removed)
+            self.lexical.delete_many(removed)
+            self._publish(hidden=frozenset())
+    
+    def _synchronize(self, everyone: bool = False):
+        """
+        Attend la fin des recherches commencées sur une version antérieure à la version publiée.
+        
+        Args:
+            everyone: Attendre aussi les recherches sur la version publiée
+        """
+        epoch = self._snapshot.epoch + (1 if everyone else 0)
+        with self._readers:
+            self._readers.wait_for(lambda: all(active >= epoch for active in self._active_readers))
+    
+    @property
+    def needs_checkpoint(self) -> bool:
+        """Indique si l'index sauvegardé doit être réécrit en entier (après une promotion ou un changement de métrique)."""
+        return self._checkpoint_needed
+    
+    @property
+    def higher_is_better(self) -> bool:
+        """Indique si les scores de la recherche dense sont des similarités (plus grand = meilleur) plutôt que des distances."""
+        return self.metric != "l2"
     
-    def add_documents(self, documents: List[Dict[str, Any]], embeddings: List[List[float]]):
+    @property
+    def _faiss_metric(self) -> int:
+        """Métrique FAISS correspondant à celle de l'instance."""
+        return faiss.METRIC_L2 if self.metric == "l2" else faiss.METRIC_INNER_PRODUCT
+    
+    def _flat_index(self):
+        """Crée un index exact vide pour la métrique de l'instance."""
+        return faiss.IndexFlat(self.dimension, self._faiss_metric)
+    
+    def _prepare_vectors(self, vectors: np.ndarray) -> np.ndarray:
+        """
+        Prépare des vecteurs pour la métrique de l'instance.
+        
+        Args:
+            vectors: Matrice float32 contiguë
+        
+        Returns:
+            Copie normalisée des vecteurs pour la métrique "cosine", les vecteurs inchangés sinon
+        """
+        if self.metric != "cosine":
+            return vectors
+        vectors = vectors.copy()
+        faiss.normalize_L2(vectors)
+        return vectors
+    
+    @staticmethod
+    def _with_ids(index):
+        """
+        Prépare un index FAISS pour stocker des identifiants arbitraires.
+        
+        Les index IVF gèrent nativement les identifiants ; les autres sont
+        enveloppés dans un IndexIDMap2.
+        
+        Args:
+            index: Index FAISS vide
+        
+        Returns:
+            Index acceptant `add_with_ids`, `remove_ids` et `reconstruct` par identifiant
+        """
+        ivf = faiss.try_extract_index_ivf(index)
+        if ivf is not None:
+            ivf.set_direct_map_type(faiss.DirectMap.Hashtable)
+            return index
+        return faiss.IndexIDMap2(index)
+    
+    @staticmethod
+    def _base_index(index):
+        """Retourne l'index FAISS sous-jacent, sans l'enveloppe d'identifiants."""
+        if isinstance(index, faiss.IndexIDMap2):
+            return faiss.downcast_index(index.index)
+        return index
+    
+    @classmethod
+    def _is_approximate(cls, index) -> bool:
+        """Indique si un index est approximatif (ANN) ou compressé."""
+        return not isinstance(cls._base_index(index), faiss.IndexFlat)
+    
+    @property
+    def is_approximate(self) -> bool:
+        """Indique si l'index courant est approximatif (ANN) ou compressé."""
+        return self._is_approximate(self._working_index())
+    
+    def _is_lossy(self, index) -> bool:
+        """Indique si un index stocke des vecteurs compressés (distances approchées)."""
+        return self.encoding != "float32" and self._is_approximate(index)
+    
+    def _factory_string(self, n_train: int) -> str:
+        """
+        Construit la chaîne `index_factory` correspondant au type d'index et à l'encodage cibles.
+        
+        Args:
+            n_train: Nombre de vecteurs disponibles pour l'entraînement
+        
+        Returns:
+            Description de l'index au format FAISS
+        """
+        codec = {
+            "float32": "Flat",
+            "fp16": "SQfp16",
+            "sq8": "SQ8",
+            "pq": f"PQ{self.pq_m}x{self.pq_nbits}"
+        }[self.encoding]
+        
+        if self.index_type == "hnsw":
+            return f"HNSW{self.hnsw_m},{codec}"
+        if self.index_type == "flat":
+            # IndexPQ n'accepte pas de paramètres de recherche (IDSelector) : une
+            # liste inversée unique donne le même parcours exhaustif
+            return "IVF1," + codec if self.encoding == "pq" else codec
+        
+        # FAISS recommande au moins ~39 points d'entraînement par liste
+        nlist = max(1, min(self.nlist, n_train // 39))
+        return f"IVF{nlist},{codec}"
+    
+    def _build_index(self, ids: np.ndarray, vectors: np.ndarray, approximate: bool):
+        """
+        Construit un nouvel index contenant les vecteurs fournis.
+        
+        Args:
+            ids: Identifiants des vecteurs
+            vectors: Vecteurs à indexer
+            approximate: True pour l'index approximatif configuré, False pour un index exact
+        
+        Returns:
+            Nouvel index FAISS
+        """
+        if approximate:
+            train_vectors = vectors[:self.train_size]
+            base = faiss.index_factory(self.dimension, self._factory_string(len(train_vectors)), self._faiss_metric)
+            if not base.is_trained:
+                base.train(train_vectors)
+        else:
+            base = self._flat_index()
+        
+        index = self._with_ids(base)
+        if len(ids) > 0:
+            index.add_with_ids(vectors, ids)
+        return index
+    
+    def _export_vectors(self, index, documents: DocumentStore, ids: Optional[np.ndarray] = None):
+        """
+        Extrait des vecteurs, en pleine précision s'ils sont conservés.
+        
+        Args:
+            index: Index contenant les vecteurs
+            documents: Stockage des vecteurs pleine précision
+            ids: Identifiants à extraire (tous ceux d'un index exact si None)
+        
+        Returns:
+            Tuple (identifiants, vecteurs)
+        """
+        if ids is None:
+            ids = faiss.vector_to_array(index.id_map)
+        if self.rerank:
+            stored = documents.get_vectors(ids.tolist())
+            if len(stored) == len(ids):
+                return ids, np.stack([stored[chunk_id] for chunk_id in ids.tolist()])
+        return ids, index.reconstruct_batch(ids)
+    
+    def memory_usage(self) -> Dict[str, Any]:
+        """
+        Mesure l'empreinte de l'index FAISS (sérialisé, proche de son occupation en RAM).
+        
+        Les vecteurs pleine précision conservés pour le reclassement sont sur
+        disque et ne sont pas comptés.
+        
+        Returns:
+            Dictionnaire avec le nombre de vecteurs, l'encodage, la taille de
+            l'index en octets et le nombre d'octets par vecteur
+        """
+        snapshot = self._snapshot
+        with self._index_lock.shared():
+            index_bytes = int(faiss.serialize_index(snapshot.index).nbytes)
+        ntotal = snapshot.ntotal
+        return {
+            "vectors": ntotal,
+            "encoding": self.encoding if self._is_approximate(snapshot.index) else "float32",
+            "index_bytes": index_bytes,
+            "bytes_per_vector": index_bytes / ntotal if ntotal else 0.0
+        }
+    
+    def promote(self):
+        """
+        Remplace l'index exact par l'index approximatif configuré.
+        
+        L'entraînement utilise les `train_size` premiers vecteurs, puis
+        l'ensemble des vecteurs existants est ajouté au nouvel index.
+        """
+        if self.index_type == "flat" and self.encoding == "float32":
+            return
+        
+        with self._writing():
+            index = self._working_index()
+            if self._is_approximate(index) or index.ntotal == 0:
+                return
+            
+            ids, vectors = self._export_vectors(index, self.documents)
+            self._staged = self._build_index(ids, vectors, approximate=True)
+            
+            # Le chargement rejoue le journal puis promeut à nouveau ; compacter évite de le refaire à chaque démarrage
+            self._checkpoint_needed = True
+    
+    def _search_params(self, index, nprobe: Optional[int] = None, ef_search: Optional[int] = None, selector=None):
+        """
+        Construit les paramètres de recherche propres au type d'un index.
+        
+        Args:
+            index: Index FAISS interrogé
+            nprobe: Nombre de listes IVF à visiter (défaut: valeur de l'instance)
+            ef_search: Taille de la file de recherche HNSW (défaut: valeur de l'instance)
+            selector: IDSelector FAISS restreignant les identifiants candidats
+        
+        Returns:
+            Paramètres de recherche FAISS, ou None pour un index exact sans filtre
+        """
+        if faiss.try_extract_index_ivf(index) is not None:
+            return faiss.SearchParametersIVF(nprobe=nprobe or self.nprobe, sel=selector)
+        if isinstance(self._base_index(index), faiss.IndexHNSW):
+            return faiss.SearchParametersHNSW(efSearch=ef_search or self.ef_search, sel=selector)
+        if selector is not None:
+            return faiss.SearchParameters(sel=selector)
+        return None
+    
+    def _selection(self, snapshot: _Snapshot, filters: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Retourne la sélection précalculée correspondant à des filtres.
+        
+        Une sélection contient les identifiants autorisés, un bitmap FAISS
+        (IDSelectorBitmap) pour filtrer pendant le parcours de l'index et,
+        si elle est assez petite, un sous-index exact de ses vecteurs. Les
+        sélections sont gardées en cache (LRU) avec la version qu'elles
+        décrivent.
+        
+        Args:
+            snapshot: Version lue
+            filters: Filtres sur la source et les métadonnées (voir `DocumentStore.filter_ids`)
+        
+        Returns:
+            Dictionnaire avec "ids", "id_set", "selector" et "sub_index"
+        """
+        key = json.dumps(filters, sort_keys=True, default=str)
+        with snapshot.filter_cache_lock:
+            selection = snapshot.filter_cache.get(key)
+            if selection is not None:
+                snapshot.filter_cache.move_to_end(key)
+                return selection
+        
+        ids = snapshot.visible(snapshot.documents.filter_ids(filters))
+        bitmap = np.zeros(snapshot.watermark // 8 + 1, dtype='uint8')
+        np.bitwise_or.at(bitmap, ids >> 3, (1 << (ids & 7)).astype('uint8'))
+        
+        # Les petites sélections sont cherchées exactement : un index ANN filtré
+        # (HNSW notamment) peut renvoyer moins de k résultats
+        sub_index = None
+        if 0 < len(ids) <= self.filter_exact_threshold:
+            sub_index = self._flat_index()
+            with self._index_lock.shared():
+                sub_index.add(snapshot.index.reconstruct_batch(ids))
+        
+        selection = {
+            "ids": ids,
+            "id_set": set(ids.tolist()),
+            "bitmap": bitmap,  # Doit rester en vie tant que le sélecteur est utilisé
+            "selector": faiss.IDSelectorBitmap(len(bitmap), faiss.swig_ptr(bitmap)),
+            "sub_index": sub_index
+        }
+        with snapshot.filter_cache_lock:
+            snapshot.filter_cache[key] = selection
+            while len(snapshot.filter_cache) > _FILTER_CACHE_SIZE:
+                snapshot.filter_cache.popitem(last=False)
+        return selection
+    
+    def add_documents(
+        self,
+        documents: List[Dict[str, Any]],
+        embeddings: Union[np.ndarray, List[List[float]]],
+        source: Optional[str] = None
+    ) -> List[int]:
         """
         Ajoute des documents et leurs embeddings à l'index.
         
+        Les recherches concurrentes voient tous les chunks ajoutés, avec leurs
+        documents, ou aucun.
+        
         Args:
             documents: Liste de dictionnaires contenant le texte et les métadonnées
-            embeddings: Liste des embeddings correspondants
+            embeddings: Embeddings correspondants (matrice float32 de préférence, passée à FAISS sans copie)
+            source: Source à laquelle rattacher les chunks (défaut: `metadata["source"]`)
+        
+        Returns:
+            Identifiants attribués aux chunks ajoutés
         """
         if not documents:
+            return []
+        
+        embeddings_np = self._prepare_vectors(as_embedding_matrix(embeddings, self.dimension))
+        with self._writing():
+            next_id = self.documents.next_id
+            ids = np.arange(next_id, next_id + len(documents), dtype='int64')
+            
+            # Ajouter à l'index FAISS, visible des recherches à la fin de l'écriture
+            with telemetry.span("vector_store.add", chunks=len(documents)):
+                self._add_vectors(ids, embeddings_np)
+            telemetry.count("chunks_indexed", len(documents))
+            self._log(OP_ADD, ids, embeddings_np)
+            self.documents.next_id = next_id + len(documents)
+            if self.rerank:
+                self.documents.put_vectors(ids.tolist(), embeddings_np)
+            
+            # Stocker les documents originaux avec leur source et leur empreinte
+            # (invisibles pour les recherches tant que l'index n'est pas publié)
+            self.documents.add_many(
+                (
+                    chunk_id,
+                    source if source is not None else doc["metadata"]["source"],
+                    _hash_text(doc["text"]),
+                    doc
+                )
+                for chunk_id, doc in zip(ids.tolist(), documents)
+            )
+            self.lexical.add_many((chunk_id, doc["text"]) for chunk_id, doc in zip(ids.tolist(), documents))
+            
+            # Promouvoir vers l'index approximatif si le seuil est dépassé
+            if self._working_index().ntotal >= self.promotion_threshold:
+                self.promote()
+        
+        return ids.tolist()
+    
+    def _add_vectors(self, ids: np.ndarray, vectors: np.ndarray):
+        """
+        Ajoute des vecteurs à l'index de travail (au sein d'une écriture).
+        
+        Args:
+            ids: Identifiants des vecteurs, tous au-delà du watermark publié
+            vectors: Vecteurs préparés pour la métrique
+        """
+        index = self._working_index(append=True)
+        if index is not self._snapshot.index:
+            index.add_with_ids(vectors, ids)
+            return
+        # Ajout en place : les recherches en cours ne lisent pas l'index pendant que FAISS l'agrandit
+        with self._index_lock.exclusive():
+            index.add_with_ids(vectors, ids)
+    
+    def _remove_ids(self, ids: List[int]):
+        """
+        Supprime des chunks de l'index et des documents (au sein d'une écriture).
+        
+        Args:
+            ids: Identifiants des chunks à supprimer
+        """
+        if not ids:
+            return
+        
+        ids_np = np.array(ids, dtype='int64')
+        self._staged = self._without_vectors(self._working_index(copy=True), ids_np, self.documents)
+        self._log(OP_REMOVE, ids_np)
+        
+        # Les documents sont effacés après la publication (voir `_publish_writes`)
+        self._removed.update(ids)
+    
+    def _without_vectors(self, index, ids: np.ndarray, documents: DocumentStore):
+        """
+        Retire des vecteurs d'un index non publié.
+        
+        Args:
+            index: Index à modifier
+            ids: Identifiants des vecteurs à retirer
+            documents: Stockage des vecteurs pleine précision
+        
+        Returns:
+            L'index modifié, ou un nouvel index s'il a fallu le reconstruire
+        """
+        try:
+            index.remove_ids(faiss.IDSelectorArray(ids))
+            return index
+        except RuntimeError:
+            # HNSW ne supporte pas la suppression : reconstruire sans ces vecteurs
+            all_ids = faiss.vector_to_array(index.id_map)
+            keep, vectors = self._export_vectors(index, documents, all_ids[~np.isin(all_ids, ids)])
+            return self._build_index(keep, vectors, approximate=self._is_approximate(index))
+    
+    def _log(self, op: int, ids: np.ndarray, vectors: Optional[np.ndarray] = None):
+        """
+        Retient une modification de l'index pour le journal de la prochaine sauvegarde.
+        
+        Args:
+            op: Opération (OP_ADD ou OP_REMOVE)
+            ids: Identifiants concernés
+            vectors: Vecteurs ajoutés (OP_ADD)
+        """
+        # Un index jamais sauvegardé sera écrit entièrement à sa première sauvegarde
+        if self._location is None:
             return
+        self._pending.append((op, ids.copy(), None if vectors is None else vectors.copy()))
+    
+    def upsert_source(
+        self,
+        source: str,
+        documents: List[Dict[str, Any]],
+        embeddings: Union[np.ndarray, List[List[float]]]
+    ) -> Dict[str, int]:
+        """
+        Remplace le contenu d'une source en ne modifiant que les chunks qui ont changé.
         
-        # Convertir les embeddings en format numpy
-        embeddings_np = np.array(embeddings).astype('float32')
+        Les chunks dont le texte est identique à un chunk déjà indexé pour cette
+        source conservent leur identifiant et leur vecteur ; seuls les chunks
+        nouveaux sont ajoutés et les chunks disparus supprimés.
         
-        # Ajouter à l'index FAISS
-        self.index.add(embeddings_np)
+        Args:
+            source: Identifiant de la source (nom de fichier ou URL)
+            documents: Nouvelle liste complète des chunks de la source
+            embeddings: Embeddings correspondants
+        
+        Returns:
+            Statistiques de la mise à jour (added, removed, unchanged)
+        """
+        with self._writing():
+            # Regrouper les chunks existants par empreinte (un même texte peut apparaître plusieurs fois)
+            existing = defaultdict(list)
+            for chunk_id, text_hash in self.documents.source_entries(source).items():
+                if chunk_id not in self._removed:
+                    existing[text_hash].append(chunk_id)
+            
+            new_documents = []
+            new_positions = []
+            refreshed = {}
+            for position, doc in enumerate(documents):
+                candidates = existing.get(_hash_text(doc["text"]))
+                if candidates:
+                    # Conserver le vecteur, mais rafraîchir les métadonnées (position, page...)
+                    refreshed[candidates.pop()] = doc
+                else:
+                    new_documents.append(doc)
+                    new_positions.append(position)
+            
+            # Les métadonnées (page...) ont pu changer : la nouvelle version repart de sélections filtrées vides
+            self.documents.update_many(refreshed)
+            stale_ids = [chunk_id for ids in existing.values() for chunk_id in ids]
+            self._remove_ids(stale_ids)
+            self.add_documents(new_documents, as_embedding_matrix(embeddings, self.dimension)[new_positions], source=source)
         
-        # Stocker les documents originaux
-        self.documents.extend(documents)
+        return {
+            "added": len(new_documents),
+            "removed": len(stale_ids),
+            "unchanged": len(refreshed)
+        }
     
-    def similarity_search(self, query_embedding: List[float], k: int = 4) -> List[Dict[str, Any]]:
+    def delete_source(self, source: str) -> int:
+        """
+        Supprime tous les chunks d'une source.
+        
+        Args:
+            source: Identifiant de la source à supprimer
+        
+        Returns:
+            Nombre de chunks supprimés
+        """
+        with self._writing():
+            ids = [chunk_id for chunk_id in self.documents.source_entries(source) if chunk_id not in self._removed]
+            self._remove_ids(ids)
+        return len(ids)
+    
+    def list_sources(self) -> Dict[str, int]:
+        """
+        Liste les sources indexées.
+        
+        Returns:
+            Dictionnaire source -> nombre de chunks
+        """
+        return self.documents.list_sources()
+    
+    def similarity_search(
+        self,
+        query_embedding: Union[np.ndarray, List[float]],
+        k: int = 4,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        query_text: Optional[str] = None,
+        mode: str = "vector",
+        filters: Optional[Dict[str, Any]] = None,
+        min_score: Optional[float] = None
+    ) -> List[Dict[str, Any]]:
         """
         Recherche les documents les plus similaires à la requête.
         
         Args:
             query_embedding: Embedding de la requête
             k: Nombre de résultats à retourner
+            nprobe: Nombre de listes IVF à visiter (ignoré pour les autres index)
+            ef_search: Taille de la file de recherche HNSW (ignoré pour les autres index)
+            query_text: Texte de la requête (requis pour les modes "lexical" et "hybrid")
+            mode: Mode de recherche ("vector", "lexical" ou "hybrid")
+            filters: Filtres sur la source et les métadonnées (voir `search_batch`)
+            min_score: Similarité dense minimale des résultats (voir `search_batch`)
         
         Returns:
             Liste des documents les plus pertinents
         """
-        if len(self.documents) == 0:
-            return []
+        query_texts = [query_text] if query_text is not None else None
+        results = self.search_batch(
+            as_embedding_matrix(query_embedding, self.dimension),
+            k,
+            nprobe=nprobe,
+            ef_search=ef_search,
+            query_texts=query_texts,
+            mode=mode,
+            filters=filters,
+            min_score=min_score
+        )
+        return [doc for doc, _ in results[0]]
+    
+    def _dense_search(
+        self,
+        snapshot: _Snapshot,
+        query_embeddings: np.ndarray,
+        k: int,
+        nprobe: Optional[int],
+        ef_search: Optional[int],
+        selection: Optional[Dict[str, Any]] = None,
+        min_score: Optional[float] = None
+    ) -> List[List[Tuple[int, float]]]:
+        """
+        Recherche FAISS pour un lot de requêtes.
+        
+        Args:
+            snapshot: Version lue
+            query_embeddings: Matrice float32 des embeddings des requêtes, préparés pour la métrique
+            k: Nombre de résultats par requête
+            nprobe: Nombre de listes IVF à visiter
+            ef_search: Taille de la file de recherche HNSW
+            selection: Sélection filtrée (voir `_selection`), ou None pour tout l'index
+            min_score: Similarité minimale des résultats conservés (aucune si None)
+        
+        Returns:
+            Pour chaque requête, liste de tuples (identifiant, distance L2 au carré ou similarité)
+        """
+        if selection is not None and len(selection["ids"]) == 0:
+            return [[] for _ in query_embeddings]
+        
+        # Élargir les candidats lorsqu'ils seront reclassés en pleine précision
+        rerank = self.rerank and self._is_lossy(snapshot.index)
+        fetch_k = k * self.rerank_factor if rerank else k
+        
+        if selection is not None and selection["sub_index"] is not None:
+            # Recherche exacte dans le sous-index de la sélection
+            sub_index = selection["sub_index"]
+            distances, positions = sub_index.search(query_embeddings, min(fetch_k, sub_index.ntotal))
+            indices = np.where(positions == -1, -1, selection["ids"][positions])
+        else:
+            # Effectuer la recherche, en filtrant dans FAISS le cas échéant
+            selector = selection["selector"] if selection is not None else None
+            with self._index_lock.shared():
+                if selector is None and snapshot.index.ntotal != snapshot.ntotal:
+                    # Écarter les vecteurs ajoutés en place depuis cette version
+                    selector = faiss.IDSelectorRange(0, snapshot.watermark)
+                distances, indices = snapshot.index.search(
+                    query_embeddings,
+                    min(fetch_k, snapshot.ntotal),
+                    params=self._search_params(snapshot.index, nprobe, ef_search, selector)
+                )
+        rankings = [
+            [(idx, float(distance)) for distance, idx in zip(row_distances, row_indices.tolist()) if idx != -1]
+            for row_distances, row_indices in zip(distances, indices)
+        ]
+        
+        if rerank:
+            with telemetry.span("vector_store.rerank", candidates=fetch_k):
+                rankings = self._rerank(snapshot, query_embeddings, rankings, k)
+        if min_score is not None:
+            # Écarter les résultats trop peu similaires (une requête hors sujet n'en garde aucun)
+            rankings = [[(idx, score) for idx, score in ranking if score >= min_score] for ranking in rankings]
+        return rankings
+    
+    def _lexical_search(
+        self,
+        snapshot: _Snapshot,
+        query_texts: List[str],
+        k: int,
+        allowed_ids: Optional[set] = None
+    ) -> List[List[Tuple[int, float]]]:
+        """
+        Recherche BM25 restreinte aux chunks indexés dans une version.
+        
+        Args:
+            snapshot: Version lue
+            query_texts: Textes des requêtes
+            k: Nombre de résultats par requête
+            allowed_ids: Identifiants autorisés (tous si None)
+        
+        Returns:
+            Pour chaque requête, liste de tuples (identifiant, score BM25)
+        """
+        # Les chunks d'une écriture en cours sont déjà dans la base lexicale (une sélection filtrée les exclut déjà)
+        return snapshot.lexical.search_batch(query_texts, k, allowed_ids if allowed_ids is not None else snapshot)
+    
+    def _rerank(
+        self,
+        snapshot: _Snapshot,
+        query_embeddings: np.ndarray,
+        rankings: List[List[Tuple[int, float]]],
+        k: int
+    ) -> List[List[Tuple[int, float]]]:
+        """
+        Reclasse des candidats par score exact sur les vecteurs pleine précision.
+        
+        Args:
+            snapshot: Version lue
+            query_embeddings: Embeddings des requêtes
+            rankings: Candidats de chaque requête (identifiant, distance approchée)
+            k: Nombre de résultats à conserver par requête
+        
+        Returns:
+            Pour chaque requête, liste de tuples (identifiant, distance L2 au carré ou similarité exacte)
+        """
+        stored = snapshot.documents.get_vectors(sorted({idx for ranking in rankings for idx, _ in ranking}))
+        
+        reranked = []
+        for query, ranking in zip(query_embeddings, rankings):
+            ids = [idx for idx, _ in ranking]
+            if not ids or any(idx not in stored for idx in ids):
+                # Vecteurs absents (index créé sans reclassement) : garder l'ordre approché
+                reranked.append(ranking[:k])
+                continue
+            vectors = np.stack([stored[idx] for idx in ids])
+            if self.higher_is_better:
+                scores = vectors @ query
+                order = np.argsort(-scores)[:k]
+            else:
+                scores = ((vectors - query) ** 2).sum(axis=1)
+                order = np.argsort(scores)[:k]
+            reranked.append([(ids[position], float(scores[position])) for position in order])
+        return reranked
+    
+    @staticmethod
+    def _reciprocal_rank_fusion(rankings: List[List[Tuple[int, float]]], k: int, rrf_k: int) -> List[Tuple[int, float]]:
+        """
+        Fusionne plusieurs classements par Reciprocal Rank Fusion.
+        
+        Args:
+            rankings: Classements à fusionner (tuples (identifiant, score quelconque))
+            k: Nombre de résultats à retourner
+            rrf_k: Constante d'amortissement des rangs
+        
+        Returns:
+            Liste de tuples (identifiant, score RRF), du meilleur au moins bon
+        """
+        scores = defaultdict(float)
+        for ranking in rankings:
+            for rank, (idx, _) in enumerate(ranking):
+                scores[idx] += 1.0 / (rrf_k + rank + 1)
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+    
+    def search_batch(
+        self,
+        query_embeddings: Union[np.ndarray, List[List[float]]],
+        k: int = 4,
+        nprobe: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        query_texts: Optional[List[str]] = None,
+        mode: str = "vector",
+        rrf_k: int = 60,
+        filters: Optional[Dict[str, Any]] = None,
+        min_score: Optional[float] = None
+    ) -> List[List[Tuple[Dict[str, Any], float]]]:
+        """
+        Recherche les documents les plus similaires pour plusieurs requêtes à la fois.
         
-        # Convertir l'embedding de requête en format numpy
-        query_embedding_np = np.array([query_embedding]).astype('float32')
+        Toutes les requêtes sont envoyées à FAISS en un seul appel, et les
+        documents touchés sont lus en une seule requête au stockage. En mode
+        "hybrid", les classements dense et BM25 sont calculés sur un nombre
+        élargi de candidats puis fusionnés par Reciprocal Rank Fusion, ce qui
+        fait remonter les correspondances exactes (références, codes d'erreur)
+        sans augmenter k.
         
-        # Effectuer la recherche
-        distances, indices = self.index.search(query_embedding_np, min(k, len(self.documents)))
+        Les filtres sont appliqués pendant la recherche et non après : FAISS
+        ne parcourt que les identifiants sélectionnés (IDSelector), et une
+        petite sélection est cherchée exactement dans son propre sous-index.
         
-        # Récupérer les documents correspondants
-        results = []
-        for idx in indices[0]:
-            if idx != -1 and idx < len(self.documents):
-                results.append(self.documents[idx])
+        La recherche porte sur la version publiée à son début, sans attendre
+        les écritures en cours.
+        
+        Avec `min_score`, les candidats denses moins similaires sont écartés.
+        En mode "hybrid", une requête dont aucun candidat dense n'atteint le
+        seuil est jugée hors sujet : elle ne retourne rien, sans recherche
+        BM25, même si certains de ses mots apparaissent dans les documents.
+        
+        Args:
+            query_embeddings: Embeddings des requêtes (matrice float32 de préférence, passée à FAISS sans copie)
+            k: Nombre de résultats à retourner par requête
+            nprobe: Nombre de listes IVF à visiter (ignoré pour les autres index)
+            ef_search: Taille de la file de recherche HNSW (ignoré pour les autres index)
+            query_texts: Textes des requêtes (requis pour les modes "lexical" et "hybrid")
+            mode: Mode de recherche ("vector", "lexical" ou "hybrid")
+            rrf_k: Constante de la fusion RRF
+            filters: Filtres sur la source et les métadonnées, par exemple
+                {"source": ["a.pdf", "b.pdf"], "page": {"min": 2, "max": 5}}
+                (voir `DocumentStore.filter_ids`)
+            min_score: Similarité dense minimale des résultats (modes "vector" et "hybrid",
+                métriques "cosine" et "inner_product" ; aucune si None)
         
-        return results
+        Returns:
+            Pour chaque requête, liste de tuples (document, score), du plus au moins pertinent.
+            En mode "vector", le score est la distance L2 au carré (métrique "l2", plus petit =
+            meilleur) ou la similarité (autres métriques, plus grand = meilleur) ; c'est le
+            score BM25 en mode "lexical" et le score RRF en mode "hybrid" (plus grand = meilleur)
+        
+        Raises:
+            ValueError: Si le mode est inconnu, si le texte des requêtes manque ou si
+                `min_score` est demandé avec la métrique "l2" ou le mode "lexical"
+        """
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"Mode de recherche non pris en charge: {mode}")
+        if min_score is not None and not self.higher_is_better:
+            raise ValueError("min_score requiert une métrique de similarité ('cosine' ou 'inner_product')")
+        if min_score is not None and mode == "lexical":
+            raise ValueError("min_score ne s'applique pas au mode 'lexical'")
+        query_embeddings = self._prepare_vectors(as_embedding_matrix(query_embeddings, self.dimension))
+        if mode != "vector" and (query_texts is None or len(query_texts) != len(query_embeddings)):
+            raise ValueError(f"Le mode '{mode}' requiert le texte de chaque requête")
+        
+        if len(query_embeddings) == 0:
+            return []
+        
+        with self._reading() as snapshot:
+            if snapshot.ntotal == 0:
+                return [[] for _ in query_embeddings]
+            
+            selection = self._selection(snapshot, filters) if filters else None
+            allowed_ids = selection["id_set"] if selection is not None else None
+            
+            if mode == "vector":
+                with telemetry.span("vector_store.dense", queries=len(query_embeddings), k=k):
+                    rankings = self._dense_search(snapshot, query_embeddings, k, nprobe, ef_search, selection, min_score)
+                if min_score is not None:
+                    telemetry.count("queries_below_min_score", sum(1 for ranking in rankings if not ranking))
+            elif mode == "lexical":
+                with telemetry.span("vector_store.lexical", queries=len(query_texts), k=k):
+                    rankings = self._lexical_search(snapshot, query_texts, k, allowed_ids)
+            else:
+                # Élargir les candidats de chaque classement avant la fusion
+                candidates = max(4 * k, 20)
+                with telemetry.span("vector_store.dense", queries=len(query_embeddings), k=candidates):
+                    dense = self._dense_search(snapshot, query_embeddings, candidates, nprobe, ef_search, selection, min_score)
+                
+                # Les requêtes hors sujet (aucun candidat dense au-dessus du seuil) s'arrêtent là
+                positions = list(range(len(dense)))
+                if min_score is not None:
+                    positions = [position for position in positions if dense[position]]
+                    telemetry.count("queries_below_min_score", len(dense) - len(positions))
+                lexical = [[] for _ in dense]
+                if positions:
+                    with telemetry.span("vector_store.lexical", queries=len(positions), k=candidates):
+                        found = self._lexical_search(snapshot, [query_texts[position] for position in positions], candidates, allowed_ids)
+                    for position, lexical_ranking in zip(positions, found):
+                        lexical[position] = lexical_ranking
+                rankings = [[] for _ in dense]
+                for position in positions:
+                    rankings[position] = self._reciprocal_rank_fusion([dense[position], lexical[position]], k, rrf_k)
+            
+            # Récupérer uniquement les documents correspondants
+            with telemetry.span("vector_store.fetch_documents"):
+                hits = snapshot.documents.get_many(sorted({idx for ranking in rankings for idx, _ in ranking}))
+        return [
+            [(hits[idx], score) for idx, score in ranking if idx in hits]
+            for ranking in rankings
+        ]
     
-    def save(self, directory: str, name: str = "vector_store"):
+    def save(self, directory: str, name: str = "vector_store", compact: bool = False):
         """
         Sauvegarde l'index et les documents.
         
+        À la première sauvegarde dans un emplacement, l'index est écrit en
+        entier. Ensuite, seuls les vecteurs ajoutés et supprimés depuis la
+        sauvegarde précédente sont ajoutés au journal, puis validés avec les
+        documents et l'index lexical sous un même numéro de séquence : après
+        un arrêt brutal, le chargement retrouve l'état de la dernière
+        sauvegarde validée. L'index est compacté quand le journal devient trop
+        gros, ou après une promotion.
+        
         Args:
             directory: Répertoire où sauvegarder les fichiers
             name: Nom de base pour les fichiers
+            compact: Compacter l'index même si le journal est petit
         """
         os.makedirs(directory, exist_ok=True)
+        location = (os.path.abspath(directory), name)
+        
+        with self._write_lock, telemetry.span("vector_store.save", pending=len(self._pending)):
+            if location != self._location:
+                self._save_snapshot(directory, name)
+                return
+            
+            # Écarter les séquences jamais validées laissées par un arrêt brutal avant de les réutiliser
+            if self._stale_wal is not None:
+                self._wal.retain(*self._stale_wal)
+                self._stale_wal = None
+            
+            # Journaliser avant de valider les documents : une séquence validée est toujours dans le journal
+            self._sequence += 1
+            if self._pending:
+                self._wal.append(self._sequence, self._pending)
+                self._pending = []
+            self._commit(directory, name)
+            
+            oversized = self._wal.size > self.compaction_ratio * self._checkpoint_bytes
+            if compact or self._checkpoint_needed or oversized:
+                self._start_compaction(wait=compact or not self.background_compaction)
+    
+    def _commit(self, directory: str, name: str):
+        """Valide l'index lexical puis les documents sous la séquence courante."""
+        self.lexical.sequence = self._sequence
+        self.lexical.save(os.path.join(directory, f"{name}.bm25.sqlite"))
+        self.documents.sequence = self._sequence
+        self.documents.save(os.path.join(directory, f"{name}.sqlite"))
+    
+    def _save_snapshot(self, directory: str, name: str):
+        """
+        Écrit l'index en entier dans un nouvel emplacement, avec un journal vide.
         
-        # Sauvegarder l'index FAISS
-        index_path = os.path.join(directory, f"{name}.index")
-        faiss.write_index(self.index, index_path)
+        Args:
+            directory: Répertoire où sauvegarder les fichiers
+            name: Nom de base pour les fichiers
+        """
+        self._wait_for_compaction()
+        self._sequence += 1
+        index_file = f"{name}.{self._sequence:010d}.index"
+        atomic_write(os.path.join(directory, index_file), lambda path: faiss.write_index(self.index, path))
         
-        # Sauvegarder les documents
-        docs_path = os.path.join(directory, f"{name}.pkl")
-        with open(docs_path, 'wb') as f:
-            pickle.dump(self.documents, f)
+        wal_path = os.path.join(directory, f"{name}.wal")
+        atomic_write(wal_path, lambda path: open(path, "wb").close())
+        if self._wal is not None:
+            self._wal.close()
+        self._wal = WriteAheadLog(wal_path)
+        
+        self._commit(directory, name)
+        self._checkpoint = {"index": index_file, "sequence": self._sequence}
+        atomic_write_json(os.path.join(directory, f"{name}.checkpoint.json"), self._checkpoint)
+        self._checkpoint_bytes = os.path.getsize(os.path.join(directory, index_file))
+        self._location = (os.path.abspath(directory), name)
+        self._stale_wal = None
+        self._pending = []
+        self._checkpoint_needed = False
+    
+    def _start_compaction(self, wait: bool):
+        """
+        Réécrit l'index sauvegardé à la séquence courante, puis retire du journal les séquences qu'il inclut.
+        
+        Appelée juste après une validation : l'index publié correspond
+        exactement à la séquence courante. Il est écrit sans copie, même en
+        arrière-plan : pendant l'écriture, les ajouts portent sur une copie
+        (voir `_appendable`). Une compaction déjà en cours n'est pas relancée.
+        
+        Args:
+            wait: Écrire l'index dans le thread courant plutôt qu'en arrière-plan
+        """
+        if self._compaction is not None and self._compaction.is_alive():
+            if not wait:
+                return
+            self._wait_for_compaction()
+        
+        directory, name = self._location
+        sequence = self._sequence
+        index = self._snapshot.index
+        self._checkpoint_needed = False
+        self._compaction_error = None
+        if wait:
+            self._compact(directory, name, sequence, lambda path: faiss.write_index(index, path))
+            if self._compaction_error is not None:
+                error, self._compaction_error = self._compaction_error, None
+                raise error
+            return
+        
+        self._compacting_index = index
+        self._compaction = threading.Thread(
+            target=self._compact,
+            args=(directory, name, sequence, lambda path: faiss.write_index(index, path)),
+            name=f"compaction-{name}",
+            daemon=True
+        )
+        self._compaction.start()
+    
+    def _compact(self, directory: str, name: str, sequence: int, write):
+        """
+        Écrit un index compacté, bascule le point de reprise vers lui et vide le journal.
+        
+        Un arrêt brutal à n'importe quelle étape laisse un état cohérent :
+        l'ancien point de reprise et son journal restent valides tant que le
+        nouveau n'est pas en place.
+        
+        Args:
+            directory: Répertoire de la sauvegarde
+            name: Nom de base des fichiers
+            sequence: Séquence incluse dans l'index écrit
+            write: Fonction écrivant l'index dans le chemin reçu
+        """
+        try:
+            previous = self._checkpoint["index"]
+            index_file = f"{name}.{sequence:010d}.index"
+            index_path = os.path.join(directory, index_file)
+            atomic_write(index_path, write)
+            atomic_write_json(
+                os.path.join(directory, f"{name}.checkpoint.json"),
+                {"index": index_file, "sequence": sequence}
+            )
+            self._checkpoint = {"index": index_file, "sequence": sequence}
+            self._checkpoint_bytes = os.path.getsize(index_path)
+            if previous != index_file and os.path.exists(os.path.join(directory, previous)):
+                os.remove(os.path.join(directory, previous))
+            self._wal.retain(sequence)
+        except Exception as e:
+            # Le journal reste complet : l'état sauvegardé est intact, la compaction sera retentée
+            self._compaction_error = e
+            self._checkpoint_needed = True
+    
+    def _wait_for_compaction(self):
+        """Attend la fin de la compaction en arrière-plan, le cas échéant."""
+        if self._compaction is not None:
+            self._compaction.join()
+            self._compaction = None
     
     def load(self, directory: str, name: str = "vector_store") -> bool:
         """
         Charge l'index et les documents.
         
+        L'index compacté désigné par `{name}.checkpoint.json` est chargé, puis
+        les modifications journalisées et validées depuis sont rejouées ; les
+        entrées du journal jamais validées (sauvegarde interrompue) sont
+        écartées. Le type de l'index (exact ou approximatif) est restauré
+        depuis le fichier FAISS ; les paramètres de recherche restent ceux de
+        l'instance. Les documents restent sur disque et ne sont lus qu'à la
+        demande. Une sauvegarde au format pickle (`.pkl`) est migrée vers
+        SQLite au premier chargement, et l'index lexical est reconstruit en
+        mémoire s'il est absent ou n'a pas été validé avec les documents. Le
+        journal et l'index lexical ne sont réécrits qu'à la prochaine
+        sauvegarde : un autre processus peut sauvegarder et compacter le même
+        emplacement pendant le chargement, qui échoue alors sans effet. Un index
+        sauvegardé avec une autre métrique que celle de l'instance est
+        reconstruit avec celle-ci, puis compacté à la prochaine sauvegarde
+        (le passage de "inner_product" à "cosine", de même métrique FAISS,
+        n'est pas détecté). Le contenu chargé remplace d'un seul coup celui
+        de l'instance ; en cas d'échec, celle-ci reste inchangée.
+        
         Args:
             directory: Répertoire contenant les fichiers
             name: Nom de base des fichiers
@@ -99,20 +1388,225 @@ class VectorStore:
         Returns:
             True si le chargement a réussi, False sinon
         """
-        index_path = os.path.join(directory, f"{name}.index")
-        docs_path = os.path.join(directory, f"{name}.pkl")
+        checkpoint_path = os.path.join(directory, f"{name}.checkpoint.json")
+        docs_path = os.path.join(directory, f"{name}.sqlite")
+        pickle_path = os.path.join(directory, f"{name}.pkl")
+        lexical_path = os.path.join(directory, f"{name}.bm25.sqlite")
+        wal_path = os.path.join(directory, f"{name}.wal")
         
-        if not os.path.exists(index_path) or not os.path.exists(docs_path):
-            return False
+        def read_checkpoint():
+            # Sans point de reprise (sauvegarde antérieure au journal), l'index est écrit en entier
+            if not os.path.exists(checkpoint_path):
+                return {"index": f"{name}.index", "sequence": 0}
+            with open(checkpoint_path, encoding="utf-8") as f:
+                return json.load(f)
         
+        documents = lexical = wal = None
         try:
-            # Charger l'index FAISS
-            self.index = faiss.read_index(index_path)
-            
-            # Charger les documents
-            with open(docs_path, 'rb') as f:
-                self.documents = pickle.load(f)
-            
-            return True
+            with self._write_lock:
+                # Une compaction de cette instance pourrait retirer du journal des séquences à rejouer
+                self._wait_for_compaction()
+                checkpoint = read_checkpoint()
+                index_path = os.path.join(directory, checkpoint["index"])
+                if not os.path.exists(index_path):
+                    return False
+                if not os.path.exists(docs_path) and not os.path.exists(pickle_path):
+                    return False
+                
+                # Charger l'index FAISS (une compaction d'une autre instance peut le supprimer entre-temps)
+                index = faiss.read_index(index_path)
+                checkpoint_bytes = os.path.getsize(index_path)
+                convert = index.metric_type != self._faiss_metric
+                if convert:
+                    logger.warning(
+                        "Vector store %s sauvegardé avec une autre métrique : reconstruction avec la métrique '%s'",
+                        os.path.join(directory, name),
+                        self.metric
+                    )
+                
+                # Ouvrir les documents, en migrant l'ancien format si nécessaire
+                if os.path.exists(docs_path):
+                    documents = DocumentStore(docs_path)
+                else:
+                    documents, index = self._migrate_pickle(pickle_path, docs_path, index)
+                sequence = documents.sequence
+                
+                # Ouvrir l'index lexical, en le reconstruisant en mémoire s'il est absent ou n'a pas été
+                # validé avec les documents (il est écrit à la prochaine sauvegarde)
+                lexical = LexicalIndex(lexical_path) if os.path.exists(lexical_path) else None
+                if lexical is None or lexical.sequence != sequence:
+                    if lexical is not None:
+                        lexical.close()
+                    lexical = self._build_lexical(documents)
+                    lexical.sequence = sequence
+                
+                # Relire le journal, puis vérifier qu'aucune compaction n'en a retiré des séquences depuis
+                # la lecture du point de reprise (elle écrit le nouveau point de reprise avant de réécrire le journal)
+                wal = WriteAheadLog(wal_path)
+                records = [
+                    record for record in wal.records()
+                    if checkpoint["sequence"] < record[0] <= sequence
+                ]
+                if read_checkpoint() != checkpoint:
+                    raise RuntimeError("Point de reprise compacté pendant le chargement")
+                
+                # Rejouer les séquences validées après le point de reprise
+                with telemetry.span("vector_store.replay", records=len(records)):
+                    for _, op, ids, vectors in records:
+                        if op == OP_ADD:
+                            index.add_with_ids(vectors, ids)
+                        else:
+                            index = self._without_vectors(index, ids, documents)
+                if convert:
+                    with telemetry.span("vector_store.convert_metric", vectors=index.ntotal):
+                        index = self._convert_metric(index, documents)
+                
+                # Plus rien ne peut échouer : publier le contenu chargé, puis fermer
+                # l'ancien une fois les recherches en cours terminées
+                if self._wal is not None:
+                    self._wal.close()
+                self._wal = wal
+                previous = self._snapshot
+                self._publish(
+                    index=index,
+                    documents=documents,
+                    lexical=lexical,
+                    watermark=documents.next_id,
+                    hidden=frozenset()
+                )
+                self._synchronize()
+                previous.documents.close()
+                previous.lexical.close()
+                
+                self._location = (os.path.abspath(directory), name)
+                self._checkpoint = checkpoint
+                self._checkpoint_bytes = checkpoint_bytes
+                self._sequence = sequence
+                # Le journal n'est pas réécrit au chargement (un autre processus peut y écrire) :
+                # les séquences jamais validées en sont retirées avant la prochaine écriture
+                self._stale_wal = (checkpoint["sequence"], sequence)
+                self._pending = []
+                self._checkpoint_needed = convert
         except Exception:
+            # Le contenu de l'instance est inchangé : fermer ce qui a été ouvert
+            logger.exception("Échec du chargement du vector store %s", os.path.join(directory, name))
+            for opened in (documents, lexical, wal):
+                if opened is not None:
+                    opened.close()
             return False
+        
+        if len(self) >= self.promotion_threshold:
+            try:
+                self.promote()
+            except Exception:
+                # Le contenu chargé reste servi par l'index exact ; la promotion sera retentée au prochain ajout
+                logger.exception("Échec de la promotion de l'index chargé depuis %s", os.path.join(directory, name))
+        return True
+    
+    def close(self):
+        """Termine la compaction et les recherches en cours, puis ferme le journal, la base des documents et l'index lexical."""
+        with self._write_lock:
+            self._wait_for_compaction()
+            self._synchronize(everyone=True)
+            if self._wal is not None:
+                self._wal.close()
+            self.documents.close()
+            self.lexical.close()
+    
+    def _convert_metric(self, index, documents: DocumentStore):
+        """
+        Reconstruit un index avec la métrique de l'instance.
+        
+        Args:
+            index: Index chargé, à jour des modifications journalisées
+            documents: Documents correspondants (et vecteurs pleine précision conservés)
+        
+        Returns:
+            Nouvel index de même type contenant les mêmes vecteurs, préparés pour la métrique
+        """
+        if index.ntotal == 0:
+            return self._with_ids(self._flat_index())
+        ids, vectors = self._export_vectors(index, documents, documents.ids())
+        vectors = self._prepare_vectors(np.ascontiguousarray(vectors, dtype=np.float32))
+        if self.rerank:
+            documents.put_vectors(ids.tolist(), vectors)
+        return self._build_index(ids, vectors, approximate=self._is_approximate(index))
+    
+    @staticmethod
+    def _build_lexical(documents: DocumentStore) -> LexicalIndex:
+        """
+        Construit en mémoire l'index lexical de tous les documents stockés.
+        
+        Args:
+            documents: Stockage des documents à indexer
+        
+        Returns:
+            Index lexical en mémoire
+        """
+        lexical = LexicalIndex()
+        ids = documents.ids().tolist()
+        for start in range(0, len(ids), 1000):
+            docs = documents.get_many(ids[start:start + 1000])
+            lexical.add_many((chunk_id, doc["text"]) for chunk_id, doc in docs.items())
+        return lexical
+    
+    def _migrate_pickle(self, pickle_path: str, docs_path: str, index):
+        """
+        Convertit une sauvegarde pickle en base SQLite.
+        
+        Args:
+            pickle_path: Chemin du fichier `.pkl` existant
+            docs_path: Chemin de la base SQLite à créer
+            index: Index FAISS chargé avec cette sauvegarde
+        
+        Returns:
+            Tuple (stockage des documents, index à utiliser)
+        """
+        with open(pickle_path, 'rb') as f:
+            data = pickle.load(f)
+        
+        if isinstance(data, list):
+            # Ancien format : les identifiants sont les positions dans l'index
+            index = self._migrate_legacy_index(index)
+            docs = dict(enumerate(data))
+            sources = {chunk_id: doc["metadata"]["source"] for chunk_id, doc in docs.items()}
+            next_id = len(data)
+        else:
+            docs = data["documents"]
+            sources = {
+                chunk_id: source
+                for source, entries in data["manifest"].items()
+                for chunk_id in entries
+            }
+            next_id = data["next_id"]
+        
+        documents = DocumentStore(docs_path)
+        documents.add_many(
+            (chunk_id, sources[chunk_id], _hash_text(doc["text"]), doc)
+            for chunk_id, doc in docs.items()
+        )
+        documents.next_id = next_id
+        documents.save(docs_path)
+        return documents, index
+    
+    def _migrate_legacy_index(self, index):
+        """
+        Convertit un index sans identifiants en index à identifiants stables.
+        
+        Args:
+            index: Index FAISS de l'ancien format, indexé par position
+        
+        Returns:
+            Index équivalent où l'identifiant de chaque vecteur est sa position
+        """
+        ivf = faiss.try_extract_index_ivf(index)
+        if ivf is not None:
+            ivf.set_direct_map_type(faiss.DirectMap.Hashtable)
+            return index
+        
+        vectors = index.reconstruct_n(0, index.ntotal)
+        empty = faiss.clone_index(index)
+        empty.reset()
+        migrated = faiss.IndexIDMap2(empty)
+        migrated.add_with_ids(vectors, np.arange(index.ntotal, dtype='int64'))
+        return migrated
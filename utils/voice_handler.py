@@ -11,12 +11,26 @@ class VoiceHandler:
     """Classe pour gérer les fonctionnalités de reconnaissance et de synthèse vocale."""
     
     def __init__(self):
-        """Initialise le gestionnaire vocal."""
+        """Initialise le gestionnaire vocal (le moteur de synthèse n'est créé qu'à la première lecture)."""
         self.recognizer = sr.Recognizer()
-        self.engine = pyttsx3.init()
+        self._engine = None
+        self._engine_lock = threading.Lock()
+    
+    @property
+    def engine(self):
+        """Moteur de synthèse vocale, initialisé au premier usage."""
+        with self._engine_lock:
+            if self._engine is None:
+                self._engine = self._create_engine()
+            return self._engine
+    
+    @staticmethod
+    def _create_engine():
+        """Crée et configure le moteur pyttsx3."""
+        engine = pyttsx3.init()
         
         # Ajuster les propriétés de la voix
-        voices = self.engine.getProperty('voices')
+        voices = engine.getProperty('voices')
         # Tenter de trouver une voix française
         french_voice = None
         for voice in voices:
@@ -26,10 +40,11 @@ class VoiceHandler:
         
         # Définir la voix française si disponible
         if french_voice:
-            self.engine.setProperty('voice', french_voice)
+            engine.setProperty('voice', french_voice)
         
         # Ajuster la vitesse de parole (valeur par défaut: 200)
-        self.engine.setProperty('rate', 180)
+        engine.setProperty('rate', 180)
+        return engine
     
     def recognize_speech(self, timeout: int = 5) -> str:
         """
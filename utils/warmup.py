@@ -0,0 +1,84 @@
+"""
+Module pour construire les composants coûteux en arrière-plan.
+"""
+import time
+import threading
+from typing import Any, Callable, Dict, Optional
+
+class BackgroundLoader:
+    """Construit un composant dans un thread d'arrière-plan et expose son état de préparation."""
+    
+    def __init__(self, name: str, factory: Callable[[], Any]):
+        """
+        Lance la construction du composant.
+        
+        Args:
+            name: Nom du composant (pour l'affichage de l'état)
+            factory: Fonction sans argument construisant le composant
+        """
+        self.name = name
+        self._factory = factory
+        self._done = threading.Event()
+        self._value = None
+        self._error = None
+        self._started = time.perf_counter()
+        self._elapsed = None
+        
+        self._thread = threading.Thread(target=self._run, name=f"warmup-{name}", daemon=True)
+        self._thread.start()
+    
+    def _run(self):
+        """Construit le composant et enregistre le résultat ou l'erreur."""
+        try:
+            self._value = self._factory()
+        except Exception as e:
+            self._error = e
+        finally:
+            self._elapsed = time.perf_counter() - self._started
+            self._done.set()
+    
+    @property
+    def ready(self) -> bool:
+        """Indique si le composant est construit (avec succès ou non)."""
+        return self._done.is_set()
+    
+    @property
+    def error(self) -> Optional[Exception]:
+        """Erreur levée pendant la construction, le cas échéant."""
+        return self._error
+    
+    def get(self, timeout: Optional[float] = None) -> Any:
+        """
+        Retourne le composant, en attendant la fin de sa construction si nécessaire.
+        
+        Args:
+            timeout: Délai d'attente maximal en secondes (illimité si None)
+        
+        Returns:
+            Composant construit
+        
+        Raises:
+            TimeoutError: Si le composant n'est pas prêt dans le délai
+            Exception: L'erreur levée pendant la construction
+        """
+        if not self._done.wait(timeout):
+            raise TimeoutError(f"{self.name} n'est pas prêt après {timeout} s")
+        if self._error is not None:
+            raise self._error
+        return self._value
+    
+    def status(self) -> Dict[str, Any]:
+        """
+        Décrit l'état de la construction.
+        
+        Returns:
+            Dictionnaire avec le nom, l'état ("loading", "ready" ou "failed") et la durée en secondes
+        """
+        if not self.ready:
+            state = "loading"
+        elif self._error is not None:
+            state = "failed"
+        else:
+            state = "ready"
+        elapsed = self._elapsed if self._elapsed is not None else time.perf_counter() - self._started
+        return {"name": self.name, "state": state, "seconds": round(elapsed, 2)}
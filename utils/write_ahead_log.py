@@ -0,0 +1,188 @@
+"""
+Module pour journaliser les modifications d'un index vectoriel en ajout seul.
+
+Chaque sauvegarde ajoute ses ajouts et suppressions de vecteurs au journal
+sous un numéro de séquence, au lieu de réécrire tout l'index. Les fichiers
+remplacés (index compacté, journal réécrit) passent par un fichier
+temporaire renommé atomiquement.
+"""
+import os
+import json
+import struct
+import zlib
+import threading
+from typing import Any, Iterator, List, Optional, Tuple
+import numpy as np
+
+# En-tête d'un enregistrement : marqueur, opération, séquence, nombre d'identifiants, dimension
+_HEADER = struct.Struct("<4sBQII")
+_MAGIC = b"RWAL"
+_CRC = struct.Struct("<I")
+
+OP_ADD = 1
+OP_REMOVE = 2
+
+def fsync_directory(directory: str):
+    """Rend durable un renommage dans un répertoire (sans effet si le système ne le permet pas)."""
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+def atomic_write(path: str, write: Any):
+    """
+    Écrit un fichier via un fichier temporaire renommé atomiquement.
+    
+    Après un arrêt brutal, `path` contient soit l'ancienne version complète,
+    soit la nouvelle.
+    
+    Args:
+        path: Chemin du fichier à écrire
+        write: Fonction recevant le chemin temporaire et y écrivant le contenu
+    """
+    temp_path = f"{path}.tmp"
+    try:
+        write(temp_path)
+        with open(temp_path, "rb+") as f:
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    fsync_directory(os.path.dirname(os.path.abspath(path)))
+
+def atomic_write_json(path: str, data: Any):
+    """
+    Écrit un fichier JSON de façon atomique.
+    
+    Args:
+        path: Chemin du fichier
+        data: Données sérialisables en JSON
+    """
+    def write(temp_path):
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+    atomic_write(path, write)
+
+class WriteAheadLog:
+    """Journal en ajout seul des ajouts et suppressions de vecteurs."""
+    
+    def __init__(self, path: str):
+        """
+        Ouvre (ou crée) le journal.
+        
+        Args:
+            path: Chemin du fichier journal
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, "ab")
+    
+    @property
+    def size(self) -> int:
+        """Taille du journal en octets."""
+        with self._lock:
+            return self._file.tell()
+    
+    @staticmethod
+    def _encode(sequence: int, op: int, ids: np.ndarray, vectors: Optional[np.ndarray]) -> bytes:
+        """Sérialise un enregistrement, suivi du CRC32 de son contenu."""
+        ids = np.ascontiguousarray(ids, dtype=np.int64)
+        if vectors is None:
+            dimension = 0
+            payload = ids.tobytes()
+        else:
+            vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+            dimension = vectors.shape[1]
+            payload = ids.tobytes() + vectors.tobytes()
+        record = _HEADER.pack(_MAGIC, op, sequence, len(ids), dimension) + payload
+        return record + _CRC.pack(zlib.crc32(record))
+    
+    def append(self, sequence: int, operations: List[Tuple[int, np.ndarray, Optional[np.ndarray]]]):
+        """
+        Ajoute des opérations au journal et les rend durables.
+        
+        Args:
+            sequence: Numéro de séquence de la sauvegarde
+            operations: Tuples (opération, identifiants, vecteurs ou None)
+        """
+        data = b"".join(self._encode(sequence, op, ids, vectors) for op, ids, vectors in operations)
+        with self._lock:
+            self._file.write(data)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+    
+    def records(self) -> Iterator[Tuple[int, int, np.ndarray, Optional[np.ndarray]]]:
+        """
+        Relit les enregistrements complets du journal.
+        
+        La lecture s'arrête au premier enregistrement tronqué ou corrompu
+        (écriture interrompue par un arrêt brutal).
+        
+        Returns:
+            Itérateur sur les tuples (séquence, opération, identifiants, vecteurs ou None)
+        """
+        with open(self.path, "rb") as f:
+            data = f.read()
+        
+        offset = 0
+        while offset + _HEADER.size + _CRC.size <= len(data):
+            magic, op, sequence, count, dimension = _HEADER.unpack_from(data, offset)
+            end = offset + _HEADER.size + count * 8 + count * dimension * 4
+            if magic != _MAGIC or end + _CRC.size > len(data):
+                return
+            if _CRC.unpack_from(data, end)[0] != zlib.crc32(data[offset:end]):
+                return
+            
+            start = offset + _HEADER.size
+            ids = np.frombuffer(data, dtype=np.int64, count=count, offset=start)
+            vectors = None
+            if dimension:
+                vectors = np.frombuffer(data, dtype=np.float32, count=count * dimension, offset=start + count * 8)
+                vectors = vectors.reshape(count, dimension)
+            yield sequence, op, ids, vectors
+            offset = end + _CRC.size
+    
+    def retain(self, after: int, up_to: Optional[int] = None):
+        """
+        Réécrit le journal en ne gardant que les séquences de l'intervalle ]after, up_to].
+        
+        Appelé après une compaction (les séquences incluses dans l'index sont
+        retirées) et avant la première écriture qui suit un chargement (les
+        séquences jamais validées sont retirées).
+        
+        Args:
+            after: Dernière séquence incluse dans l'index compacté
+            up_to: Dernière séquence validée (aucune limite si None)
+        """
+        with self._lock:
+            self._file.flush()
+            kept = []
+            dropped = False
+            for sequence, op, ids, vectors in self.records():
+                if sequence > after and (up_to is None or sequence <= up_to):
+                    kept.append(self._encode(sequence, op, ids, vectors))
+                else:
+                    dropped = True
+            if not dropped and sum(len(record) for record in kept) == self._file.tell():
+                return
+            
+            def write(temp_path):
+                with open(temp_path, "wb") as f:
+                    f.write(b"".join(kept))
+            self._file.close()
+            try:
+                atomic_write(self.path, write)
+            finally:
+                self._file = open(self.path, "ab")
+    
+    def close(self):
+        """Ferme le journal."""
+        with self._lock:
+            self._file.close()